@@ -0,0 +1,138 @@
+"""
+A/B comparison of ads.
+
+The engagement count of every post of the chosen ads is fetched in one
+query. Each ad's rate is its mean engagements per post, with a percentile
+bootstrap confidence interval, and each ad is tested against a baseline
+ad with a bootstrap of the difference in rates.
+
+Per-post counts are small integers, so resampling n posts with replacement
+is the same as drawing a multinomial over the distinct counts: all the
+replicates of an ad come from one multinomial draw and a matrix product,
+and intervals and p-values for every ad come from array operations over
+an (ads x replicates) matrix.
+
+NumPy is imported on first use so it stays out of process startup.
+"""
+
+from django.db.models import Count, F
+
+from posts.models import Post
+
+# Bootstrap replicates drawn per ad and group set
+BOOTSTRAP_SAMPLES = 2000
+
+# Two-sided confidence level of the reported intervals
+CONFIDENCE = 0.95
+
+
+def post_engagement_counts(ad_ids):
+    """
+    Per-post engagement counts for the given ads, in one query.
+
+    Returns:
+        dict: ad id -> list of (group set, engagement count) per post
+    """
+    rows = Post.objects.filter(ad_id__in=ad_ids).annotate(
+        engagement_total=Count('engagements') + F('archived_engagements')
+    ).values_list('ad_id', 'fb_group__group_set', 'engagement_total')
+    counts = {ad_id: [] for ad_id in ad_ids}
+    for ad_id, group_set, total in rows:
+        counts[ad_id].append((group_set, total))
+    return counts
+
+
+def _bootstrap_means(np, rng, counts, samples):
+    """Bootstrap replicates of the mean of ``counts``, as a vector"""
+    values, frequencies = np.unique(counts, return_counts=True)
+    draws = rng.multinomial(len(counts), frequencies / len(counts), size=samples)
+    return draws @ values / len(counts)
+
+
+def _summarise(np, ad_ids, posts, rates, boots, baseline):
+    """
+    Confidence intervals and tests against the baseline for every ad at
+    once, from an (ads x samples) matrix of bootstrap rates.
+    """
+    tail = (1 - CONFIDENCE) / 2 * 100
+    ci_low, ci_high = np.percentile(boots, [tail, 100 - tail], axis=1)
+    results = {}
+    for row, ad_id in enumerate(ad_ids):
+        results[ad_id] = {
+            'posts': int(posts[row]),
+            'rate': float(rates[row]),
+            'ci_low': float(ci_low[row]),
+            'ci_high': float(ci_high[row]),
+        }
+    if baseline not in ad_ids:
+        return results
+
+    diffs = boots - boots[ad_ids.index(baseline)]
+    diff_low, diff_high = np.percentile(diffs, [tail, 100 - tail], axis=1)
+    # Two-sided: how often the resampled difference lands on either side of zero
+    p_values = np.minimum(1.0, 2 * np.minimum((diffs <= 0).mean(axis=1), (diffs >= 0).mean(axis=1)))
+    for row, ad_id in enumerate(ad_ids):
+        if ad_id != baseline:
+            results[ad_id].update({
+                'diff': float(rates[row] - results[baseline]['rate']),
+                'diff_low': float(diff_low[row]),
+                'diff_high': float(diff_high[row]),
+                'p_value': float(p_values[row]),
+            })
+    return results
+
+
+def compare_ads(ad_ids, baseline=None, samples=BOOTSTRAP_SAMPLES, seed=None):
+    """
+    Compare the engagement rates of several ads, overall and within each
+    group set.
+
+    Posts are resampled within their group set, and an ad's overall rate is
+    the post-weighted mix of its set rates (a stratified bootstrap), so the
+    A/B split of an ad's posts does not skew the comparison noise.
+
+    Args:
+        ad_ids (list): Ads to compare
+        baseline: Ad the others are tested against; defaults to the first
+        samples (int): Bootstrap replicates
+        seed (int): Random seed, for reproducible results
+
+    Returns:
+        dict: 'overall' and one entry per group set ('A', 'B'), each mapping
+        ad id -> posts, rate, ci_low, ci_high and, for ads other than the
+        baseline, diff, diff_low, diff_high and p_value. Ads without posts
+        in a stratum are left out of it.
+    """
+    import numpy as np
+
+    baseline = ad_ids[0] if baseline is None else baseline
+    rng = np.random.default_rng(seed)
+    counts = post_engagement_counts(ad_ids)
+    group_sets = sorted({group_set for posts in counts.values() for group_set, _ in posts})
+
+    # Per ad: post count, engagement sum and bootstrap sums for each set
+    strata = {}
+    for ad_id, ad_posts in counts.items():
+        for group_set in group_sets:
+            set_counts = np.array([total for posts_set, total in ad_posts if posts_set == group_set], dtype=np.int64)
+            if set_counts.size:
+                boot = _bootstrap_means(np, rng, set_counts, samples)
+                strata[ad_id, group_set] = (set_counts.size, set_counts.sum(), boot * set_counts.size)
+
+    comparison = {}
+    for group_set in [None, *group_sets]:
+        present = [
+            ad_id for ad_id in ad_ids
+            if any((ad_id, s) in strata for s in (group_sets if group_set is None else [group_set]))
+        ]
+        posts, rates, boots = [], [], []
+        for ad_id in present:
+            parts = [strata[ad_id, s] for s in (group_sets if group_set is None else [group_set]) if (ad_id, s) in strata]
+            n = sum(part[0] for part in parts)
+            posts.append(n)
+            rates.append(sum(part[1] for part in parts) / n)
+            boots.append(sum(part[2] for part in parts) / n)
+        comparison['overall' if group_set is None else group_set] = _summarise(
+            np, present, posts, rates, np.array(boots).reshape(len(present), samples), baseline,
+        )
+    return comparison
@@ -0,0 +1,16 @@
+from django.contrib import admin
+from .models import PostVelocity
+
+@admin.register(PostVelocity)
+class PostVelocityAdmin(admin.ModelAdmin):
+    list_display = ('post', 'ad', 'fb_group', 'time_to_first', 'engagements_1h', 'engagements_6h', 'engagements_24h', 'engagements_total')
+    list_filter = ('fb_group',)
+    list_select_related = ('post__ad', 'post__fb_group', 'ad', 'fb_group')
+    search_fields = ('ad__name', 'fb_group__name')
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from analytics.rebalance import PRIOR_POSTS, SET_LABELS, apply_plan, plan_rebalance
+
+
+class Command(BaseCommand):
+    help = 'Preview, and with --apply save, group sets with balanced expected engagement'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sets',
+            type=int,
+            default=2,
+            help='Number of sets to split the groups into',
+        )
+        parser.add_argument(
+            '--prior-posts',
+            type=int,
+            default=PRIOR_POSTS,
+            help="Average posts blended into each group's rate",
+        )
+        parser.add_argument(
+            '--apply',
+            action='store_true',
+            help='Save the proposed sets (default: only preview them)',
+        )
+
+    def handle(self, *args, **options):
+        if not 2 <= options['sets'] <= len(SET_LABELS):
+            raise CommandError(f'--sets must be between 2 and {len(SET_LABELS)}')
+        plan = plan_rebalance(sets=options['sets'], prior_posts=options['prior_posts'])
+        if not plan['groups']:
+            self.stdout.write('No groups to rebalance.')
+            return
+
+        self.stdout.write(f"{'Group':<40} {'Posts':>6} {'Rate':>8}  Set")
+        for row in plan['groups']:
+            change = f"{row['current']} -> {row['proposed']}" if row['current'] != row['proposed'] else row['current']
+            self.stdout.write(f"{row['group'].name[:40]:<40} {row['posts']:>6} {row['rate']:>8.2f}  {change}")
+
+        def totals(sets):
+            return ', '.join(f'{label} {total:.1f}' for label, total in sets.items())
+
+        self.stdout.write(f"\nExpected engagement per set, now:      {totals(plan['current'])} (spread {plan['current_spread']:.1f})")
+        self.stdout.write(f"Expected engagement per set, proposed: {totals(plan['proposed'])} (spread {plan['proposed_spread']:.1f})")
+        self.stdout.write(f"{plan['moves']} groups move; {plan['method']} took {plan['ms']:.1f} ms")
+
+        if not options['apply']:
+            self.stdout.write('Preview only; run again with --apply to save.')
+            return
+        try:
+            with transaction.atomic():
+                moved = apply_plan(plan)
+        except ValueError as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved} groups.'))
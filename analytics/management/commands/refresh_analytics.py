@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import refresh_post_velocity
+
+
+class Command(BaseCommand):
+    help = 'Refresh the engagement velocity rollups for posts changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Measure every post again, not only changed ones',
+        )
+
+    def handle(self, *args, **options):
+        measured = refresh_post_velocity(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed velocity for {measured} posts.'))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('posts', '0008_alter_post_last_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostVelocity',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='velocity', serialize=False, to='posts.post')),
+                ('posted_at', models.DateTimeField()),
+                ('first_engagement_at', models.DateTimeField(blank=True, null=True)),
+                ('time_to_first', models.DurationField(blank=True, null=True)),
+                ('engagements_1h', models.PositiveIntegerField(default=0)),
+                ('engagements_6h', models.PositiveIntegerField(default=0)),
+                ('engagements_24h', models.PositiveIntegerField(default=0)),
+                ('engagements_total', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(db_index=True)),
+                ('ad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.ad')),
+                ('fb_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.fbgroup')),
+            ],
+            options={
+                'verbose_name_plural': 'post velocities',
+            },
+        ),
+    ]
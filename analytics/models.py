@@ -0,0 +1,23 @@
+from django.db import models
+from core.models import FBGroup
+from posts.models import Ad, Post
+
+class PostVelocity(models.Model):
+    """How quickly a post attracted engagement, refreshed by `manage.py refresh_analytics`"""
+    post = models.OneToOneField(Post, primary_key=True, related_name='velocity', on_delete=models.CASCADE)
+    ad = models.ForeignKey(Ad, related_name='+', on_delete=models.CASCADE)
+    fb_group = models.ForeignKey(FBGroup, related_name='+', on_delete=models.CASCADE)
+    posted_at = models.DateTimeField()
+    first_engagement_at = models.DateTimeField(null=True, blank=True)
+    time_to_first = models.DurationField(null=True, blank=True)
+    engagements_1h = models.PositiveIntegerField(default=0)
+    engagements_6h = models.PositiveIntegerField(default=0)
+    engagements_24h = models.PositiveIntegerField(default=0)
+    engagements_total = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Velocity of {self.post_id}"
+
+    class Meta:
+        verbose_name_plural = 'post velocities'
@@ -0,0 +1,269 @@
+"""
+Rebalancing of FB groups across posting sets.
+
+Each group's expected engagement is its historical engagements per post
+(live and archived), shrunk towards the mean of all groups by
+``PRIOR_POSTS`` imaginary average posts so that a group posted to once or
+never neither dominates nor vanishes. ``plan_rebalance`` splits the groups
+into sets whose expected engagement is as even as possible, a multiway
+number partitioning problem:
+
+- two sets: an exact subset-sum dynamic program over the rates quantized
+  to ``DP_RESOLUTION`` steps, run on Python big integers as bitsets
+- more sets: largest first into the lightest set (LPT)
+
+either way followed by a local search on the exact rates that moves or
+swaps groups between the heaviest and lightest set while that narrows the
+gap. Sets are then named to keep as many groups as possible where they are.
+Hundreds of groups take milliseconds.
+"""
+
+import bisect
+import itertools
+import string
+import time
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from core.cache import invalidate
+from core.models import FBGroup
+from engagement.models import Engagement
+from posts.models import Post
+
+# Imaginary average posts blended into every group's rate
+PRIOR_POSTS = 3
+
+# Steps the total expected engagement is quantized to for the exact DP
+DP_RESOLUTION = 20000
+
+# Local search moves tried at most, per group
+LOCAL_SEARCH_ROUNDS = 10
+
+# Names of sets beyond those FBGroup.SET_CHOICES knows, for previews
+SET_LABELS = string.ascii_uppercase
+
+# Largest number of sets whose names are matched to the current ones exhaustively
+MAX_LABEL_PERMUTATIONS = 7
+
+
+def group_rates(prior_posts=PRIOR_POSTS):
+    """
+    Expected engagements per post of every group, from two grouped queries.
+
+    Returns:
+        dict: group id -> (posts, engagements, expected rate)
+    """
+    posts = {
+        row['fb_group_id']: (row['posts'], row['archived'] or 0)
+        for row in Post.objects.values('fb_group_id').annotate(posts=Count('id'), archived=Sum('archived_engagements')).order_by()
+    }
+    live = dict(
+        Engagement.objects.values_list('post__fb_group_id').annotate(total=Count('id')).order_by()
+    )
+    totals = {
+        group_id: (post_count, archived + live.get(group_id, 0))
+        for group_id, (post_count, archived) in posts.items()
+    }
+    all_posts = sum(post_count for post_count, _ in totals.values())
+    mean = sum(engagements for _, engagements in totals.values()) / all_posts if all_posts else 0.0
+
+    rates = {}
+    for group_id in FBGroup.objects.values_list('id', flat=True):
+        post_count, engagements = totals.get(group_id, (0, 0))
+        rate = (engagements + prior_posts * mean) / (post_count + prior_posts) if post_count + prior_posts else 0.0
+        rates[group_id] = (post_count, engagements, rate)
+    return rates
+
+
+def _two_way_dp(weights):
+    """Exact two-way split of quantized weights; returns a 0/1 set per item"""
+    total = sum(weights)
+    step = total / DP_RESOLUTION if total else 1.0
+    units = [round(weight / step) for weight in weights]
+
+    # Bit s of ``reachable`` is set when some subset sums to s units; keep
+    # the bitset before each item to recover the subset afterwards
+    reachable = 1
+    history = []
+    for unit in units:
+        history.append(reachable)
+        reachable |= reachable << unit
+    target = sum(units) // 2
+    best = (reachable & ((1 << (target + 1)) - 1)).bit_length() - 1
+
+    assignment = [0] * len(weights)
+    for index in reversed(range(len(weights))):
+        if not (history[index] >> best) & 1:
+            assignment[index] = 1
+            best -= units[index]
+    return assignment
+
+
+def _greedy(weights, sets):
+    """Largest weight first, each into the currently lightest set"""
+    assignment = [0] * len(weights)
+    sums = [0.0] * sets
+    for index in sorted(range(len(weights)), key=lambda i: weights[i], reverse=True):
+        lightest = min(range(sets), key=sums.__getitem__)
+        assignment[index] = lightest
+        sums[lightest] += weights[index]
+    return assignment
+
+
+def _local_search(weights, assignment, sets):
+    """
+    Narrow the gap between the heaviest and lightest set by moving one
+    group across, or swapping two, whichever lands closest to half the gap.
+    Every step lowers the sum of squared set totals, so the search ends.
+    """
+    sums = [0.0] * sets
+    for index, set_index in enumerate(assignment):
+        sums[set_index] += weights[index]
+
+    for _ in range(LOCAL_SEARCH_ROUNDS * len(weights)):
+        heavy = max(range(sets), key=sums.__getitem__)
+        light = min(range(sets), key=sums.__getitem__)
+        gap = sums[heavy] - sums[light]
+        half = gap / 2
+        in_light = sorted((weights[i], i) for i, s in enumerate(assignment) if s == light)
+        light_weights = [weight for weight, _ in in_light]
+
+        # (distance from half the gap, weight moved, item from heavy, item from light)
+        best = None
+        for index in (i for i, s in enumerate(assignment) if s == heavy):
+            weight = weights[index]
+            candidates = [(weight, None)]
+            # Swap partners whose difference to this group is nearest half the gap
+            position = bisect.bisect_left(light_weights, weight - half)
+            for other in (position - 1, position):
+                if 0 <= other < len(in_light):
+                    candidates.append((weight - in_light[other][0], in_light[other][1]))
+            for moved, partner in candidates:
+                if 0 < moved < gap and (best is None or abs(moved - half) < best[0]):
+                    best = (abs(moved - half), moved, index, partner)
+        if best is None:
+            break
+        _, moved, index, partner = best
+        assignment[index] = light
+        if partner is not None:
+            assignment[partner] = heavy
+        sums[heavy] -= moved
+        sums[light] += moved
+    return assignment
+
+
+def _name_sets(assignment, current, sets):
+    """Set labels, per set index, that leave the most groups in their current set"""
+    labels = SET_LABELS[:sets]
+    overlap = defaultdict(int)
+    for set_index, label in zip(assignment, current):
+        overlap[set_index, label] += 1
+    if sets > MAX_LABEL_PERMUTATIONS:
+        return labels
+    return max(
+        itertools.permutations(labels),
+        key=lambda names: sum(overlap[set_index, name] for set_index, name in enumerate(names)),
+    )
+
+
+def partition(weights, sets):
+    """
+    Split weights into sets with totals as even as possible.
+
+    Args:
+        weights (list): Non-negative weights
+        sets (int): Number of sets
+
+    Returns:
+        tuple: (set index per weight, method used)
+    """
+    if sets == 2:
+        assignment, method = _two_way_dp(weights), 'exact DP + local search'
+    else:
+        assignment, method = _greedy(weights, sets), 'greedy + local search'
+    return _local_search(weights, assignment, sets), method
+
+
+def plan_rebalance(sets=2, prior_posts=PRIOR_POSTS):
+    """
+    Propose set assignments for every group, without saving them.
+
+    Args:
+        sets (int): Number of sets to split the groups into
+        prior_posts (int): See PRIOR_POSTS
+
+    Returns:
+        dict: 'groups' (dicts with group, posts, engagements, rate, current
+        and proposed set), 'current' and 'proposed' expected engagement per
+        set, their 'current_spread' and 'proposed_spread' (heaviest minus
+        lightest), 'moves', 'method' and 'ms' spent partitioning
+    """
+    rates = group_rates(prior_posts)
+    groups = list(FBGroup.objects.filter(pk__in=rates).order_by('name', 'id'))
+    weights = [rates[group.pk][2] for group in groups]
+
+    started = time.perf_counter()
+    assignment, method = partition(weights, sets) if groups else ([], 'none')
+    names = _name_sets(assignment, [group.group_set for group in groups], sets)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    rows = []
+    current = defaultdict(float)
+    proposed = {label: 0.0 for label in names}
+    for group, weight, set_index in zip(groups, weights, assignment):
+        post_count, engagements, rate = rates[group.pk]
+        rows.append({
+            'group': group,
+            'posts': post_count,
+            'engagements': engagements,
+            'rate': rate,
+            'current': group.group_set,
+            'proposed': names[set_index],
+        })
+        current[group.group_set] += weight
+        proposed[names[set_index]] += weight
+
+    def spread(totals):
+        return max(totals.values()) - min(totals.values()) if totals else 0.0
+
+    return {
+        'groups': rows,
+        'current': dict(sorted(current.items())),
+        'proposed': dict(sorted(proposed.items())),
+        'current_spread': spread(current),
+        'proposed_spread': spread(proposed),
+        'moves': sum(row['current'] != row['proposed'] for row in rows),
+        'method': method,
+        'ms': elapsed,
+    }
+
+
+def apply_plan(plan):
+    """
+    Save the proposed sets of a plan.
+
+    Returns:
+        int: Number of groups moved
+
+    Raises:
+        ValueError: A proposed set is not one of FBGroup.SET_CHOICES
+    """
+    allowed = {value for value, _ in FBGroup.SET_CHOICES}
+    unknown = sorted(set(plan['proposed']) - allowed)
+    if unknown:
+        raise ValueError(f"Groups can only be in sets {', '.join(sorted(allowed))}, not {', '.join(unknown)}")
+    now = timezone.now()
+    moved = []
+    for row in plan['groups']:
+        if row['current'] != row['proposed']:
+            row['group'].group_set = row['proposed']
+            # bulk_update leaves auto_now alone; sync compares last_updated
+            row['group'].last_updated = now
+            moved.append(row['group'])
+    FBGroup.objects.bulk_update(moved, ['group_set', 'last_updated'])
+    # bulk_update sends no post_save
+    transaction.on_commit(lambda: invalidate('dashboard'))
+    return len(moved)
@@ -0,0 +1,201 @@
+"""
+Engagement velocity rollups.
+
+``refresh_post_velocity`` stores, per post, the time to first engagement
+and the engagements received within 1, 6 and 24 hours of ``posted_at``.
+Each batch of posts is measured by a single grouped query with conditional
+aggregates, and only posts touched since the last refresh are measured
+again. Reports read the rollup table and rank posts with window functions,
+so they never scan the engagements table.
+
+Posts with archived engagements are left alone: their rollup was taken
+while every engagement was still live, and archival happens long after the
+24 hour window closes.
+
+The rollup can also follow the change feed: the 'analytics.velocity'
+consumer measures touched posts as their changes arrive.
+
+The velocity report is cached in the 'analytics' namespace until the
+rollup or the names it shows change; the scheduler (see core.scheduler)
+refreshes the rollup and the report before the daily posting window.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import (
+    Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Q, Sum, Window,
+)
+from django.db.models.functions import Rank
+from django.utils import timezone
+
+from core.cache import cached_query, invalidate
+from engagement.models import Engagement
+from posts.models import Post
+from .models import PostVelocity
+
+# Rollup field -> hours after posted_at it counts engagements for
+VELOCITY_WINDOWS = {
+    'engagements_1h': 1,
+    'engagements_6h': 6,
+    'engagements_24h': 24,
+}
+
+# Posts measured per query while refreshing
+VELOCITY_BATCH_SIZE = 500
+
+# Rows written shortly before a refresh may commit after it; look back
+# this far past the watermark so they are picked up next time
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+def _velocity_queryset(post_ids):
+    """One row per post with its velocity measures, computed in the database"""
+    windows = {
+        field: Count('engagements', filter=Q(
+            engagements__created_at__gte=F('posted_at'),
+            engagements__created_at__lt=F('posted_at') + timedelta(hours=hours),
+        ))
+        for field, hours in VELOCITY_WINDOWS.items()
+    }
+    return Post.objects.filter(id__in=post_ids).annotate(
+        first_engagement_at=Min('engagements__created_at'),
+        engagements_total=Count('engagements'),
+        **windows,
+    ).annotate(
+        time_to_first=ExpressionWrapper(
+            F('first_engagement_at') - F('posted_at'), output_field=DurationField()
+        ),
+    ).values('id', 'ad_id', 'fb_group_id', 'posted_at', 'first_engagement_at',
+             'time_to_first', 'engagements_total', *VELOCITY_WINDOWS)
+
+
+def refresh_post_velocity(full=False):
+    """
+    Bring the velocity rollup up to date.
+
+    Args:
+        full (bool): Measure every post again instead of only changed ones
+
+    Returns:
+        int: Number of posts measured
+    """
+    now = timezone.now()
+    posts = Post.objects.filter(archived_engagements=0)
+    watermark = None if full else PostVelocity.objects.aggregate(Max('refreshed_at'))['refreshed_at__max']
+    if watermark is not None:
+        since = watermark - REFRESH_OVERLAP
+        posts = posts.filter(
+            Q(last_updated__gte=since)
+            | Q(id__in=Engagement.objects.filter(created_at__gte=since).values('post_id'))
+        )
+    post_ids = list(posts.order_by('id').values_list('id', flat=True))
+    _measure_posts(post_ids, now)
+    return len(post_ids)
+
+
+def _measure_posts(post_ids, now):
+    """Write the rollup rows of the given posts, a batch per query"""
+    update_fields = [
+        'ad', 'fb_group', 'posted_at', 'first_engagement_at', 'time_to_first',
+        'engagements_total', *VELOCITY_WINDOWS, 'refreshed_at',
+    ]
+    for start in range(0, len(post_ids), VELOCITY_BATCH_SIZE):
+        rows = _velocity_queryset(post_ids[start:start + VELOCITY_BATCH_SIZE])
+        PostVelocity.objects.bulk_create(
+            [PostVelocity(post_id=row.pop('id'), refreshed_at=now, **row) for row in rows],
+            update_conflicts=True,
+            unique_fields=['post'],
+            update_fields=update_fields,
+        )
+    if post_ids:
+        invalidate('analytics')
+
+
+def consume_velocity_changes(changes):
+    """
+    Change feed consumer (see core.changes) measuring again the posts that
+    a batch of changes touched, bulk inserts and updates included.
+
+    A deleted engagement no longer says which post it was on; such posts
+    are caught by the next ``refresh_post_velocity(full=True)``.
+    """
+    post_ids = {change.object_id for change in changes if change.model == 'posts.Post' and change.action == 'save'}
+    engagement_ids = [
+        change.object_id for change in changes
+        if change.model == 'engagement.Engagement' and change.action == 'save'
+    ]
+    post_ids.update(Engagement.objects.filter(id__in=engagement_ids).values_list('post_id', flat=True))
+    live = Post.objects.filter(id__in=post_ids, archived_engagements=0).order_by('id')
+    _measure_posts(list(live.values_list('id', flat=True)), timezone.now())
+
+
+def decay_curves(dimension):
+    """
+    Summarise velocity per ad or per group.
+
+    Args:
+        dimension (str): 'ad' or 'fb_group'
+
+    Returns:
+        list: dicts with the name, post count, average time to first
+        engagement, and ``curve``: the share of all engagements that arrived
+        within each window, as (label, percent) pairs
+    """
+    rows = PostVelocity.objects.values(dimension, name=F(f'{dimension}__name')).annotate(
+        posts=Count('post'),
+        avg_time_to_first=Avg('time_to_first'),
+        total=Sum('engagements_total'),
+        **{field: Sum(field) for field in VELOCITY_WINDOWS},
+    ).order_by('name')
+    curves = []
+    for row in rows:
+        row['curve'] = [
+            (f'{hours}h', round(100 * row[field] / row['total'], 1) if row['total'] else 0.0)
+            for field, hours in VELOCITY_WINDOWS.items()
+        ]
+        curves.append(row)
+    return curves
+
+
+def fastest_posts(per_ad=3):
+    """
+    The posts that gathered the most engagements in their first 24 hours,
+    ranked within their ad.
+
+    Args:
+        per_ad (int): Posts kept for each ad
+
+    Returns:
+        QuerySet: PostVelocity rows annotated with ``ad_rank`` and
+        ``ad_avg_24h``, the ad's average over all its posts
+    """
+    return PostVelocity.objects.select_related('ad', 'fb_group').annotate(
+        ad_rank=Window(Rank(), partition_by=[F('ad')], order_by=F('engagements_24h').desc()),
+        ad_avg_24h=Window(Avg('engagements_24h'), partition_by=[F('ad')]),
+    ).filter(ad_rank__lte=per_ad).order_by('ad__name', 'ad_rank')
+
+
+def velocity_report(refresh=False):
+    """
+    Data of the velocity page: decay curves per ad and per group and each
+    ad's fastest posts, cached until the rollup changes.
+    """
+    return cached_query('analytics', 'velocity', lambda: {
+        'curve_tables': [
+            ('Velocity by Ad', decay_curves('ad')),
+            ('Velocity by Group', decay_curves('fb_group')),
+        ],
+        'fastest_posts': list(fastest_posts()),
+    }, ttl=settings.CACHE_WARM_TTL, refresh=refresh)
+
+
+def refresh_rollups():
+    """Job bringing the velocity rollup up to date"""
+    return f'{refresh_post_velocity()} posts measured'
+
+
+def warm_velocity_report():
+    """Job computing the velocity report"""
+    report = velocity_report(refresh=True)
+    return f"{len(report['fastest_posts'])} fastest posts"
@@ -0,0 +1,189 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from core.models import FBGroup
+from engagement.models import Contact, Engagement
+from posts.models import Ad, Post
+from .ab import compare_ads, post_engagement_counts
+from .models import PostVelocity
+from .rebalance import partition, plan_rebalance
+from .rollups import decay_curves, fastest_posts, refresh_post_velocity
+
+class VelocityRollupTest(TestCase):
+    def setUp(self):
+        self.group = FBGroup.objects.create(name='Group', group_url='https://facebook.com/groups/g', group_set='A')
+        self.ad = Ad.objects.create(name='Spring Sale', text='Text')
+        self.contact = Contact.objects.create(name='Jane', fb_url='https://facebook.com/jane')
+        self.posted_at = timezone.now() - timedelta(days=2)
+        self.post = Post.objects.create(ad=self.ad, fb_group=self.group, post_url='https://facebook.com/posts/1', posted_at=self.posted_at)
+
+    def engage(self, post, after):
+        engagement = Engagement.objects.create(post=post, contact=self.contact, content=f'Hi after {after}')
+        Engagement.objects.filter(pk=engagement.pk).update(created_at=post.posted_at + after)
+
+    def test_windows_and_time_to_first(self):
+        for after in [timedelta(minutes=10), timedelta(minutes=50), timedelta(hours=3), timedelta(hours=20), timedelta(hours=30)]:
+            self.engage(self.post, after)
+        self.assertEqual(refresh_post_velocity(), 1)
+        velocity = PostVelocity.objects.get(post=self.post)
+        self.assertEqual(velocity.time_to_first, timedelta(minutes=10))
+        self.assertEqual(
+            (velocity.engagements_1h, velocity.engagements_6h, velocity.engagements_24h, velocity.engagements_total),
+            (2, 3, 4, 5),
+        )
+
+    def test_post_without_engagements(self):
+        refresh_post_velocity()
+        velocity = PostVelocity.objects.get(post=self.post)
+        self.assertIsNone(velocity.time_to_first)
+        self.assertEqual(velocity.engagements_total, 0)
+
+    def test_refresh_is_incremental(self):
+        other = Post.objects.create(ad=self.ad, fb_group=self.group, post_url='https://facebook.com/posts/2', posted_at=self.posted_at)
+        self.assertEqual(refresh_post_velocity(), 2)
+        # Move the watermark past the posts' own saves
+        PostVelocity.objects.update(refreshed_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(refresh_post_velocity(), 0)
+        engagement = Engagement.objects.create(post=other, contact=self.contact, content='Hi')
+        Engagement.objects.filter(pk=engagement.pk).update(created_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(refresh_post_velocity(), 1)
+        self.assertEqual(PostVelocity.objects.get(post=other).engagements_total, 1)
+
+    def test_measuring_takes_one_query_per_batch(self):
+        for index in range(5):
+            post = Post.objects.create(ad=self.ad, fb_group=self.group, post_url=f'https://facebook.com/posts/x{index}', posted_at=self.posted_at)
+            self.engage(post, timedelta(minutes=index))
+        # watermark, changed posts, velocity query, upsert
+        with self.assertNumQueries(4):
+            refresh_post_velocity()
+
+    def test_decay_curves_and_ranking(self):
+        fast = Post.objects.create(ad=self.ad, fb_group=self.group, post_url='https://facebook.com/posts/3', posted_at=self.posted_at)
+        self.engage(fast, timedelta(minutes=5))
+        self.engage(fast, timedelta(minutes=15))
+        self.engage(self.post, timedelta(hours=12))
+        refresh_post_velocity()
+        curve = decay_curves('ad')[0]
+        self.assertEqual(curve['name'], 'Spring Sale')
+        self.assertEqual(curve['curve'], [('1h', 66.7), ('6h', 66.7), ('24h', 100.0)])
+        ranked = list(fastest_posts(per_ad=1))
+        self.assertEqual([(v.post_id, v.ad_rank) for v in ranked], [(fast.id, 1)])
+        self.assertEqual(ranked[0].ad_avg_24h, 1.5)
+
+    def test_command_and_view(self):
+        call_command('refresh_analytics', '--full', stdout=StringIO())
+        response = self.client.get(reverse('analytics:velocity'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Spring Sale')
+
+
+class AdComparisonTest(TestCase):
+    def setUp(self):
+        self.groups = {
+            group_set: FBGroup.objects.create(name=f'Group {group_set}', group_url=f'https://facebook.com/groups/{group_set}', group_set=group_set)
+            for group_set in 'AB'
+        }
+        self.contact = Contact.objects.create(name='Jane', fb_url='https://facebook.com/jane')
+        self.posts = 0
+
+    def make_ad(self, name, counts):
+        """Post an ad once per count, alternating between set A and B groups"""
+        ad = Ad.objects.create(name=name, text='Text')
+        for i, count in enumerate(counts):
+            self.posts += 1
+            post = Post.objects.create(
+                ad=ad, fb_group=self.groups['AB'[i % 2]],
+                post_url=f'https://facebook.com/posts/{self.posts}', posted_at=timezone.now(),
+            )
+            Engagement.objects.bulk_create([Engagement(post=post, contact=self.contact, content=f'Hi {n}') for n in range(count)])
+        return ad
+
+    def test_counts_in_one_query(self):
+        ad = self.make_ad('Spring Sale', [1, 2, 3])
+        with CaptureQueriesContext(connection) as queries:
+            counts = post_engagement_counts([ad.id])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(sorted(counts[ad.id]), [('A', 1), ('A', 3), ('B', 2)])
+
+    def test_rates_intervals_and_significance(self):
+        low = self.make_ad('Low', [0, 1, 1, 0, 1, 2] * 5)
+        high = self.make_ad('High', [4, 5, 3, 6, 5, 4] * 5)
+        same = self.make_ad('Same', [1, 0, 1, 1, 0, 2] * 5)
+        comparison = compare_ads([low.id, high.id, same.id], seed=1)
+        overall = comparison['overall']
+        self.assertAlmostEqual(overall[low.id]['rate'], 5 / 6)
+        self.assertAlmostEqual(overall[high.id]['rate'], 4.5)
+        for result in overall.values():
+            self.assertLessEqual(result['ci_low'], result['rate'])
+            self.assertGreaterEqual(result['ci_high'], result['rate'])
+        self.assertNotIn('p_value', overall[low.id])
+        self.assertLess(overall[high.id]['p_value'], 0.01)
+        self.assertGreater(overall[same.id]['p_value'], 0.5)
+        self.assertEqual(set(comparison), {'overall', 'A', 'B'})
+        self.assertEqual(comparison['A'][high.id]['posts'], 15)
+
+    def test_view(self):
+        first = self.make_ad('Spring Sale', [1, 2])
+        second = self.make_ad('Summer Sale', [3, 4])
+        response = self.client.get(reverse('analytics:ab_compare'), {'ads': [first.id, second.id], 'baseline': second.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Set A Groups')
+        self.assertEqual(response.context['baseline'], second.id)
+        response = self.client.get(reverse('analytics:ab_compare'), {'ads': ['x']})
+        self.assertEqual(response.status_code, 400)
+
+
+class RebalanceTest(TestCase):
+    def setUp(self):
+        self.ad = Ad.objects.create(name='Ad', text='Text')
+        self.contact = Contact.objects.create(name='Jane', fb_url='https://facebook.com/jane')
+        # Set A holds both busy groups
+        self.groups = [self.make_group(name, group_set, count) for name, group_set, count in [
+            ('Busy 1', 'A', 9), ('Busy 2', 'A', 8), ('Quiet 1', 'B', 1), ('Quiet 2', 'B', 2),
+        ]]
+
+    def make_group(self, name, group_set, engagements):
+        group = FBGroup.objects.create(name=name, group_url=f'https://facebook.com/groups/{name}', group_set=group_set)
+        post = Post.objects.create(ad=self.ad, fb_group=group, post_url=f'https://facebook.com/posts/{name}', posted_at=timezone.now())
+        Engagement.objects.bulk_create([Engagement(post=post, contact=self.contact, content=f'Hi {n}') for n in range(engagements)])
+        return group
+
+    def spread(self, weights, assignment, sets):
+        totals = [sum(w for w, s in zip(weights, assignment) if s == index) for index in range(sets)]
+        return max(totals) - min(totals)
+
+    def test_partition_finds_even_splits(self):
+        weights = [8, 7, 6, 5, 4]
+        assignment, method = partition(weights, 2)
+        self.assertEqual(self.spread(weights, assignment, 2), 0)
+        self.assertEqual(method, 'exact DP + local search')
+        weights = [3, 3, 3, 2, 2, 2, 1, 1, 1]
+        self.assertEqual(self.spread(weights, partition(weights, 3)[0], 3), 0)
+
+    def test_plan_balances_and_keeps_names(self):
+        plan = plan_rebalance(prior_posts=0)
+        self.assertEqual(plan['current'], {'A': 17, 'B': 3})
+        self.assertEqual(plan['proposed'], {'A': 10, 'B': 10})
+        # One busy and one quiet group swap; the other two stay put
+        self.assertEqual(plan['moves'], 2)
+
+    def test_command_previews_then_applies(self):
+        out = StringIO()
+        call_command('rebalance_groups', '--prior-posts', '0', stdout=out)
+        self.assertIn('Preview only', out.getvalue())
+        self.assertEqual(FBGroup.objects.filter(group_set='A').count(), 2)
+        self.assertEqual(set(FBGroup.objects.filter(group_set='A').values_list('name', flat=True)), {'Busy 1', 'Busy 2'})
+
+        call_command('rebalance_groups', '--prior-posts', '0', '--apply', stdout=out)
+        in_a = set(FBGroup.objects.filter(group_set='A').values_list('name', flat=True))
+        self.assertIn(in_a, [{'Busy 1', 'Quiet 1'}, {'Busy 2', 'Quiet 2'}])
+        with self.assertRaises(CommandError):
+            call_command('rebalance_groups', '--sets', '3', '--apply', stdout=out)
+        with self.assertRaisesMessage(CommandError, '--sets must be between 2 and 26'):
+            call_command('rebalance_groups', '--sets', '27', stdout=out)
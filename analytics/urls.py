@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = 'analytics'
+
+urlpatterns = [
+    path('velocity/', views.velocity, name='velocity'),
+    path('ab/', views.ab_compare, name='ab_compare'),
+]
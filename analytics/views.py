@@ -0,0 +1,42 @@
+from django.http import HttpResponseBadRequest
+from django.shortcuts import render
+from core.routers import use_replica
+from posts.models import Ad
+from .ab import compare_ads
+from .rollups import velocity_report
+
+@use_replica
+def velocity(request):
+    """Engagement velocity per ad and group, with each ad's fastest posts"""
+    return render(request, 'analytics/velocity.html', velocity_report())
+
+@use_replica
+def ab_compare(request):
+    """Compare the engagement rates of the selected ads against a baseline ad"""
+    try:
+        selected = [int(ad_id) for ad_id in request.GET.getlist('ads')]
+        baseline = int(request.GET['baseline']) if request.GET.get('baseline') else None
+    except ValueError:
+        return HttpResponseBadRequest('Invalid ad id')
+
+    ads = Ad.objects.order_by('name')
+    names = dict(ads.values_list('id', 'name'))
+    selected = [ad_id for ad_id in dict.fromkeys(selected) if ad_id in names]
+    if baseline not in selected:
+        baseline = selected[0] if selected else None
+
+    tables = []
+    if len(selected) >= 2:
+        comparison = compare_ads(selected, baseline=baseline)
+        for key, title in [('overall', 'All Groups'), ('A', 'Set A Groups'), ('B', 'Set B Groups')]:
+            results = comparison.get(key, {})
+            rows = [dict(results[ad_id], ad_id=ad_id, name=names[ad_id]) for ad_id in selected if ad_id in results]
+            tables.append((title, rows))
+
+    context = {
+        'ads': ads,
+        'selected': selected,
+        'baseline': baseline,
+        'tables': tables,
+    }
+    return render(request, 'analytics/ab_compare.html', context)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import FBGroup
+from .models import ChangeFeedOffset, ChangeLog, FBGroup, JobRun
 
 @admin.register(FBGroup)
 class FBGroupAdmin(admin.ModelAdmin):
@@ -14,3 +14,32 @@ class FBGroupAdmin(admin.ModelAdmin):
             'fields': ('group_url',)
         }),
     )
+
+@admin.register(ChangeLog)
+class ChangeLogAdmin(admin.ModelAdmin):
+    list_display = ('id', 'action', 'model', 'object_id', 'fields', 'origin', 'recorded_at')
+    list_filter = ('action', 'model', 'origin')
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ChangeFeedOffset)
+class ChangeFeedOffsetAdmin(admin.ModelAdmin):
+    list_display = ('consumer', 'position', 'updated_at')
+    readonly_fields = ('updated_at',)
+
+@admin.register(JobRun)
+class JobRunAdmin(admin.ModelAdmin):
+    list_display = ('job', 'scheduled_for', 'status', 'duration', 'result', 'started_at')
+    list_filter = ('status', 'job')
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from .changes import connect_change_receivers
+        from .signals import connect_receivers
+        connect_receivers()
+        connect_change_receivers()
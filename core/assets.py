@@ -0,0 +1,148 @@
+"""
+Static asset bundles.
+
+``manage.py build_assets`` concatenates and minifies the app's own CSS and
+JS into ``layout/assets/bundles/`` before ``collectstatic`` content-hashes
+them. The ``{% bundle %}`` template tag links the built bundle when it
+exists, and falls back to the source files in DEBUG or before a build.
+"""
+
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+BUNDLE_DIR = 'bundles'
+
+# Bundle name -> source files, in load order
+BUNDLES = {
+    'app.css': ['css/styles.css', 'css/bootstrap.min.css'],
+    'app.js': ['js/scripts.js'],
+}
+
+
+def built_name(name):
+    """Static path of a built bundle, e.g. 'app.css' -> 'bundles/app.min.css'"""
+    stem, _, ext = name.rpartition('.')
+    return f'{BUNDLE_DIR}/{stem}.min.{ext}'
+
+
+@lru_cache(maxsize=None)
+def _built_bundle_exists(name):
+    return finders.find(built_name(name)) is not None
+
+
+def bundle_paths(name):
+    """Static paths to load for a bundle: the built file, or its sources"""
+    if not settings.DEBUG and _built_bundle_exists(name):
+        return [built_name(name)]
+    return BUNDLES[name]
+
+
+def minify_css(source):
+    """Drop comments (except /*! licences) and insignificant whitespace"""
+    source = re.sub(r'/\*(?!!).*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip()
+
+
+def _js_state_after(text, state):
+    """
+    What a line of JavaScript ends inside: a template literal ('`'), a
+    block comment ('/*') or neither (None), given the same for its start.
+    Quotes and regular expressions do not span lines, so they are not
+    carried over.
+    """
+    quote = None
+    i = 0
+    while i < len(text):
+        if state == '/*':
+            end = text.find('*/', i)
+            if end == -1:
+                return state
+            state, i = None, end + 2
+            continue
+        char = text[i]
+        if char == '\\':
+            i += 2
+            continue
+        if quote:
+            if char == quote:
+                quote = None
+        elif state == '`':
+            if char == '`':
+                state = None
+        elif char in '\'"':
+            quote = char
+        elif char == '`':
+            state = '`'
+        elif text.startswith('//', i):
+            break
+        elif text.startswith('/*', i):
+            state = '/*'
+            i += 2
+            continue
+        i += 1
+    return state
+
+
+def minify_js(source):
+    """
+    Conservatively shrink JavaScript: drop comments that start a line,
+    indentation and blank lines. Statements are never joined, so automatic
+    semicolon insertion and string contents are unaffected; the lines of a
+    template literal are kept as they are.
+    """
+    lines = []
+    state = None
+    # Whether the open block comment started a line and is being dropped
+    dropping = False
+    for line in source.splitlines():
+        if state == '`':
+            lines.append(line)
+            state = _js_state_after(line, state)
+            continue
+        text = line.lstrip()
+        if state == '/*' and dropping:
+            end = text.find('*/')
+            if end == -1:
+                continue
+            text, state = text[end + 2:].lstrip(), None
+        elif state is None and text.startswith('/*') and not text.startswith('/*!'):
+            end = text.find('*/', 2)
+            if end == -1:
+                state, dropping = '/*', True
+                continue
+            text = text[end + 2:].lstrip()
+        dropping = False
+        if state is None and text.startswith('//'):
+            continue
+        state = _js_state_after(text, state)
+        if text.strip():
+            # Trailing whitespace of an open template literal is its text
+            lines.append(text if state == '`' else text.rstrip())
+    return '\n'.join(lines)
+
+
+def build_bundle(name):
+    """
+    Concatenate and minify a bundle's sources.
+
+    Args:
+        name (str): Key of ``BUNDLES``
+
+    Returns:
+        tuple: (bundled text, total size of the sources in bytes)
+    """
+    minify = minify_css if name.endswith('.css') else minify_js
+    parts = []
+    source_size = 0
+    for path in BUNDLES[name]:
+        with open(finders.find(path), encoding='utf-8') as source:
+            text = source.read()
+        source_size += len(text.encode())
+        # Already-minified vendor files are included as-is
+        parts.append(text if '.min.' in path else minify(text))
+    return '\n'.join(parts) + '\n', source_size
@@ -0,0 +1,112 @@
+"""
+Search helpers behind the autocomplete JSON endpoints.
+Runs a limited prefix query first and tops it up with fuzzy matches,
+caching each response for a short time.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, FloatField, Func, Lookup, TextField, Value
+from django.db.models.functions import Cast, Upper
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
+
+from .cache import cached_query
+
+# Maximum number of matches returned by an autocomplete endpoint
+AUTOCOMPLETE_LIMIT = 20
+
+
+class TrigramSimilar(Lookup):
+    """pg_trgm ``%`` operator, which can use a gin_trgm_ops index"""
+    lookup_name = 'trigram_similar'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} %% {rhs}', (*lhs_params, *rhs_params)
+
+
+class TrigramSimilarity(Func):
+    """pg_trgm ``similarity()``, used to rank fuzzy matches"""
+    function = 'SIMILARITY'
+    output_field = FloatField()
+
+
+def _indexed_name(field):
+    # Matches the UPPER(name::text) expression the trigram indexes are built on
+    return Upper(Cast(F(field), output_field=TextField()))
+
+
+def search(queryset, field, term, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Find rows whose ``field`` matches ``term``.
+
+    Prefix matches come first, ordered by ``field``. If there are fewer than
+    ``limit`` of them, the rest are filled with trigram matches on PostgreSQL,
+    or substring matches on other databases.
+
+    Args:
+        queryset (QuerySet): Rows to search
+        field (str): Name of the text field to match against
+        term (str): The text typed by the user
+        limit (int): Maximum number of matches
+
+    Returns:
+        list: (pk, label) tuples
+    """
+    matches = list(
+        queryset.filter(**{f'{field}__istartswith': term})
+        .order_by(field)
+        .values_list('pk', field)[:limit]
+    )
+    if len(matches) >= limit:
+        return matches
+
+    if connections[queryset.db].vendor == 'postgresql':
+        needle = Upper(Value(term))
+        fuzzy = (
+            queryset.filter(TrigramSimilar(_indexed_name(field), needle))
+            .annotate(similarity=TrigramSimilarity(_indexed_name(field), needle))
+            .order_by('-similarity', field)
+        )
+    else:
+        fuzzy = queryset.filter(**{f'{field}__icontains': term}).order_by(field)
+    fuzzy = fuzzy.exclude(pk__in=[pk for pk, _ in matches]).values_list('pk', field)
+    matches.extend(fuzzy[:limit - len(matches)])
+    return matches
+
+
+def autocomplete_response(request, queryset, field):
+    """
+    Build the JSON response for an autocomplete endpoint.
+    Responses are cached server-side and in the browser for
+    ``AUTOCOMPLETE_CACHE_TTL`` seconds; new or renamed rows show up
+    server-side straight away, as saving them invalidates the namespace.
+
+    Args:
+        request (HttpRequest): Request carrying the search term in ``q``
+        queryset (QuerySet): Rows to search
+        field (str): Name of the text field to match against
+
+    Returns:
+        JsonResponse: ``{"results": [{"id": ..., "text": ...}, ...]}``
+    """
+    term = request.GET.get('q', '').strip()
+    ttl = getattr(settings, 'AUTOCOMPLETE_CACHE_TTL', 30)
+
+    results = []
+    if term:
+        digest = hashlib.md5(term.lower().encode()).hexdigest()
+        results = cached_query(
+            f'autocomplete:{queryset.model._meta.label_lower}',
+            f'{field}:{digest}',
+            lambda: [{'id': pk, 'text': label} for pk, label in search(queryset, field, term)],
+            ttl=ttl,
+        )
+
+    response = JsonResponse({'results': results})
+    patch_cache_control(response, private=True, max_age=ttl)
+    return response
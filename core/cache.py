@@ -0,0 +1,131 @@
+"""
+Shared caching of expensive query results.
+
+``cached_query`` stores a computed value under a versioned key in the
+default cache, which is shared between gunicorn workers when CACHE_BACKEND
+is 'file' or 'redis'. Bumping a namespace's version with ``invalidate``
+orphans every key in it at once, so writes never have to find and delete
+individual entries. Versions start from the clock rather than 1, so a
+version key the cache evicts never comes back as a version already used.
+
+Two guards keep a popular key from being recomputed by every worker at the
+moment it expires (a cache stampede):
+
+- probabilistic early expiry: each read may decide to refresh a little
+  before the TTL runs out, with a chance that grows as expiry nears and as
+  the value gets more expensive to compute
+- a short lock on misses, so one worker computes while the others wait for
+  its result instead of querying the database as well
+
+The lock relies on ``cache.add`` being atomic, which redis guarantees; the
+file backend only approximates it, so under it workers can occasionally
+compute the same key together.
+"""
+
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# Seconds a worker may hold the recompute lock for one key
+CACHE_LOCK_TIMEOUT = 10
+
+# How long, and how often, a worker waits for another's recompute
+CACHE_LOCK_WAIT = 2.0
+CACHE_LOCK_POLL = 0.05
+
+
+def _initial_version():
+    # Nanoseconds since the epoch: ahead of any version bumped from an
+    # earlier start, however often it was bumped
+    return time.time_ns()
+
+
+def namespace_version(namespace):
+    """Current version of a cache namespace"""
+    version_key = f'cachever:{namespace}'
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, _initial_version(), timeout=None)
+        version = cache.get(version_key)
+    return version
+
+
+def _bump(namespaces):
+    for namespace in namespaces:
+        version_key = f'cachever:{namespace}'
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            # Unknown key: nothing cached under the namespace yet
+            cache.add(version_key, _initial_version(), timeout=None)
+
+
+def invalidate(*namespaces, using=None):
+    """
+    Drop every cached value in the given namespaces by bumping their version.
+
+    Inside a transaction the versions are bumped again once it commits: a
+    worker reading in between still sees the old rows, and may cache them
+    under the first new version.
+    """
+    _bump(namespaces)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: _bump(namespaces), using=using)
+
+
+def _should_refresh_early(delta, expires_at, beta):
+    # XFetch: refresh when now - delta * beta * log(rand) passes the expiry
+    return time.time() - delta * beta * math.log(random.random() or 1e-12) >= expires_at
+
+
+def cached_query(namespace, key, compute, ttl=None, beta=1.0, refresh=False):
+    """
+    Return a cached value, computing and storing it on a miss.
+
+    Args:
+        namespace (str): Invalidation group, e.g. 'dashboard'
+        key (str): Key within the namespace
+        compute (callable): Produces the value; must return something picklable
+        ttl (int): Seconds to keep the value; defaults to CACHE_QUERY_TTL
+        beta (float): Eagerness of early refresh; 0 disables it
+        refresh (bool): Compute and store the value even if cached, to warm
+            the cache ahead of readers
+
+    Returns:
+        The cached or freshly computed value
+    """
+    ttl = ttl if ttl is not None else getattr(settings, 'CACHE_QUERY_TTL', 60)
+    cache_key = f'query:{namespace}:v{namespace_version(namespace)}:{key}'
+    lock_key = f'{cache_key}:lock'
+
+    entry = None if refresh else cache.get(cache_key)
+    if entry is not None:
+        value, delta, expires_at = entry
+        if not beta or not _should_refresh_early(delta, expires_at, beta):
+            return value
+        # Refresh early in one worker only; the rest keep serving this value
+        if not cache.add(lock_key, 1, timeout=CACHE_LOCK_TIMEOUT):
+            return value
+    elif not cache.add(lock_key, 1, timeout=CACHE_LOCK_TIMEOUT):
+        # Another worker is computing this key; wait briefly for its result
+        deadline = time.monotonic() + CACHE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(CACHE_LOCK_POLL)
+            entry = cache.get(cache_key)
+            if entry is not None:
+                return entry[0]
+        # Still nothing: compute here rather than fail the request
+        return compute()
+
+    try:
+        start = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - start
+        cache.set(cache_key, (value, delta, time.time() + ttl), ttl)
+    finally:
+        cache.delete(lock_key)
+    return value
@@ -0,0 +1,321 @@
+"""
+Change feed (transactional outbox) of the app's main models.
+
+Every write to a tracked model (groups, ads, posts, contacts, engagements)
+appends a ChangeLog entry in the same transaction: ``TrackedModel.save``
+and a post_delete receiver cover single rows, and ``TrackedQuerySet``
+covers ``bulk_create``, ``bulk_update``, ``update`` and ``delete``.
+
+Entries are read in commit order rather than by id: ids are handed out on
+insert, so an entry from a long transaction (an archival run, a large bulk
+update) can commit below ids a reader has already passed. Before reading,
+``sequence_changes`` numbers the entries committed since its last run above
+every number given before, and readers keep the last sequence they handled
+as their offset. ``prune_change_log`` drops the entries every reader has
+passed.
+
+Readers are:
+
+- consumers, which ``consume`` batches of entries and keep derived data
+  (rollups, counters) up to date; each has a durable offset that moves in
+  the same transaction as the consumer's own writes, so a consumer that
+  was down simply catches up from where it stopped
+- the sync app, which sends rows changed after a peer's watermark
+
+As with cache invalidation, engagements get no post_delete receiver so
+they can still be fast-deleted; their queryset records the deletes, and
+engagements removed by the cascade from a deleted post are implied by the
+post's entry.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.apps import apps
+from django.conf import settings
+from django.db import models, router, transaction
+from django.db.models import F, Max, Min
+from django.db.models.signals import post_delete
+from django.utils.module_loading import import_string
+
+from .signals import FAST_DELETE_MODELS
+
+# Tracked models, parents before children
+TRACKED_MODELS = [
+    'core.FBGroup',
+    'posts.Ad',
+    'posts.Post',
+    'engagement.Contact',
+    'engagement.Engagement',
+]
+
+# Origin of archival writes: visible to consumers, never sent to sync peers
+ARCHIVE_ORIGIN = 'archive'
+
+# Entries handed to a consumer at a time
+CHANGE_FEED_BATCH_SIZE = 1000
+
+# ChangeFeedOffset row holding the last sequence handed out; locking it
+# keeps two sequence_changes calls from numbering entries at once
+SEQUENCER = 'core.sequencer'
+
+# Origin recorded for the writes being made; None stops recording
+_origin = ContextVar('change_origin', default='')
+
+
+@contextmanager
+def change_origin(origin):
+    """Record the writes made inside the block with the given origin, e.g. a sync peer"""
+    token = _origin.set(origin)
+    try:
+        yield
+    finally:
+        _origin.reset(token)
+
+
+@contextmanager
+def untracked():
+    """Keep the writes made inside the block out of the change log"""
+    token = _origin.set(None)
+    try:
+        yield
+    finally:
+        _origin.reset(token)
+
+
+def record_changes(model, rows, action='save', fields=()):
+    """
+    Append change log entries for written rows.
+
+    Args:
+        model: Model class the rows belong to
+        rows: (pk, sync_id) pairs
+        action (str): 'save' or 'delete'
+        fields: Names of the fields written, if known
+    """
+    origin = _origin.get()
+    if origin is None:
+        return
+    ChangeLog = apps.get_model('core', 'ChangeLog')
+    label = model._meta.label
+    fields = ','.join(fields)
+    ChangeLog.objects.bulk_create([
+        ChangeLog(model=label, object_id=pk, sync_id=sync_id, action=action, fields=fields, origin=origin)
+        for pk, sync_id in rows
+    ])
+
+
+def record_delete(sender, instance, **kwargs):
+    record_changes(sender, [(instance.pk, instance.sync_id)], action='delete')
+
+
+def derive_fields(model, objs, fields=None):
+    """
+    Compute a model's derived fields (TrackedModel.DERIVED_FIELDS) on
+    objects about to be written.
+
+    Args:
+        model: Model class of the objects
+        objs: Objects to fill in
+        fields: Only compute the fields whose source is among these
+
+    Returns:
+        list: Names of the fields computed
+    """
+    derived = [
+        name for name, (source, _) in model.DERIVED_FIELDS.items()
+        if fields is None or source in fields
+    ]
+    for obj in objs:
+        for name in derived:
+            source, function = model.DERIVED_FIELDS[name]
+            setattr(obj, name, function(getattr(obj, source)))
+    return derived
+
+
+class TrackedQuerySet(models.QuerySet):
+    """QuerySet whose bulk writes are recorded in the change log"""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        derive_fields(self.model, objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            rows = [(obj.pk, obj.sync_id) for obj in objs]
+            if any(pk is None for pk, _ in rows) and _origin.get() is not None:
+                # ignore_conflicts leaves pks unset; only the inserted sync_ids exist
+                rows = self.filter(sync_id__in=[obj.sync_id for obj in objs]).values_list('pk', 'sync_id')
+            record_changes(self.model, rows)
+        return objs
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        fields = [*fields, *derive_fields(self.model, objs, fields)]
+        with transaction.atomic(using=self.db, savepoint=False):
+            # bulk_update goes through update(); record the rows once here
+            with untracked():
+                updated = super().bulk_update(objs, fields, batch_size=batch_size)
+            if _origin.get() is not None:
+                # Read sync_ids back: objects built from a bare pk carry a fresh one
+                rows = self.filter(pk__in=[obj.pk for obj in objs]).values_list('pk', 'sync_id')
+                record_changes(self.model, rows, fields=fields)
+        return updated
+
+    def update(self, **kwargs):
+        for name, (source, function) in self.model.DERIVED_FIELDS.items():
+            if source not in kwargs or name in kwargs:
+                continue
+            if hasattr(kwargs[source], 'resolve_expression'):
+                raise ValueError(f'Cannot derive {name} from an expression; pass {name} to update() as well')
+            kwargs[name] = function(kwargs[source])
+        with transaction.atomic(using=self.db, savepoint=False):
+            rows = list(self.values_list('pk', 'sync_id')) if _origin.get() is not None else []
+            updated = super().update(**kwargs)
+            record_changes(self.model, rows, fields=kwargs)
+        return updated
+
+    def delete(self):
+        if self.model._meta.label not in FAST_DELETE_MODELS:
+            # Collected rows, cascades included, are recorded by record_delete
+            return super().delete()
+        with transaction.atomic(using=self.db, savepoint=False):
+            rows = list(self.values_list('pk', 'sync_id')) if _origin.get() is not None else []
+            deleted = super().delete()
+            record_changes(self.model, rows, action='delete')
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class TrackedModel(models.Model):
+    """Base for models whose writes are recorded in the change log"""
+
+    objects = TrackedQuerySet.as_manager()
+
+    # Columns computed from another field on every write, such as a hash
+    # behind a unique constraint: name -> (source field, function)
+    DERIVED_FIELDS = {}
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        derived = derive_fields(type(self), [self], update_fields)
+        if update_fields is not None and derived:
+            kwargs['update_fields'] = {*update_fields, *derived}
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            record_changes(type(self), [(self.pk, self.sync_id)], fields=kwargs.get('update_fields') or ())
+
+    def delete(self, *args, **kwargs):
+        if self._meta.label in FAST_DELETE_MODELS:
+            # Record through the queryset, as no post_delete receiver will
+            return type(self)._default_manager.filter(pk=self.pk).delete()
+        return super().delete(*args, **kwargs)
+
+
+def connect_change_receivers():
+    """Connect the change log receivers; called from CoreConfig.ready"""
+    for label in TRACKED_MODELS:
+        if label not in FAST_DELETE_MODELS:
+            post_delete.connect(record_delete, sender=apps.get_model(label), dispatch_uid=f'changes:delete:{label}')
+
+
+def sequence_changes():
+    """
+    Number the committed change log entries that have no sequence yet, in
+    id order and above every sequence given before.
+
+    Entries of transactions still in flight are invisible here, so they are
+    numbered by a later call, once committed, and never below an offset a
+    reader has already moved to. Runs in its own transaction: call it
+    outside the reader's, so the sequencer lock is only held briefly.
+
+    Returns:
+        int: The last sequence handed out
+    """
+    ChangeLog = apps.get_model('core', 'ChangeLog')
+    ChangeFeedOffset = apps.get_model('core', 'ChangeFeedOffset')
+    ChangeFeedOffset.objects.get_or_create(consumer=SEQUENCER)
+    with transaction.atomic():
+        sequencer = ChangeFeedOffset.objects.select_for_update().get(consumer=SEQUENCER)
+        bounds = ChangeLog.objects.filter(sequence__isnull=True).aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is not None:
+            # One statement shifting the ids above the last sequence; an entry
+            # committed below `low` meanwhile is left for the next call
+            ChangeLog.objects.filter(sequence__isnull=True, id__range=(bounds['low'], bounds['high'])).update(
+                sequence=F('id') - bounds['low'] + sequencer.position + 1,
+            )
+            sequencer.position += bounds['high'] - bounds['low'] + 1
+            sequencer.save(update_fields=['position', 'updated_at'])
+    return sequencer.position
+
+
+def pending_changes(after, limit):
+    """Sequenced change log entries after a sequence, oldest first"""
+    ChangeLog = apps.get_model('core', 'ChangeLog')
+    return ChangeLog.objects.filter(sequence__gt=after).order_by('sequence')[:limit]
+
+
+def consume(consumer, handle=None, batch_size=CHANGE_FEED_BATCH_SIZE):
+    """
+    Hand the change log entries a consumer has not seen to it, in batches.
+
+    Each batch is handled, and the consumer's offset moved past it, in one
+    transaction: derived data and offset commit together, and a batch that
+    fails is handed over again on the next run.
+
+    Args:
+        consumer (str): Consumer name, a key of CHANGE_FEED_CONSUMERS
+        handle (callable): Takes a list of ChangeLog entries; defaults to
+            the consumer's entry in CHANGE_FEED_CONSUMERS
+        batch_size (int): Entries per batch
+
+    Returns:
+        int: Number of entries consumed
+    """
+    ChangeFeedOffset = apps.get_model('core', 'ChangeFeedOffset')
+    handle = handle or import_string(settings.CHANGE_FEED_CONSUMERS[consumer])
+    ChangeFeedOffset.objects.get_or_create(consumer=consumer)
+    consumed = 0
+    while True:
+        sequence_changes()
+        with transaction.atomic():
+            offset = ChangeFeedOffset.objects.select_for_update().get(consumer=consumer)
+            batch = list(pending_changes(offset.position, batch_size))
+            if batch:
+                handle(batch)
+                offset.position = batch[-1].sequence
+                offset.save(update_fields=['position', 'updated_at'])
+        consumed += len(batch)
+        if len(batch) < batch_size:
+            return consumed
+
+
+def consume_all():
+    """Job handing new change log entries to every consumer of CHANGE_FEED_CONSUMERS"""
+    counts = {consumer: consume(consumer) for consumer in settings.CHANGE_FEED_CONSUMERS}
+    return ', '.join(f'{consumer}: {count}' for consumer, count in counts.items()) or 'No consumers'
+
+
+def prune_change_log():
+    """
+    Job deleting the change log entries every reader has passed: each
+    consumer of CHANGE_FEED_CONSUMERS and each sync peer, by the last
+    sequence it has received. A reader that never ran keeps everything.
+    """
+    ChangeLog = apps.get_model('core', 'ChangeLog')
+    ChangeFeedOffset = apps.get_model('core', 'ChangeFeedOffset')
+    offsets = dict(ChangeFeedOffset.objects.filter(
+        consumer__in=settings.CHANGE_FEED_CONSUMERS,
+    ).values_list('consumer', 'position'))
+    positions = [offsets.get(consumer, 0) for consumer in settings.CHANGE_FEED_CONSUMERS]
+    if apps.is_installed('sync'):
+        SyncPeer = apps.get_model('sync', 'SyncPeer')
+        watermarks = dict(SyncPeer.objects.values_list('name', 'pushed_version'))
+        positions += [watermarks.get(name, 0) for name in {*watermarks, *settings.SYNC_PEERS}]
+    if not positions:
+        return 'No readers'
+    deleted, _ = ChangeLog.objects.filter(sequence__lte=min(positions)).delete()
+    return f'{deleted} entries pruned'
@@ -0,0 +1,63 @@
+"""
+Cached data behind the dashboard.
+
+The home page shows today's set with its groups and the post history, both
+read through ``cached_query`` in the 'dashboard' namespace. Every write
+they show invalidates the namespace (see core.signals), so they are kept
+for CACHE_WARM_TTL instead of the short default, and the scheduler (see
+core.scheduler) computes them shortly before the daily posting window, so
+the first load of the day does not pay for them.
+"""
+
+from django.conf import settings
+from django.db.models import Count, F
+from django.utils import timezone
+
+from posts.models import Post
+from .cache import cached_query
+from .models import FBGroup
+
+
+def get_today_set(day=None):
+    """
+    Determine which set (A or B) should be posted to on a day, today in
+    TIME_ZONE by default.
+    Monday, Wednesday, Friday = A
+    Tuesday, Thursday, Saturday = B
+    Sunday = None
+    """
+    weekday = (day or timezone.localdate()).weekday()  # 0=Monday, 6=Sunday
+    if weekday in [0, 2, 4]:  # Monday, Wednesday, Friday
+        return 'A'
+    elif weekday in [1, 3, 5]:  # Tuesday, Thursday, Saturday
+        return 'B'
+    return None
+
+
+def set_groups(group_set, refresh=False):
+    """Groups of a set, by name"""
+    return cached_query('dashboard', f'set_groups:{group_set}', lambda: list(
+        FBGroup.objects.filter(group_set=group_set).order_by('name', 'id')
+    ), ttl=settings.CACHE_WARM_TTL, refresh=refresh)
+
+
+def post_history(refresh=False):
+    """Every post with its engagement total, most recently updated first"""
+    return cached_query('dashboard', 'post_history', lambda: list(
+        Post.objects.select_related('ad', 'fb_group').annotate(
+            engagement_total=Count('engagements') + F('archived_engagements')
+        ).order_by('-last_updated')
+    ), ttl=settings.CACHE_WARM_TTL, refresh=refresh)
+
+
+def precompute_schedule():
+    """Job computing today's set and its groups"""
+    today_set = get_today_set()
+    if not today_set:
+        return 'No set today'
+    return f'Set {today_set}: {len(set_groups(today_set, refresh=True))} groups'
+
+
+def warm_dashboard():
+    """Job computing the post history"""
+    return f'{len(post_history(refresh=True))} posts'
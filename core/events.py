@@ -0,0 +1,79 @@
+"""
+Server-sent events for the live dashboard.
+
+Open dashboards hold one ``core:dashboard_events`` stream each. The stream
+only queries the database after the 'dashboard' cache namespace version
+moves (see core.signals), and then sends a small diff per changed post,
+which the page patches into its post history table.
+"""
+
+import json
+from datetime import timedelta
+
+from django.db.models import Count, F
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.models import Post
+from engagement.models import Engagement
+
+# Changes are looked up this far behind the cursor, so a row committed just
+# after the previous look-up is not missed. Resending a post is harmless.
+DASHBOARD_EVENTS_OVERLAP = timedelta(seconds=2)
+
+
+def parse_cursor(value):
+    """Read a stream cursor (an ISO timestamp), or None if it is not one"""
+    cursor = parse_datetime(value or '')
+    if cursor is None:
+        return None
+    if timezone.is_naive(cursor):
+        cursor = timezone.make_aware(cursor)
+    return cursor
+
+
+def dashboard_changes(since):
+    """
+    Collect the posts whose history row changed after ``since``.
+
+    Args:
+        since (datetime): Cursor from the previous look-up
+
+    Returns:
+        tuple: (list of post dicts, cursor for the next look-up)
+    """
+    cursor = timezone.now()
+    after = since - DASHBOARD_EVENTS_OVERLAP
+    post_ids = set(Post.objects.filter(last_updated__gt=after).values_list('id', flat=True))
+    post_ids.update(Engagement.objects.filter(created_at__gt=after).values_list('post_id', flat=True))
+    if not post_ids:
+        return [], cursor
+
+    posts = Post.objects.filter(id__in=post_ids).select_related('ad', 'fb_group').annotate(
+        engagement_total=Count('engagements') + F('archived_engagements')
+    ).order_by('last_updated')
+    changes = [
+        {
+            'id': post.id,
+            'ad_name': post.ad.name,
+            'fb_group_name': post.fb_group.name,
+            'posted_at': timezone.localtime(post.posted_at).strftime('%b %d, %Y %H:%M'),
+            'last_updated': timezone.localtime(post.last_updated).strftime('%b %d, %Y %H:%M'),
+            'engagement_total': post.engagement_total,
+            'url': reverse('engagement:view_engagements', args=[post.id]),
+        }
+        for post in posts
+    ]
+    return changes, cursor
+
+
+def format_event(data, event=None, event_id=None):
+    """Encode one server-sent event"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,25 @@
+"""
+Reusable query expressions.
+"""
+
+from django.db.models import IntegerField, Subquery
+
+
+class SubqueryCount(Subquery):
+    """
+    Count the rows of a correlated subquery.
+
+    Unlike Count() over a join, the count is evaluated only for the rows the
+    outer query returns, so annotating a paginated list stays cheap no matter
+    how large the related table is. The annotation can still be ordered by.
+
+    Usage:
+        Contact.objects.annotate(
+            engagement_total=SubqueryCount(Engagement.objects.filter(contact=OuterRef('pk')))
+        )
+    """
+    template = '(SELECT COUNT(*) FROM (%(subquery)s) _count)'
+    output_field = IntegerField()
+
+    def __init__(self, queryset, **extra):
+        super().__init__(queryset.order_by().values('pk'), **extra)
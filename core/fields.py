@@ -0,0 +1,33 @@
+"""
+Model fields that keep heavy optional libraries out of process startup.
+"""
+
+from importlib.util import find_spec
+
+from django.core import checks
+from django.db import models
+
+
+class ImageField(models.ImageField):
+    """
+    ``models.ImageField`` whose system check looks Pillow up without importing
+    it. Django's own check imports PIL on every management command and worker
+    boot; here Pillow is first imported when an uploaded image is validated.
+    """
+
+    def _check_image_library_installed(self):
+        if find_spec('PIL') is None:
+            return [
+                checks.Error(
+                    'Cannot use ImageField because Pillow is not installed.',
+                    hint='Get Pillow at https://pypi.org/project/Pillow/.',
+                    obj=self,
+                    id='fields.E210',
+                )
+            ]
+        return []
+
+    def deconstruct(self):
+        # Behaves exactly like the stock field, so migrations keep using it
+        name, path, args, kwargs = super().deconstruct()
+        return name, 'django.db.models.ImageField', args, kwargs
@@ -0,0 +1,79 @@
+import random
+import re
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from core.markdown_utils import STRIKE, UNICODE_TABLES, markdown_to_unicode
+
+# The per-character approach markdown_to_unicode replaces: one regex pass per
+# style, then a dict lookup for every character of each span
+NAIVE_PASSES = [
+    ('bold', r'\*\*(.+?)\*\*'),
+    ('bold', r'(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)'),
+    ('italic', r'__(.+?)__'),
+    ('italic', r'(?<!_)_(?!_)(.+?)(?<!_)_(?!_)'),
+    ('strike', r'~(.+?)~'),
+    ('cursive', r'\^\^(.+?)\^\^'),
+    ('double_struck', r'\|\|(.+?)\|\|'),
+]
+
+NAIVE_MAPS = {
+    style: {chr(code): char for code, char in table.items()}
+    for style, table in UNICODE_TABLES.items()
+}
+
+
+def naive_to_unicode(text):
+    for style, pattern in NAIVE_PASSES:
+        if style == 'strike':
+            def replace(match):
+                return ''.join(char + STRIKE for char in match.group(1))
+        else:
+            def replace(match, mapping=NAIVE_MAPS[style]):
+                return ''.join(mapping.get(char, char) for char in match.group(1))
+        text = re.sub(pattern, replace, text)
+    return text
+
+
+def sample_ad(rng, words):
+    """An ad-like text where about half the words sit in styled phrases"""
+    markers = ['**', '_', '~', '^^', '||']
+    letters = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+    out = []
+    while len(out) < words:
+        phrase = [
+            ''.join(rng.choice(letters) for _ in range(rng.randint(2, 9)))
+            for _ in range(rng.randint(1, 8))
+        ]
+        if rng.random() < 0.5:
+            marker = rng.choice(markers)
+            phrase[0] = marker + phrase[0]
+            phrase[-1] += marker
+        out.extend(phrase)
+    return ' '.join(out)
+
+
+class Command(BaseCommand):
+    help = 'Compare the translate-table Facebook formatter against a per-character mapping'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ads', type=int, default=200, help='Synthetic ads to format')
+        parser.add_argument('--words', type=int, default=120, help='Words per ad')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        ads = [sample_ad(rng, options['words']) for _ in range(options['ads'])]
+        mismatches = sum(markdown_to_unicode(ad) != naive_to_unicode(ad) for ad in ads)
+
+        results = {}
+        for name, formatter in [('naive', naive_to_unicode), ('translate', markdown_to_unicode)]:
+            best = min(timeit.repeat(lambda: [formatter(ad) for ad in ads], number=1, repeat=options['repeat']))
+            results[name] = best / len(ads) * 1e6
+            self.stdout.write(f'{name:<10} {results[name]:>10.1f} us per ad')
+
+        self.stdout.write(f"speedup    {results['naive'] / results['translate']:>10.2f}x")
+        if mismatches:
+            self.stdout.write(self.style.WARNING(f'{mismatches} ads formatted differently'))
@@ -0,0 +1,39 @@
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from core.markdown_utils import markdown_to_html, render_many, strip_many, strip_markdown
+from .bench_fbtext import sample_ad
+
+
+def sample_page(rng, rows, words, distinct):
+    """Texts of a list page, where ``distinct`` of the rows differ and the rest repeat them"""
+    texts = [sample_ad(rng, words) for _ in range(distinct)]
+    return [rng.choice(texts) for _ in range(rows)]
+
+
+class Command(BaseCommand):
+    help = 'Compare per-row markdown rendering of a list page against the batch API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Rows per page')
+        parser.add_argument('--words', type=int, default=40, help='Words per text')
+        parser.add_argument('--distinct', type=float, default=0.8, help='Share of rows with a text of their own')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        rows = options['rows']
+        page = sample_page(rng, rows, options['words'], max(1, int(rows * options['distinct'])))
+
+        for name, per_row, batch in [('strip', strip_markdown, strip_many), ('html', markdown_to_html, render_many)]:
+            if batch(page) != [per_row(text) for text in page]:
+                self.stdout.write(self.style.WARNING(f'{name}: batch output differs from per-row output'))
+            row_time = min(timeit.repeat(lambda: [per_row(text) for text in page], number=1, repeat=options['repeat']))
+            batch_time = min(timeit.repeat(lambda: batch(page), number=1, repeat=options['repeat']))
+            self.stdout.write(
+                f'{name:<6} per row {row_time * 1000:>8.2f} ms   batch {batch_time * 1000:>8.2f} ms   '
+                f'speedup {row_time / batch_time:>5.2f}x   ({rows} rows)'
+            )
@@ -0,0 +1,182 @@
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# A cut-down copy of the contact/post/engagement tables and the index the
+# engagement thread reads through
+SCHEMA = """
+CREATE TABLE contact (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE post (id INTEGER PRIMARY KEY, posted_at TEXT NOT NULL);
+CREATE TABLE engagement (
+    id INTEGER PRIMARY KEY,
+    post_id INTEGER NOT NULL REFERENCES post (id),
+    contact_id INTEGER NOT NULL REFERENCES contact (id),
+    content TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX engagement_post_recent ON engagement (post_id, created_at DESC, id DESC);
+"""
+
+WINDOW_QUERY = """
+SELECT engagement.id, contact.name, engagement.content
+FROM engagement JOIN contact ON contact.id = engagement.contact_id
+WHERE engagement.post_id = ?
+ORDER BY engagement.created_at DESC, engagement.id DESC
+LIMIT 25
+"""
+
+
+class Profile:
+    """A set of pragmas and a transaction mode to benchmark"""
+
+    def __init__(self, name, pragmas, begin):
+        self.name = name
+        self.pragmas = pragmas
+        self.begin = begin
+
+    def connect(self, path):
+        conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        for pragma, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {pragma}={value}')
+        return conn
+
+
+PROFILES = [
+    Profile('stock', {}, 'BEGIN'),
+    Profile('tuned', settings.SQLITE_PRAGMAS, 'BEGIN IMMEDIATE'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare SQLite write throughput and read latency with stock and tuned pragmas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contacts', type=int, default=5000)
+        parser.add_argument('--posts', type=int, default=500)
+        parser.add_argument('--engagements', type=int, default=50000)
+        parser.add_argument('--writes', type=int, default=500,
+                            help='Single-row write transactions to time')
+        parser.add_argument('--reads', type=int, default=2000,
+                            help='Engagement window reads to time')
+        parser.add_argument('--writers', type=int, default=8,
+                            help='Concurrent read-then-write threads')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stdout.write(
+            f"Synthetic dataset: {options['contacts']} contacts, {options['posts']} posts, "
+            f"{options['engagements']} engagements"
+        )
+        header = f"{'profile':<8} {'writes/s':>10} {'read p50 ms':>12} {'read p95 ms':>12} {'locked errors':>14}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        with tempfile.TemporaryDirectory() as tmp:
+            for profile in PROFILES:
+                path = Path(tmp) / f'{profile.name}.sqlite3'
+                self.seed(profile, path)
+                writes = self.bench_writes(profile, path)
+                p50, p95 = self.bench_reads(profile, path)
+                errors = self.bench_concurrency(profile, path)
+                self.stdout.write(
+                    f'{profile.name:<8} {writes:>10.0f} {p50:>12.3f} {p95:>12.3f} {errors:>14}'
+                )
+
+    def seed(self, profile, path):
+        rng = random.Random(self.options['seed'])
+        conn = profile.connect(path)
+        conn.executescript(SCHEMA)
+        conn.execute('BEGIN')
+        conn.executemany(
+            'INSERT INTO contact (id, name) VALUES (?, ?)',
+            ((i, f'Contact {i}') for i in range(1, self.options['contacts'] + 1)),
+        )
+        conn.executemany(
+            'INSERT INTO post (id, posted_at) VALUES (?, ?)',
+            ((i, f'2025-01-01T00:{i % 60:02d}:00') for i in range(1, self.options['posts'] + 1)),
+        )
+        conn.executemany(
+            'INSERT INTO engagement (post_id, contact_id, content, created_at) VALUES (?, ?, ?, ?)',
+            (
+                (
+                    rng.randint(1, self.options['posts']),
+                    rng.randint(1, self.options['contacts']),
+                    'Synthetic comment ' * 4,
+                    f'2025-02-01T{i % 24:02d}:{i % 60:02d}:{i % 59:02d}.{i:06d}',
+                )
+                for i in range(self.options['engagements'])
+            ),
+        )
+        conn.execute('COMMIT')
+        conn.close()
+
+    def _insert(self, conn, rng):
+        conn.execute(
+            'INSERT INTO engagement (post_id, contact_id, content, created_at) VALUES (?, ?, ?, ?)',
+            (rng.randint(1, self.options['posts']), rng.randint(1, self.options['contacts']),
+             'Benchmark comment', '2025-03-01T00:00:00'),
+        )
+
+    def bench_writes(self, profile, path):
+        """Rows per second for one-row transactions, as form submissions produce"""
+        rng = random.Random(self.options['seed'])
+        conn = profile.connect(path)
+        start = time.perf_counter()
+        for _ in range(self.options['writes']):
+            conn.execute(profile.begin)
+            self._insert(conn, rng)
+            conn.execute('COMMIT')
+        elapsed = time.perf_counter() - start
+        conn.close()
+        return self.options['writes'] / elapsed
+
+    def bench_reads(self, profile, path):
+        """Median and 95th percentile latency of an engagement window read"""
+        rng = random.Random(self.options['seed'])
+        conn = profile.connect(path)
+        timings = []
+        for _ in range(self.options['reads']):
+            post_id = rng.randint(1, self.options['posts'])
+            start = time.perf_counter()
+            conn.execute(WINDOW_QUERY, (post_id,)).fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        conn.close()
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+    def bench_concurrency(self, profile, path):
+        """Count 'database is locked' failures among concurrent read-then-write transactions"""
+        errors = []
+
+        def worker(seed):
+            rng = random.Random(seed)
+            conn = profile.connect(path)
+            for _ in range(self.options['writes'] // self.options['writers']):
+                try:
+                    conn.execute(profile.begin)
+                    conn.execute('SELECT COUNT(*) FROM engagement WHERE post_id = ?',
+                                 (rng.randint(1, self.options['posts']),)).fetchone()
+                    self._insert(conn, rng)
+                    conn.execute('COMMIT')
+                except sqlite3.OperationalError as exc:
+                    errors.append(exc)
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+            conn.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(self.options['seed'] + i,))
+            for i in range(self.options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(errors)
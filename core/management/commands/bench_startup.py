@@ -0,0 +1,86 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Optional integrations that should only be imported on first use
+DEFERRED_MODULES = ['PIL', 'boto3', 'botocore', 'storages', 'rest_framework', 'numpy', 'psycopg_pool']
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(output):
+    """
+    Parse ``python -X importtime`` output.
+
+    Args:
+        output (str): stderr of the interpreter
+
+    Returns:
+        list: (module, self microseconds, cumulative microseconds, depth)
+        tuples, in import order
+    """
+    modules = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            modules.append((module, int(own), int(cumulative), len(indent) // 2))
+    return modules
+
+
+class Command(BaseCommand):
+    help = 'Time project startup and report which modules the import time goes to'
+
+    def add_arguments(self, parser):
+        parser.add_argument('args', nargs='*', metavar='command',
+                            help='manage.py command to boot with (default: check)')
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Timed runs; the median is reported')
+        parser.add_argument('--top', type=int, default=15,
+                            help='Modules and packages to list')
+
+    def handle(self, *args, **options):
+        argv = [sys.executable, str(settings.BASE_DIR / 'manage.py'), *(args or ['check'])]
+        env = {**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
+
+        timings = []
+        for _ in range(options['runs']):
+            start = time.perf_counter()
+            subprocess.run(argv, env=env, capture_output=True, check=True)
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(
+            f"manage.py {' '.join(argv[2:])}: median {statistics.median(timings):.0f} ms "
+            f"over {options['runs']} runs (min {min(timings):.0f} ms)"
+        )
+
+        profiled = subprocess.run(
+            [argv[0], '-X', 'importtime', *argv[1:]], env=env, capture_output=True, text=True, check=True,
+        )
+        modules = parse_importtime(profiled.stderr)
+        total = sum(own for _, own, _, _ in modules)
+        self.stdout.write(f'{len(modules)} modules imported in {total / 1000:.0f} ms\n')
+
+        per_package = defaultdict(int)
+        for module, own, _, _ in modules:
+            per_package[module.partition('.')[0]] += own
+        self.stdout.write(f"{'package':<32} {'self ms':>8}")
+        for package, own in sorted(per_package.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'{package:<32} {own / 1000:>8.1f}')
+
+        self.stdout.write(f"\n{'top-level import':<40} {'cumulative ms':>14}")
+        top_level = [entry for entry in modules if entry[3] == 0]
+        for module, _, cumulative, _ in sorted(top_level, key=lambda entry: -entry[2])[:options['top']]:
+            self.stdout.write(f'{module:<40} {cumulative / 1000:>14.1f}')
+
+        loaded = sorted({module.partition('.')[0] for module, *_ in modules} & set(DEFERRED_MODULES))
+        if loaded:
+            self.stdout.write(self.style.WARNING(f"\nImported at startup: {', '.join(loaded)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS('\nNo deferred integrations imported at startup'))
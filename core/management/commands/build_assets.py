@@ -0,0 +1,22 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.assets import BUNDLES, build_bundle, built_name
+
+
+class Command(BaseCommand):
+    help = 'Concatenate and minify the app CSS/JS bundles ahead of collectstatic'
+
+    def handle(self, *args, **options):
+        assets_dir = Path(settings.STATICFILES_DIRS[0])
+        for name in BUNDLES:
+            text, source_size = build_bundle(name)
+            target = assets_dir / built_name(name)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_text(text, encoding='utf-8')
+            self.stdout.write(
+                f'{built_name(name)}: {source_size:,} -> {len(text.encode()):,} bytes'
+            )
+        self.stdout.write(self.style.SUCCESS('Bundles built. Run collectstatic to hash and publish them.'))
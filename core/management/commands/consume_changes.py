@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.changes import CHANGE_FEED_BATCH_SIZE, consume
+
+
+class Command(BaseCommand):
+    help = 'Feed new change log entries to change feed consumers, from their saved offsets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'consumers',
+            nargs='*',
+            help='Consumers to run (default: all of CHANGE_FEED_CONSUMERS)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=CHANGE_FEED_BATCH_SIZE,
+            help='Entries handed to a consumer at a time',
+        )
+        parser.add_argument(
+            '--follow',
+            action='store_true',
+            help='Keep running, polling for new entries',
+        )
+        parser.add_argument(
+            '--poll',
+            type=float,
+            default=2.0,
+            help='Seconds between polls with --follow',
+        )
+
+    def handle(self, *args, **options):
+        consumers = options['consumers'] or list(settings.CHANGE_FEED_CONSUMERS)
+        unknown = set(consumers) - set(settings.CHANGE_FEED_CONSUMERS)
+        if unknown:
+            raise CommandError(f"Unknown consumers: {', '.join(sorted(unknown))}")
+
+        while True:
+            consumed = 0
+            for consumer in consumers:
+                count = consume(consumer, batch_size=options['batch_size'])
+                if count:
+                    self.stdout.write(f'{consumer}: {count} changes')
+                consumed += count
+            if not options['follow']:
+                break
+            if not consumed:
+                time.sleep(options['poll'])
+        self.stdout.write(self.style.SUCCESS('Consumers are up to date.'))
@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.scheduler import job_stats, run_job, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Run the jobs of SCHEDULED_JOBS when due, recording each run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the jobs due now and exit, e.g. from cron every minute',
+        )
+        parser.add_argument(
+            '--run',
+            action='append',
+            default=[],
+            metavar='JOB',
+            help='Run a job now, whatever its schedule; may be repeated',
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='Show each job with its next run and recent durations',
+        )
+
+    def report(self, run):
+        style = self.style.SUCCESS if run.status == 'succeeded' else self.style.ERROR
+        self.stdout.write(style(f'{run.job}: {run.status} in {run.duration:.2f}s') + (f' ({run.result})' if run.result else ''))
+
+    def handle(self, *args, **options):
+        if options['list']:
+            self.list_jobs()
+            return
+        if options['run']:
+            unknown = set(options['run']) - set(settings.SCHEDULED_JOBS)
+            if unknown:
+                raise CommandError(f"Unknown jobs: {', '.join(sorted(unknown))}")
+            for name in options['run']:
+                self.report(run_job(name))
+            return
+
+        while True:
+            for run in run_pending():
+                self.report(run)
+            if options['once']:
+                return
+            # Wake just after the next minute starts
+            now = timezone.now()
+            time.sleep(60.5 - now.second - now.microsecond / 1e6)
+
+    def list_jobs(self):
+        for name, stats in job_stats().items():
+            last = stats['last']
+            durations = (
+                f"avg {stats['avg_duration']:.2f}s, max {stats['max_duration']:.2f}s"
+                if stats['avg_duration'] is not None else 'no runs'
+            )
+            self.stdout.write(
+                f"{name:<20} {str(stats['schedule']):<18} next {timezone.localtime(stats['next_run']):%Y-%m-%d %H:%M}   "
+                f"7 days: {stats['runs']} runs, {stats['failures']} failed, {durations}   "
+                f"last: {last.status if last else '-'}"
+            )
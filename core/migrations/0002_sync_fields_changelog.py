@@ -0,0 +1,50 @@
+import uuid
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def assign_sync_ids(apps, schema_editor):
+    FBGroup = apps.get_model('core', 'FBGroup')
+    groups = list(FBGroup.objects.only('id'))
+    for group in groups:
+        group.sync_id = uuid.uuid4()
+    FBGroup.objects.bulk_update(groups, ['sync_id'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50)),
+                ('sync_id', models.UUIDField()),
+                ('origin', models.CharField(blank=True, max_length=50)),
+                ('recorded_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='fbgroup',
+            name='last_updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        # Unique ids for existing rows: add nullable, fill, then constrain
+        migrations.AddField(
+            model_name='fbgroup',
+            name='sync_id',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(assign_sync_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='fbgroup',
+            name='sync_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_sync_fields_changelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeFeedOffset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consumer', models.CharField(max_length=100, unique=True)),
+                ('position', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='changelog',
+            name='action',
+            field=models.CharField(choices=[('save', 'Save'), ('delete', 'Delete')], default='save', max_length=6),
+        ),
+        migrations.AddField(
+            model_name='changelog',
+            name='fields',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='changelog',
+            name='object_id',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def sequence_existing_entries(apps, schema_editor):
+    # Entries already written keep their id as sequence, so consumer offsets
+    # and sync watermarks stay valid; the sequencer carries on above them
+    ChangeLog = apps.get_model('core', 'ChangeLog')
+    ChangeFeedOffset = apps.get_model('core', 'ChangeFeedOffset')
+    ChangeLog.objects.update(sequence=F('id'))
+    last = ChangeLog.objects.aggregate(last=Max('id'))['last'] or 0
+    ChangeFeedOffset.objects.update_or_create(consumer='core.sequencer', defaults={'position': last})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_jobrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changelog',
+            name='sequence',
+            field=models.BigIntegerField(null=True, unique=True),
+        ),
+        migrations.RunPython(sequence_existing_entries, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,10 @@
+import uuid
+
 from django.db import models
 
-class FBGroup(models.Model):
+from .changes import TrackedModel
+
+class FBGroup(TrackedModel):
     SET_CHOICES = (
         ('A', 'A'),
         ('B', 'B'),
@@ -8,7 +12,80 @@ class FBGroup(models.Model):
     name = models.CharField(max_length=200)
     group_url = models.URLField()
     group_set = models.CharField(max_length=1, choices=SET_CHOICES)
+    # Identity and conflict timestamp shared with sync peers, see core.changes
+    sync_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.group_set})"
-    
+
+
+class ChangeLog(models.Model):
+    """
+    One write to a tracked model, see core.changes. The sequence orders the
+    changes by commit: consumers and sync peers read the entries after their
+    offset.
+    """
+    ACTION_CHOICES = (
+        ('save', 'Save'),
+        ('delete', 'Delete'),
+    )
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField(null=True)
+    sync_id = models.UUIDField()
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES, default='save')
+    # Comma-separated fields written by an update; blank when all may have changed
+    fields = models.CharField(max_length=255, blank=True)
+    # Where the write came from: blank for local writes, else a sync peer's
+    # name or core.changes.ARCHIVE_ORIGIN
+    origin = models.CharField(max_length=50, blank=True)
+    recorded_at = models.DateTimeField(auto_now_add=True)
+    # Position in commit order, given by core.changes.sequence_changes once
+    # the writing transaction has committed; null until then
+    sequence = models.BigIntegerField(null=True, unique=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.model} {self.object_id}"
+
+
+class ChangeFeedOffset(models.Model):
+    """How far a change feed consumer has read"""
+    consumer = models.CharField(max_length=100, unique=True)
+    # Sequence of the last ChangeLog entry the consumer handled
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.consumer} at #{self.position}"
+
+
+class JobRun(models.Model):
+    """One run of a scheduled job, see core.scheduler"""
+    STATUS_CHOICES = (
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+    job = models.CharField(max_length=100)
+    # Minute the run was due; a job runs once per slot
+    scheduled_for = models.DateTimeField()
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Seconds the job took
+    duration = models.FloatField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    # What the job returned, e.g. how many rows it refreshed
+    result = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'scheduled_for'], name='jobrun_unique_slot'),
+        ]
+        indexes = [
+            models.Index(fields=['job', '-started_at'], name='jobrun_job_recent_idx'),
+            models.Index(fields=['started_at'], name='jobrun_started_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.job} at {self.scheduled_for:%Y-%m-%d %H:%M} ({self.status})"
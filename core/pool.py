@@ -0,0 +1,44 @@
+"""
+Connection pool metrics.
+Reads the psycopg 3 pool statistics for each pooled database alias in the
+current worker process.
+"""
+
+from django.db import connections
+
+
+def pool_stats():
+    """
+    Collect utilization and wait-time stats for every pooled database.
+
+    Returns:
+        dict: Stats per database alias. Aliases without a pool report
+        ``{"pooled": False}``.
+    """
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if not pool:
+            stats[alias] = {'pooled': False}
+            continue
+
+        raw = pool.get_stats()
+        in_use = raw.get('pool_size', 0) - raw.get('pool_available', 0)
+        queued = raw.get('requests_queued', 0)
+        stats[alias] = {
+            'pooled': True,
+            'min_size': raw.get('pool_min', pool.min_size),
+            'max_size': raw.get('pool_max', pool.max_size),
+            'size': raw.get('pool_size', 0),
+            'available': raw.get('pool_available', 0),
+            'in_use': in_use,
+            'utilization': in_use / pool.max_size if pool.max_size else 0.0,
+            'requests_waiting': raw.get('requests_waiting', 0),
+            'requests': raw.get('requests_num', 0),
+            'requests_queued': queued,
+            'requests_errors': raw.get('requests_errors', 0),
+            'avg_wait_ms': raw.get('requests_wait_ms', 0) / queued if queued else 0.0,
+            'connections_opened': raw.get('connections_num', 0),
+            'connections_lost': raw.get('connections_lost', 0),
+        }
+    return stats
@@ -0,0 +1,245 @@
+"""
+On-demand request profiling for staff.
+
+A staff user adds ``?profile=1`` to a URL, or sends an ``X-Profile: 1``
+header, and ``ProfilingMiddleware`` runs that one request under a
+deterministic profiler. The call tree and every SQL query it ran are
+written as JSON to ``PROFILING_DIR``, which keeps only the newest
+``PROFILING_MAX_ENTRIES`` profiles, and the response carries the profile's
+id in ``X-Profile-Id``. Profiles are listed, and drawn as flame graphs, at
+``/admin/profiles/``.
+
+Other requests only pay for a substring check on the query string and a
+header lookup; with PROFILING_ENABLED off the middleware removes itself.
+"""
+
+import json
+import os
+import re
+import secrets
+import sys
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+PROFILE_PARAM = 'profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_ID_RE = re.compile(r'^\d+-[0-9a-f]{8}$')
+
+# Calls narrower than this share of the request are left out of the flame graph
+FLAME_MIN_FRACTION = 0.002
+
+
+def profile_dir():
+    return Path(settings.PROFILING_DIR)
+
+
+def wants_profile(request):
+    """Whether a request asked to be profiled, without parsing its query string"""
+    query = request.META.get('QUERY_STRING', '')
+    if f'{PROFILE_PARAM}=' not in query and PROFILE_HEADER not in request.META:
+        return False
+    value = request.GET.get(PROFILE_PARAM) or request.META.get(PROFILE_HEADER, '')
+    return value not in ('', '0') and request.user.is_staff
+
+
+class CallNode:
+    __slots__ = ('name', 'time', 'calls', 'children')
+
+    def __init__(self, name):
+        self.name = name
+        self.time = 0.0
+        self.calls = 0
+        self.children = {}
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'time': self.time,
+            'calls': self.calls,
+            'children': sorted(
+                (child.as_dict() for child in self.children.values()),
+                key=lambda child: child['time'], reverse=True,
+            ),
+        }
+
+
+def _frame_label(code):
+    path = Path(code.co_filename)
+    return f'{code.co_qualname} ({"/".join(path.parts[-2:])}:{code.co_firstlineno})'
+
+
+class CallTreeProfiler:
+    """Builds a call tree with inclusive wall times through ``sys.setprofile``"""
+
+    def __init__(self):
+        self.root = CallNode('request')
+        self._stack = []
+
+    def _profile(self, frame, event, arg):
+        if event == 'call' or event == 'c_call':
+            name = _frame_label(frame.f_code) if event == 'call' else getattr(arg, '__qualname__', repr(arg))
+            parent = self._stack[-1][0]
+            node = parent.children.get(name)
+            if node is None:
+                node = parent.children[name] = CallNode(name)
+            self._stack.append((node, time.perf_counter()))
+        elif len(self._stack) > 1:
+            # 'return', 'c_return' or 'c_exception'. The root entry stays, as
+            # the frame that started profiling returns after it stops.
+            node, start = self._stack.pop()
+            node.time += time.perf_counter() - start
+            node.calls += 1
+
+    def __enter__(self):
+        self._stack = [(self.root, time.perf_counter())]
+        sys.setprofile(self._profile)
+        return self
+
+    def __exit__(self, *exc_info):
+        sys.setprofile(None)
+        now = time.perf_counter()
+        # Close calls still open when profiling stopped
+        for node, start in self._stack[1:]:
+            node.time += now - start
+            node.calls += 1
+        self.root.time = now - self._stack[0][1]
+        self.root.calls = 1
+        self._stack = []
+
+
+class QueryRecorder:
+    """Execute wrapper collecting every query's SQL, database alias and duration"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'alias': context['connection'].alias,
+                'many': many,
+                'time': time.perf_counter() - start,
+            })
+
+
+def save_profile(profile):
+    """Write a profile to the store, dropping the oldest beyond the cap; returns its id"""
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    profile_id = f'{time.time_ns()}-{secrets.token_hex(4)}'
+    path = directory / f'{profile_id}.json'
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(profile))
+    os.replace(tmp_path, path)
+
+    stored = sorted(directory.glob('*.json'))
+    for stale in stored[:max(0, len(stored) - settings.PROFILING_MAX_ENTRIES)]:
+        stale.unlink(missing_ok=True)
+    return profile_id
+
+
+def list_profiles():
+    """Stored profiles, newest first, without their call trees"""
+    profiles = []
+    for path in sorted(profile_dir().glob('*.json'), reverse=True):
+        try:
+            profile = json.loads(path.read_text())
+        except (OSError, ValueError):
+            # Pruned by another worker, or unreadable
+            continue
+        profiles.append({
+            'id': path.stem,
+            'method': profile['method'],
+            'path': profile['path'],
+            'status': profile['status'],
+            'started_at': datetime.fromtimestamp(profile['started_at'], tz=timezone.utc),
+            'ms': round(profile['tree']['time'] * 1000, 1),
+            'query_count': len(profile['queries']),
+        })
+    return profiles
+
+
+def load_profile(profile_id):
+    """A stored profile, or None if there is none with that id"""
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    try:
+        return json.loads((profile_dir() / f'{profile_id}.json').read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def flame_rows(tree, min_fraction=FLAME_MIN_FRACTION):
+    """
+    Lay out a call tree as flame graph boxes.
+
+    Args:
+        tree (dict): Root node of a stored call tree
+        min_fraction (float): Narrowest box kept, as a share of the root
+
+    Returns:
+        tuple: (list of boxes with depth, left and width in percent of the
+        root, name, milliseconds and calls; depth of the deepest box)
+    """
+    total = tree['time'] or 1.0
+    rows = []
+    pending = [(tree, 0, 0.0)]
+    while pending:
+        node, depth, left = pending.pop()
+        width = node['time'] / total
+        rows.append({
+            'depth': depth,
+            'left': round(100 * left, 3),
+            'width': round(100 * width, 3),
+            'name': node['name'],
+            'ms': round(node['time'] * 1000, 2),
+            'calls': node['calls'],
+        })
+        offset = left
+        for child in node['children']:
+            if child['time'] / total >= min_fraction:
+                pending.append((child, depth + 1, offset))
+            offset += child['time'] / total
+    return rows, max(row['depth'] for row in rows)
+
+
+class ProfilingMiddleware:
+    """Profile requests that staff ask for; pass everything else straight through"""
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not wants_profile(request):
+            return self.get_response(request)
+
+        started_at = time.time()
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            with CallTreeProfiler() as profiler:
+                response = self.get_response(request)
+
+        profile_id = save_profile({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'started_at': started_at,
+            'tree': profiler.root.as_dict(),
+            'queries': recorder.queries,
+        })
+        response['X-Profile-Id'] = profile_id
+        return response
@@ -0,0 +1,134 @@
+"""
+Read-replica database routing.
+
+Views decorated with ``use_replica`` read from one of the aliases listed in
+``settings.DATABASE_REPLICAS``; everything else, and every write, goes to
+``default``. Once a request writes, the rest of it reads from ``default``,
+and ``ReplicaPinningMiddleware`` keeps the browser on ``default`` for a few
+seconds so a redirect after a form submit shows the user's own write.
+Replicas that fail a health check are skipped until they recover.
+"""
+
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Cookie that keeps a browser on the primary after it wrote
+PIN_COOKIE = 'db_pin'
+
+_request_state = ContextVar('replica_routing', default=None)
+
+# alias -> (healthy, monotonic time of the check)
+_replica_health = {}
+
+
+class RoutingState:
+    """Routing decisions for the request being handled"""
+
+    def __init__(self, pinned=False):
+        self.read_only = False
+        self.pinned = pinned
+        self.wrote = False
+
+
+def begin_request(pinned=False):
+    """Start tracking a request; returns a token for ``end_request``"""
+    return _request_state.set(RoutingState(pinned=pinned))
+
+
+def end_request(token):
+    """Stop tracking a request and return its final routing state"""
+    state = _request_state.get()
+    _request_state.reset(token)
+    return state
+
+
+def use_replica(view):
+    """Let a read-only view read from a replica database"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            state = _request_state.get()
+            if state is not None:
+                state.read_only = True
+            return await view(*args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        state = _request_state.get()
+        if state is not None:
+            state.read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def replica_is_healthy(alias):
+    """Check a replica with SELECT 1, caching the answer for a few seconds"""
+    ttl = getattr(settings, 'DATABASE_REPLICA_HEALTH_TTL', 30)
+    healthy, checked_at = _replica_health.get(alias, (None, 0.0))
+    now = time.monotonic()
+    if healthy is None or now - checked_at > ttl:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            healthy = True
+        except Exception:
+            healthy = False
+        _replica_health[alias] = (healthy, now)
+    return healthy
+
+
+def choose_replica():
+    """Pick a healthy replica at random, or None to fall back to the primary"""
+    healthy = [alias for alias in getattr(settings, 'DATABASE_REPLICAS', []) if replica_is_healthy(alias)]
+    return random.choice(healthy) if healthy else None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or not state.read_only or state.pinned:
+            return None
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.pinned = True
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaPinningMiddleware:
+    """Track routing per request and pin recent writers to the primary"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = begin_request(pinned=PIN_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            state = end_request(token)
+        if state.wrote and getattr(settings, 'DATABASE_REPLICAS', []):
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
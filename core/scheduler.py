@@ -0,0 +1,276 @@
+"""
+In-process scheduler for periodic jobs.
+
+Jobs are listed in SCHEDULED_JOBS by name, each with a cron schedule
+(minute, hour, day of month, month, day of week, in TIME_ZONE) and the
+dotted path of a callable taking no arguments. ``manage.py scheduler`` runs
+them: as a worker that wakes every minute, or with ``--once`` from the
+system cron.
+
+Every run is recorded as a JobRun with its duration, outcome and the
+summary the job returned. A run is keyed by its job and the scheduled
+minute under a unique constraint, so two schedulers never run the same
+slot twice; a scheduler started late still runs the slots it missed within
+SCHEDULER_CATCH_UP_MINUTES, once each job, rather than replaying them all.
+"""
+
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Field name -> (lowest, highest) value of each cron field, in order
+CRON_FIELDS = {
+    'minute': (0, 59),
+    'hour': (0, 23),
+    'day': (1, 31),
+    'month': (1, 12),
+    'weekday': (0, 6),
+}
+
+MONTH_NAMES = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+WEEKDAY_NAMES = ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat']
+
+# Years searched for a matching time before a schedule is deemed impossible, e.g. 30 Feb
+MAX_SEARCH_YEARS = 5
+
+
+def _parse_value(value, field):
+    names = {'month': MONTH_NAMES, 'weekday': WEEKDAY_NAMES}.get(field, [])
+    if value.lower() in names:
+        return names.index(value.lower()) + (1 if field == 'month' else 0)
+    return int(value)
+
+
+def _parse_field(text, field):
+    """Set of the values a cron field allows"""
+    lowest, highest = CRON_FIELDS[field]
+    # Cron also accepts 7 for Sunday
+    top = 7 if field == 'weekday' else highest
+    values = set()
+    for part in text.split(','):
+        spec, _, step = part.partition('/')
+        try:
+            step = int(step) if step else 1
+            if spec == '*':
+                start, end = lowest, highest
+            elif '-' in spec:
+                start, end = (_parse_value(value, field) for value in spec.split('-', 1))
+                if field == 'weekday' and end == 0:
+                    # e.g. fri-sun
+                    end = 7
+            else:
+                start = _parse_value(spec, field)
+                end = highest if step > 1 else start
+        except ValueError:
+            start, end = None, None
+        if start is None or step < 1 or not lowest <= start <= end <= top:
+            raise ValueError(f'Invalid {field} in cron expression: {part!r}')
+        values.update(value % 7 if field == 'weekday' else value for value in range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """
+    A standard five-field cron expression, e.g. '45 8 * * mon-sat'.
+
+    As in cron, a time matches when its day matches either the day of month
+    or the day of week field, if both are restricted.
+    """
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != len(CRON_FIELDS):
+            raise ValueError(f'Cron expressions have five fields: {expression!r}')
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _parse_field(part, field) for part, field in zip(parts, CRON_FIELDS)
+        )
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+
+    def __str__(self):
+        return self.expression
+
+    def _day_matches(self, moment):
+        # isoweekday() % 7 counts from Sunday = 0, as cron does
+        day = moment.day in self.days
+        weekday = moment.isoweekday() % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def matches(self, moment):
+        """Whether the schedule fires in the minute of an aware datetime"""
+        moment = timezone.localtime(moment)
+        return (
+            moment.minute in self.minutes and moment.hour in self.hours
+            and moment.month in self.months and self._day_matches(moment)
+        )
+
+    def next_after(self, moment):
+        """
+        The first minute the schedule fires strictly after an aware datetime.
+
+        Skips whole months, days and hours that cannot match, so a search
+        takes at most a few hundred steps.
+
+        Raises:
+            ValueError: The schedule never fires, e.g. '0 0 30 2 *'
+        """
+        local = timezone.localtime(moment).replace(second=0, microsecond=0, tzinfo=None)
+        candidate = local + timedelta(minutes=1)
+        limit = local.replace(year=local.year + MAX_SEARCH_YEARS, day=1)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                year, month = divmod(candidate.month, 12)
+                candidate = candidate.replace(year=candidate.year + year, month=month + 1, day=1, hour=0, minute=0)
+            elif not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+            elif candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return timezone.make_aware(candidate)
+        raise ValueError(f'Cron expression never fires: {self.expression!r}')
+
+    def last_between(self, start, end):
+        """The latest minute the schedule fires in (start, end], or None"""
+        last = None
+        moment = start
+        while True:
+            moment = self.next_after(moment)
+            if moment > end:
+                return last
+            last = moment
+
+
+def scheduled_jobs():
+    """
+    The jobs of SCHEDULED_JOBS.
+
+    Returns:
+        dict: name -> (CronSchedule, dotted path of the callable)
+    """
+    return {
+        name: (CronSchedule(job['schedule']), job['task'])
+        for name, job in settings.SCHEDULED_JOBS.items()
+    }
+
+
+def run_job(name, scheduled_for=None):
+    """
+    Run a job and record the run.
+
+    Args:
+        name (str): Job name, a key of SCHEDULED_JOBS
+        scheduled_for (datetime): Slot the run is for; defaults to now, for
+            runs started by hand
+
+    Returns:
+        JobRun: The recorded run, or None if another scheduler already
+        claimed the slot
+    """
+    JobRun = apps.get_model('core', 'JobRun')
+    task = import_string(settings.SCHEDULED_JOBS[name]['task'])
+    try:
+        with transaction.atomic():
+            run = JobRun.objects.create(job=name, scheduled_for=scheduled_for or timezone.now())
+    except IntegrityError:
+        return None
+
+    started = time.perf_counter()
+    try:
+        result = task()
+    except Exception:
+        logger.exception('Scheduled job %s failed', name)
+        run.status = 'failed'
+        run.error = traceback.format_exc()
+    else:
+        run.status = 'succeeded'
+        run.result = '' if result is None else str(result)[:255]
+    run.duration = time.perf_counter() - started
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'result', 'error', 'duration', 'finished_at'])
+    return run
+
+
+def run_pending(now=None):
+    """
+    Run every job whose latest slot within the catch-up window has not run.
+
+    Args:
+        now (datetime): Current time, for tests
+
+    Returns:
+        list: The JobRuns made
+    """
+    JobRun = apps.get_model('core', 'JobRun')
+    now = now or timezone.now()
+    window_start = now - timedelta(minutes=settings.SCHEDULER_CATCH_UP_MINUTES)
+    due = {}
+    for name, (schedule, _) in scheduled_jobs().items():
+        slot = schedule.last_between(window_start, now)
+        if slot is not None:
+            due[name] = slot
+    done = set(JobRun.objects.filter(job__in=due, scheduled_for__gt=window_start).values_list('job', 'scheduled_for'))
+    runs = []
+    for name, slot in due.items():
+        if (name, slot) not in done:
+            run = run_job(name, slot)
+            if run is not None:
+                runs.append(run)
+    return runs
+
+
+def job_stats(days=7):
+    """
+    Run counts and durations of every job over recent days.
+
+    Returns:
+        dict: name -> dict with 'schedule', 'next_run', 'runs', 'failures',
+        'avg_duration' and 'max_duration' (seconds) and the 'last' JobRun
+    """
+    JobRun = apps.get_model('core', 'JobRun')
+    now = timezone.now()
+    recent = JobRun.objects.filter(started_at__gte=now - timedelta(days=days))
+    totals = {
+        row['job']: row
+        for row in recent.values('job').annotate(
+            runs=Count('id'),
+            failures=Count('id', filter=Q(status='failed')),
+            avg_duration=Avg('duration'),
+            max_duration=Max('duration'),
+        ).order_by()
+    }
+    stats = {}
+    for name, (schedule, _) in scheduled_jobs().items():
+        row = totals.get(name, {})
+        stats[name] = {
+            'schedule': schedule,
+            'next_run': schedule.next_after(now),
+            'runs': row.get('runs', 0),
+            'failures': row.get('failures', 0),
+            'avg_duration': row.get('avg_duration'),
+            'max_duration': row.get('max_duration'),
+            'last': JobRun.objects.filter(job=name).order_by('-started_at').first(),
+        }
+    return stats
+
+
+def prune_job_runs():
+    """Job deleting runs older than SCHEDULER_HISTORY_DAYS"""
+    JobRun = apps.get_model('core', 'JobRun')
+    cutoff = timezone.now() - timedelta(days=settings.SCHEDULER_HISTORY_DAYS)
+    deleted, _ = JobRun.objects.filter(started_at__lt=cutoff).delete()
+    return f'{deleted} runs pruned'
@@ -0,0 +1,39 @@
+"""
+Invalidate cached query results when the rows behind them change.
+
+Bulk operations (``bulk_create``, ``QuerySet.update``) send no signals, so
+code using them calls ``core.cache.invalidate`` itself. Receivers are
+connected per model, and engagements get no post_delete receiver: a delete
+listener stops Django from fast-deleting rows, which archival relies on, so
+archival invalidates explicitly instead.
+"""
+
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+
+from .cache import invalidate
+
+# Model label -> cache namespaces holding results derived from it
+CACHE_DEPENDENCIES = {
+    'core.FBGroup': ['dashboard', 'analytics'],
+    'posts.Ad': ['dashboard', 'autocomplete:posts.ad', 'analytics'],
+    'posts.Post': ['dashboard', 'analytics'],
+    'engagement.Contact': ['autocomplete:engagement.contact'],
+    'engagement.Engagement': ['dashboard'],
+}
+
+# Models whose deletes are not signalled, see above
+FAST_DELETE_MODELS = {'engagement.Engagement'}
+
+
+def invalidate_dependents(sender, **kwargs):
+    invalidate(*CACHE_DEPENDENCIES[sender._meta.label])
+
+
+def connect_receivers():
+    """Connect the invalidation receivers; called from CoreConfig.ready"""
+    for label in CACHE_DEPENDENCIES:
+        model = apps.get_model(label)
+        post_save.connect(invalidate_dependents, sender=model, dispatch_uid=f'cache:save:{label}')
+        if label not in FAST_DELETE_MODELS:
+            post_delete.connect(invalidate_dependents, sender=model, dispatch_uid=f'cache:delete:{label}')
@@ -0,0 +1,16 @@
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+class LenientManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Content-hashed static files that still work before collectstatic has run
+    (tests, fresh checkouts): files missing from the manifest are served
+    under their plain names instead of raising.
+    """
+    manifest_strict = False
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            return name
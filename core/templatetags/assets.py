@@ -0,0 +1,23 @@
+"""
+Django template tags for static asset bundles.
+"""
+
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from core.assets import bundle_paths
+
+register = template.Library()
+
+
+@register.simple_tag
+def bundle(name):
+    """
+    Link a CSS or JS bundle.
+    Usage in templates: {% bundle 'app.css' %}
+    """
+    urls = ((static(path),) for path in bundle_paths(name))
+    if name.endswith('.css'):
+        return format_html_join('\n', '<link href="{}" rel="stylesheet" />', urls)
+    return format_html_join('\n', '<script src="{}"></script>', urls)
@@ -3,7 +3,7 @@ Django template filters for markdown rendering.
 """
 
 from django import template
-from core.markdown_utils import markdown_to_html, strip_markdown
+from core.markdown_utils import markdown_to_html, markdown_to_unicode, strip_markdown
 
 register = template.Library()
 
@@ -25,3 +25,11 @@ def plaintext(text):
     """
     return strip_markdown(text)
 
+
+@register.filter
+def fbtext(text):
+    """
+    Convert markdown text to Unicode-styled text for pasting into Facebook.
+    Usage in templates: {{ text|fbtext }}
+    """
+    return markdown_to_unicode(text)
@@ -1,10 +1,40 @@
-from django.test import TestCase, Client
+import json
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
-from datetime import datetime
-from .models import FBGroup
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from .management.commands.bench_fbtext import naive_to_unicode
+from .markdown_utils import markdown_to_html, markdown_to_unicode, render_many, strip_many, strip_markdown
+from . import cache as query_cache, markdown_utils
+from .events import dashboard_changes, format_event
+from .assets import BUNDLES, built_name, minify_css, minify_js
+from .management.commands.bench_startup import DEFERRED_MODULES, parse_importtime
+from .changes import consume, consume_all, prune_change_log, sequence_changes, untracked
+from .dashboard import get_today_set, warm_dashboard
+from .models import ChangeFeedOffset, ChangeLog, FBGroup, JobRun
+from .profiling import flame_rows, list_profiles
+from .scheduler import CronSchedule, run_pending
+from .routers import PIN_COOKIE, ReplicaPinningMiddleware, ReplicaRouter, begin_request, end_request, use_replica
 from posts.models import Ad, Post
-from engagement.models import Contact, Engagement
+from engagement.models import Contact, Engagement, content_hash
 
 class FBGroupModelTest(TestCase):
     def setUp(self):
@@ -29,6 +59,7 @@ class FBGroupModelTest(TestCase):
 class HomeViewTest(TestCase):
     def setUp(self):
         self.client = Client()
+        cache.clear()
         self.group_a = FBGroup.objects.create(
             name='Test Group A',
             group_url='https://facebook.com/groups/test-a',
@@ -60,8 +91,619 @@ class HomeViewTest(TestCase):
         self.assertIn('today_groups', response.context)
         self.assertIn('post_history', response.context)
 
+    @override_settings(TIME_ZONE='Pacific/Kiritimati')
+    def test_home_view_today_follows_time_zone(self):
+        # Monday noon in UTC is already Tuesday at UTC+14
+        monday_noon = datetime(2026, 10, 19, 12, tzinfo=dt_timezone.utc)
+        with mock.patch.object(timezone, 'now', return_value=monday_noon):
+            response = self.client.get(reverse('core:home'))
+        self.assertEqual(response.context['today'], date(2026, 10, 20))
+        self.assertEqual(response.context['today_set'], 'B')
+
     def test_home_view_post_history(self):
         response = self.client.get(reverse('core:home'))
         posts = response.context['post_history']
         self.assertEqual(len(posts), 1)
         self.assertEqual(posts[0].ad.name, 'Test Ad')
+
+    def test_home_view_post_history_is_cached_until_a_change(self):
+        self.client.get(reverse('core:home'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('core:home'))
+        self.assertFalse([q for q in queries.captured_queries if 'posts_post' in q['sql']])
+        Engagement.objects.create(
+            post=self.post,
+            contact=Contact.objects.create(name='Jane', fb_url='https://facebook.com/jane'),
+            content='Hi',
+        )
+        response = self.client.get(reverse('core:home'))
+        self.assertEqual(response.context['post_history'][0].engagement_total, 1)
+
+
+class DashboardEventsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = FBGroup.objects.create(name='Group', group_url='https://facebook.com/groups/g', group_set='A')
+        self.ad = Ad.objects.create(name='Ad', text='Text')
+        self.post = Post.objects.create(ad=self.ad, fb_group=self.group, post_url='https://facebook.com/posts/1', posted_at=timezone.now())
+        self.contact = Contact.objects.create(name='Jane', fb_url='https://facebook.com/jane')
+
+    def test_changes_include_new_engagement_totals(self):
+        since = timezone.now()
+        Engagement.objects.create(post=self.post, contact=self.contact, content='Hi')
+        changes, cursor = dashboard_changes(since)
+        self.assertEqual([(c['id'], c['engagement_total']) for c in changes], [(self.post.id, 1)])
+        self.assertGreater(cursor, since)
+
+    def test_no_changes(self):
+        changes, _ = dashboard_changes(timezone.now() + timedelta(minutes=1))
+        self.assertEqual(changes, [])
+
+    def test_format_event(self):
+        self.assertEqual(format_event({'id': 1}, event='post', event_id='c'), 'id: c\nevent: post\ndata: {"id": 1}\n\n')
+
+    @override_settings(DASHBOARD_EVENTS_POLL=0, DASHBOARD_EVENTS_MAX_AGE=0.05)
+    async def test_stream_sends_changed_posts(self):
+        since = (timezone.now() - timedelta(minutes=1)).isoformat()
+        response = await self.async_client.get(reverse('core:dashboard_events'), {'since': since})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertTrue(body.startswith('retry: '))
+        self.assertIn('event: post', body)
+        self.assertIn(f'"id": {self.post.id}', body)
+
+
+class CachedQueryMixin:
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_value_is_computed_once(self):
+        self.assertEqual(query_cache.cached_query('ns', 'key', self.compute, beta=0), 1)
+        self.assertEqual(query_cache.cached_query('ns', 'key', self.compute, beta=0), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_invalidate_bumps_namespace(self):
+        query_cache.cached_query('ns', 'key', self.compute, beta=0)
+        query_cache.invalidate('ns')
+        self.assertEqual(query_cache.cached_query('ns', 'key', self.compute, beta=0), 2)
+        query_cache.invalidate('other')
+        self.assertEqual(query_cache.cached_query('ns', 'key', self.compute, beta=0), 2)
+
+    def test_evicted_version_does_not_revive_old_entries(self):
+        query_cache.cached_query('ns', 'key', self.compute, beta=0)
+        query_cache.invalidate('ns')
+        query_cache.cached_query('ns', 'key', self.compute, beta=0)
+        cache.delete('cachever:ns')
+        self.assertEqual(query_cache.cached_query('ns', 'key', self.compute, beta=0), 3)
+
+    def test_invalidate_in_transaction_bumps_again_on_commit(self):
+        query_cache.cached_query('ns', 'key', self.compute, beta=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            query_cache.invalidate('ns')
+            # Cached from rows read before the writer commits
+            self.assertEqual(query_cache.cached_query('ns', 'key', self.compute, beta=0), 2)
+        self.assertEqual(query_cache.cached_query('ns', 'key', self.compute, beta=0), 3)
+
+    def test_early_refresh_before_expiry(self):
+        query_cache.cached_query('ns', 'key', self.compute)
+        with mock.patch.object(query_cache, '_should_refresh_early', return_value=True):
+            self.assertEqual(query_cache.cached_query('ns', 'key', self.compute), 2)
+            # A worker already refreshing holds the lock; others serve the old value
+            cache.add(f"query:ns:v{query_cache.namespace_version('ns')}:key:lock", 1)
+            self.assertEqual(query_cache.cached_query('ns', 'key', self.compute), 2)
+        self.assertEqual(self.calls, 2)
+
+    def test_miss_waits_for_worker_holding_lock(self):
+        cache_key = f"query:ns:v{query_cache.namespace_version('ns')}:key"
+        cache.add(f'{cache_key}:lock', 1)
+
+        def other_worker_finishes(seconds):
+            cache.set(cache_key, ('theirs', 0.1, 0))
+
+        with mock.patch.object(query_cache.time, 'sleep', side_effect=other_worker_finishes):
+            self.assertEqual(query_cache.cached_query('ns', 'key', self.compute), 'theirs')
+        self.assertEqual(self.calls, 0)
+
+
+class LocMemCachedQueryTest(CachedQueryMixin, TestCase):
+    pass
+
+
+class FileCachedQueryTest(CachedQueryMixin, TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory.name,
+        }})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        super().setUp()
+
+
+@skipUnless(fakeredis, 'fakeredis is not installed')
+class RedisCachedQueryTest(CachedQueryMixin, TestCase):
+    # The backend deployed with CACHE_BACKEND=redis, over an in-memory server
+    def setUp(self):
+        settings_override = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://localhost:6379/0',
+            'OPTIONS': {'connection_class': fakeredis.FakeConnection, 'server': fakeredis.FakeServer()},
+        }})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        super().setUp()
+
+
+class MarkdownToUnicodeTest(TestCase):
+    def test_styles(self):
+        self.assertEqual(markdown_to_unicode('**Bold 1**'), '𝐁𝐨𝐥𝐝 𝟏')
+        self.assertEqual(markdown_to_unicode('_hi_'), 'ℎ𝑖')
+        self.assertEqual(markdown_to_unicode('^^Be^^'), 'ℬℯ')
+        self.assertEqual(markdown_to_unicode('||RZ 2||'), 'ℝℤ 𝟚')
+        self.assertEqual(markdown_to_unicode('~no~'), 'n̶o̶')
+
+    def test_nested_bold_italic(self):
+        self.assertEqual(markdown_to_unicode('**a _b_**'), '𝐚 𝒃')
+
+    def test_urls_are_left_alone(self):
+        text = 'See https://example.com/a_b_c'
+        self.assertEqual(markdown_to_unicode(text), text)
+
+    def test_matches_per_character_mapping(self):
+        text = '**Sale** on _all_ ~old~ ^^Cursive^^ ||Deals 2025|| items'
+        self.assertEqual(markdown_to_unicode(text), naive_to_unicode(text))
+
+    def test_strip_markdown_removes_new_markers(self):
+        self.assertEqual(strip_markdown('^^Hi^^ ||there||'), 'Hi there')
+
+
+class MarkdownBatchTest(TestCase):
+    texts = [
+        '**Sale** on _all_\n~old~ items', '*a', 'b*', None, '', '_a\nb_ <i>', '**Sale** on _all_\n~old~ items',
+        'See https://example.com/a_b_c *now*', 'nul \x00 byte *here*',
+    ]
+
+    def test_matches_one_at_a_time(self):
+        self.assertEqual(strip_many(self.texts), [strip_markdown(text) for text in self.texts])
+        self.assertEqual(render_many(self.texts), [markdown_to_html(text) for text in self.texts])
+
+    def test_identical_texts_are_converted_once(self):
+        with mock.patch.object(markdown_utils, '_html_spans', wraps=markdown_utils._html_spans) as spans:
+            render_many(['*a*'] * 1000)
+        spans.assert_called_once()
+
+    def test_ads_list_prerenders_previews(self):
+        Ad.objects.create(name='Ad', text='**Big** sale')
+        response = self.client.get(reverse('posts:ads_list'))
+        self.assertEqual(response.context['ads'][0].text_preview, 'Big sale')
+
+    def test_bench_markdown_runs(self):
+        out = StringIO()
+        call_command('bench_markdown', rows=50, repeat=1, stdout=out)
+        self.assertIn('speedup', out.getvalue())
+        self.assertNotIn('differs', out.getvalue())
+
+
+class StaticAssetsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('assets', password='pw')
+        self.client.force_login(self.user)
+
+    @mock.patch('core.assets._built_bundle_exists', return_value=False)
+    def test_bundle_falls_back_to_sources_before_build(self, _):
+        response = self.client.get(reverse('core:home'))
+        for path in BUNDLES['app.css'] + BUNDLES['app.js']:
+            self.assertContains(response, path)
+        self.assertNotContains(response, built_name('app.css'))
+
+    @mock.patch('core.assets._built_bundle_exists', return_value=True)
+    def test_bundle_links_built_file(self, _):
+        response = self.client.get(reverse('core:home'))
+        self.assertContains(response, built_name('app.css'))
+        self.assertNotContains(response, 'css/styles.css')
+
+    def test_editor_assets_only_on_pages_that_use_them(self):
+        response = self.client.get(reverse('core:home'))
+        self.assertNotContains(response, 'lexical-editor')
+        self.assertNotContains(response, 'easymde')
+        response = self.client.get(reverse('posts:create_ad'))
+        self.assertContains(response, 'vendor/easymde/easymde.min.js')
+
+    def test_minify(self):
+        self.assertEqual(minify_css('/* c */\na {\n  color: red;\n}\n/*! keep */'), 'a{color: red}/*! keep */')
+        self.assertEqual(minify_js('// c\n    const a = 1;\n\n/* block */\nf(a);\n'), 'const a = 1;\nf(a);')
+
+    def test_minify_js_keeps_code_around_comments(self):
+        # A comment only runs to the */ that closes it
+        self.assertEqual(
+            minify_js('/* a */ var x = 1;\nvar y = 2; /* b */\nfoo();'),
+            'var x = 1;\nvar y = 2; /* b */\nfoo();',
+        )
+        self.assertEqual(minify_js('  /* a\n   * b\n   */ bar();\n/*! licence\n * kept */'), 'bar();\n/*! licence\n* kept */')
+
+    def test_minify_js_leaves_template_literals_alone(self):
+        source = 'const html = `\n  <p>\n// not a comment\n  </p>`;\n  // a comment\nf(html);'
+        self.assertEqual(minify_js(source), 'const html = `\n  <p>\n// not a comment\n  </p>`;\nf(html);')
+        self.assertEqual(minify_js("const q = '`';\n// gone\nf(q);"), "const q = '`';\nf(q);")
+
+
+class StartupImportTest(TestCase):
+    def test_parse_importtime(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   environ.compat\n'
+            'import time:       300 |        420 | environ\n'
+        )
+        self.assertEqual(parse_importtime(output), [('environ.compat', 120, 120, 1), ('environ', 300, 420, 0)])
+
+    def test_boot_does_not_import_deferred_integrations(self):
+        script = (
+            'import json, sys, django; django.setup(); '
+            'from django.core import checks; checks.run_checks(); '
+            'from django.urls import resolve; resolve("/"); '
+            f'print(json.dumps(sorted({{m.partition(".")[0] for m in sys.modules}} & set({DEFERRED_MODULES!r}))))'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], capture_output=True, text=True, check=True,
+            env={'DJANGO_SETTINGS_MODULE': 'marketing_tracker.settings', 'PATH': ''},
+            cwd=settings.BASE_DIR,
+        )
+        self.assertEqual(json.loads(result.stdout), [])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite profile only')
+class SQLiteProfileTest(TestCase):
+    def test_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertGreater(cursor.fetchone()[0], 0)
+
+    def test_immediate_transactions(self):
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_bench_sqlite_runs(self):
+        out = StringIO()
+        call_command(
+            'bench_sqlite', contacts=10, posts=5, engagements=50, writes=8, reads=10, writers=2,
+            stdout=out,
+        )
+        self.assertIn('stock', out.getvalue())
+        self.assertIn('tuned', out.getvalue())
+
+class DBPoolStatsViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def test_db_pool_stats_requires_staff(self):
+        response = self.client.get(reverse('core:db_pool_stats'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_db_pool_stats_reports_each_alias(self):
+        self.client.force_login(User.objects.create_user('staff', password='password', is_staff=True))
+        response = self.client.get(reverse('core:db_pool_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('default', response.json())
+
+    @skipUnless(getattr(connection, 'pool', None), 'Requires a pooled PostgreSQL database')
+    def test_db_pool_stats_for_pooled_database(self):
+        self.client.force_login(User.objects.create_user('staff', password='password', is_staff=True))
+        stats = self.client.get(reverse('core:db_pool_stats')).json()['default']
+        self.assertTrue(stats['pooled'])
+        self.assertGreaterEqual(stats['in_use'], 1)
+        self.assertLessEqual(stats['size'], stats['max_size'])
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'])
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.token = begin_request()
+        self.addCleanup(end_request, self.token)
+        patcher = mock.patch('core.routers.replica_is_healthy', return_value=True)
+        self.healthy = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _read_in_replica_view(self):
+        @use_replica
+        def view():
+            return self.router.db_for_read(FBGroup)
+        return view()
+
+    def test_reads_outside_replica_views_use_primary(self):
+        self.assertIsNone(self.router.db_for_read(FBGroup))
+
+    def test_replica_views_read_from_replica(self):
+        self.assertIn(self._read_in_replica_view(), ['replica_1', 'replica_2'])
+
+    def test_reads_after_write_are_pinned_to_primary(self):
+        self.assertEqual(self.router.db_for_write(FBGroup), 'default')
+        self.assertIsNone(self._read_in_replica_view())
+
+    def test_unhealthy_replicas_fall_back_to_primary(self):
+        self.healthy.return_value = False
+        self.assertIsNone(self._read_in_replica_view())
+
+    def test_replicas_are_not_migrated(self):
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica_1', 'core'))
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaPinningMiddlewareTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+    def test_writing_request_sets_pin_cookie(self):
+        def view(request):
+            self.router.db_for_write(FBGroup)
+            return HttpResponse()
+        response = ReplicaPinningMiddleware(view)(self.factory.post('/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_pinned_browser_reads_from_primary(self):
+        @use_replica
+        def view(request):
+            return HttpResponse(str(self.router.db_for_read(FBGroup)))
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        response = ReplicaPinningMiddleware(view)(request)
+        self.assertEqual(response.content, b'None')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class RequestProfilingTest(TestCase):
+    def setUp(self):
+        self.store = tempfile.TemporaryDirectory()
+        self.addCleanup(self.store.cleanup)
+        settings_override = override_settings(PROFILING_DIR=self.store.name, PROFILING_MAX_ENTRIES=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        self.staff = User.objects.create_user('staff', password='password', is_staff=True)
+
+    def test_staff_request_is_profiled(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('core:home'), {'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        [profile] = list_profiles()
+        self.assertEqual(response['X-Profile-Id'], profile['id'])
+        self.assertGreater(profile['query_count'], 0)
+
+        response = self.client.get(reverse('profiles:detail', args=[profile['id']]))
+        self.assertContains(response, 'home (core/views.py')
+        self.assertContains(response, 'SELECT')
+
+    def test_header_trigger_and_store_cap(self):
+        self.client.force_login(self.staff)
+        for _ in range(3):
+            self.client.get(reverse('core:home'), headers={'X-Profile': '1'})
+        self.assertEqual(len(list_profiles()), 2)
+        self.assertEqual(self.client.get(reverse('profiles:list')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('profiles:detail', args=['..secret'])).status_code, 404)
+
+    @mock.patch('core.profiling.CallTreeProfiler')
+    def test_other_requests_are_not_profiled(self, profiler):
+        self.client.get(reverse('core:home'), {'profile': '1'})
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('core:home'), {'profile': '0'})
+        self.assertNotIn('X-Profile-Id', response)
+        profiler.assert_not_called()
+        self.assertEqual(list_profiles(), [])
+
+    def test_flame_layout(self):
+        tree = {'name': 'request', 'time': 1.0, 'calls': 1, 'children': [
+            {'name': 'a', 'time': 0.6, 'calls': 1, 'children': []},
+            {'name': 'b', 'time': 0.3, 'calls': 2, 'children': [
+                {'name': 'c', 'time': 0.0001, 'calls': 1, 'children': []},
+            ]},
+        ]}
+        boxes, max_depth = flame_rows(tree)
+        layout = {box['name']: (box['depth'], box['left'], box['width']) for box in boxes}
+        self.assertEqual(layout, {'request': (0, 0.0, 100.0), 'a': (1, 0.0, 60.0), 'b': (1, 60.0, 30.0)})
+        self.assertEqual(max_depth, 1)
+
+
+class ChangeFeedTest(TestCase):
+    def setUp(self):
+        self.group = FBGroup.objects.create(name='Group', group_url='https://fb.com/g', group_set='A')
+        self.ad = Ad.objects.create(name='Ad', text='Text')
+        self.post = Post.objects.create(ad=self.ad, fb_group=self.group, post_url='https://fb.com/p', posted_at=timezone.now())
+        self.contact = Contact.objects.create(name='Contact', fb_url='https://fb.com/c')
+
+    def entries(self, model):
+        return list(ChangeLog.objects.filter(model=model).order_by('id').values_list('object_id', 'action', 'fields'))
+
+    def test_bulk_writes_are_recorded(self):
+        engagements = Engagement.objects.bulk_create([
+            Engagement(contact=self.contact, post=self.post, content=str(i)) for i in range(3)
+        ])
+        ids = [engagement.pk for engagement in engagements]
+        Engagement.objects.filter(pk=ids[0]).update(notes='n')
+        engagements[1].notes = 'm'
+        Engagement.objects.bulk_update(engagements[1:2], ['notes'])
+        Engagement.objects.filter(pk=ids[2]).delete()
+        with untracked():
+            Engagement.objects.filter(pk=ids[0]).update(notes='quiet')
+        self.assertEqual(self.entries('engagement.Engagement'), [
+            (ids[0], 'save', ''), (ids[1], 'save', ''), (ids[2], 'save', ''),
+            (ids[0], 'save', 'notes'), (ids[1], 'save', 'notes'), (ids[2], 'delete', ''),
+        ])
+
+    def test_update_recomputes_derived_fields(self):
+        from django.db.models import F
+        engagement = Engagement.objects.create(contact=self.contact, post=self.post, content='Hi')
+        Engagement.objects.filter(pk=engagement.pk).update(content='Hello')
+        engagement.refresh_from_db()
+        self.assertEqual(engagement.content_hash, content_hash('Hello'))
+        with self.assertRaises(ValueError):
+            Engagement.objects.filter(pk=engagement.pk).update(content=F('notes'))
+        Post.objects.filter(pk=self.post.pk).update(post_url='https://www.facebook.com/groups/g/posts/42/?fbclid=x')
+        self.assertEqual(Post.objects.get(pk=self.post.pk).post_url_key, 'fb:42')
+
+    def test_single_row_writes_are_recorded(self):
+        self.ad.name = 'Renamed'
+        self.ad.save(update_fields=['name'])
+        ad_id = self.ad.pk
+        self.ad.delete()
+        self.assertEqual(self.entries('posts.Ad'), [(ad_id, 'save', ''), (ad_id, 'save', 'name'), (ad_id, 'delete', '')])
+        # The post went with its ad, through the collector
+        self.assertEqual(self.entries('posts.Post')[-1], (self.post.pk, 'delete', ''))
+
+    def test_fast_deleted_instance_is_recorded(self):
+        engagement = Engagement.objects.create(contact=self.contact, post=self.post, content='Hi')
+        engagement_id = engagement.pk
+        engagement.delete()
+        self.assertEqual(self.entries('engagement.Engagement'), [(engagement_id, 'save', ''), (engagement_id, 'delete', '')])
+
+    def test_consume_moves_offset_with_handler(self):
+        seen = []
+        self.assertEqual(consume('test', handle=seen.extend, batch_size=2), ChangeLog.objects.count())
+        self.assertEqual(len(seen), ChangeLog.objects.count())
+        self.assertEqual(ChangeFeedOffset.objects.get(consumer='test').position, seen[-1].sequence)
+        self.assertEqual(consume('test', handle=seen.extend), 0)
+
+        def fail(changes):
+            raise RuntimeError
+        self.contact.save()
+        with self.assertRaises(RuntimeError):
+            consume('test', handle=fail)
+        self.assertEqual(ChangeFeedOffset.objects.get(consumer='test').position, seen[-1].sequence)
+        self.assertEqual(consume('test', handle=seen.extend), 1)
+
+    def test_entry_committed_below_offset_is_consumed(self):
+        # A long transaction's entry gets its id first and commits last
+        late = ChangeLog.objects.create(model='engagement.Contact', object_id=self.contact.pk, sync_id=self.contact.sync_id)
+        late_id = late.pk
+        late.delete()
+        self.contact.save()
+        consume('test', handle=list)
+        ChangeLog.objects.create(id=late_id, model='engagement.Contact', object_id=self.contact.pk, sync_id=self.contact.sync_id)
+        seen = []
+        self.assertEqual(consume('test', handle=seen.extend), 1)
+        self.assertEqual(seen[0].id, late_id)
+
+    @override_settings(CHANGE_FEED_CONSUMERS={'a': 'builtins.list', 'b': 'builtins.list'})
+    def test_consume_all_job_runs_every_consumer(self):
+        self.assertEqual(consume_all(), 'a: 4, b: 4')
+        self.contact.save()
+        self.assertEqual(consume_all(), 'a: 1, b: 1')
+
+    @override_settings(CHANGE_FEED_CONSUMERS={'a': 'builtins.list', 'b': 'builtins.list'}, SYNC_PEERS={})
+    def test_prune_keeps_entries_a_reader_needs(self):
+        from sync.models import SyncPeer
+        consume('a')
+        self.assertEqual(prune_change_log(), '0 entries pruned')
+        consume('b')
+        self.contact.save()
+        SyncPeer.objects.create(name='aws', pushed_version=sequence_changes())
+        # Both consumers have read the entries of setUp, not the last save
+        self.assertEqual(prune_change_log(), '4 entries pruned')
+        self.assertEqual(ChangeLog.objects.count(), 1)
+        SyncPeer.objects.update(pushed_version=0)
+        consume('a')
+        consume('b')
+        self.assertEqual(prune_change_log(), '0 entries pruned')
+
+    def test_velocity_consumer_measures_bulk_inserts(self):
+        from analytics.models import PostVelocity
+        Engagement.objects.bulk_create([Engagement(contact=self.contact, post=self.post, content='Hi')])
+        out = StringIO()
+        call_command('consume_changes', 'analytics.velocity', stdout=out)
+        self.assertIn('analytics.velocity:', out.getvalue())
+        self.assertEqual(PostVelocity.objects.get(post=self.post).engagements_total, 1)
+
+
+def failing_job():
+    raise RuntimeError('boom')
+
+
+@override_settings(SCHEDULED_JOBS={
+    'warm': {'schedule': '45 8 * * *', 'task': 'core.dashboard.warm_dashboard'},
+    'broken': {'schedule': '*/30 * * * *', 'task': 'core.tests.failing_job'},
+})
+class SchedulerTest(TestCase):
+    def at(self, *args):
+        return timezone.make_aware(datetime(*args))
+
+    def test_cron_schedule(self):
+        schedule = CronSchedule('45 8 * * mon-sat')
+        self.assertTrue(schedule.matches(self.at(2026, 10, 19, 8, 45, 30)))
+        self.assertFalse(schedule.matches(self.at(2026, 10, 18, 8, 45)))  # Sunday
+        self.assertEqual(schedule.next_after(self.at(2026, 10, 17, 9, 0)), self.at(2026, 10, 19, 8, 45))
+        self.assertEqual(CronSchedule('0 0 1 */3 *').next_after(self.at(2026, 11, 5)), self.at(2027, 1, 1))
+        # Day of month or day of week, when both are given
+        self.assertEqual(CronSchedule('0 12 1 * fri').next_after(self.at(2026, 10, 19)), self.at(2026, 10, 23, 12))
+        for expression in ['* * *', '60 * * * *', '0 0 0 * *', 'x * * * *']:
+            with self.assertRaises(ValueError):
+                CronSchedule(expression)
+        with self.assertRaises(ValueError):
+            CronSchedule('0 0 30 feb *').next_after(self.at(2026, 1, 1))
+
+    def test_due_slots_run_once(self):
+        with self.assertLogs('core.scheduler', 'ERROR'):
+            runs = run_pending(now=self.at(2026, 10, 19, 8, 50))
+        self.assertEqual(sorted((run.job, run.status) for run in runs), [('broken', 'failed'), ('warm', 'succeeded')])
+        broken = JobRun.objects.get(job='broken')
+        self.assertEqual(broken.scheduled_for, self.at(2026, 10, 19, 8, 30))
+        self.assertIn('RuntimeError: boom', broken.error)
+        self.assertIsNotNone(broken.duration)
+
+        self.assertEqual(run_pending(now=self.at(2026, 10, 19, 8, 59)), [])
+        with self.assertLogs('core.scheduler', 'ERROR'):
+            self.assertEqual([run.job for run in run_pending(now=self.at(2026, 10, 19, 9, 0))], ['broken'])
+            # Slots further back than the catch-up window are not replayed
+            self.assertEqual([run.job for run in run_pending(now=self.at(2026, 10, 20, 10, 10))], ['broken'])
+
+    @override_settings(TIME_ZONE='Pacific/Kiritimati')
+    def test_today_set_follows_time_zone(self):
+        # Monday noon in UTC is already Tuesday at UTC+14
+        monday_noon = datetime(2026, 10, 19, 12, tzinfo=dt_timezone.utc)
+        with mock.patch.object(timezone, 'now', return_value=monday_noon):
+            self.assertEqual(get_today_set(), 'B')
+        self.assertEqual(get_today_set(monday_noon.date()), 'A')
+
+    @override_settings(
+        SCHEDULED_JOBS={'changes.consume': {'schedule': '* * * * *', 'task': 'core.changes.consume_all'}},
+        CHANGE_FEED_CONSUMERS={'test': 'builtins.list'},
+    )
+    def test_consumers_run_as_a_job(self):
+        FBGroup.objects.create(name='Group', group_url='https://facebook.com/groups/g', group_set='A')
+        runs = run_pending(now=self.at(2026, 10, 19, 8, 50))
+        self.assertEqual([(run.job, run.status, run.result) for run in runs], [('changes.consume', 'succeeded', 'test: 1')])
+
+    def test_configured_jobs_resolve(self):
+        # The class overrides SCHEDULED_JOBS; check the project's own
+        from django.utils.module_loading import import_string
+        from marketing_tracker import settings as project_settings
+        jobs = project_settings.SCHEDULED_JOBS
+        for name, job in jobs.items():
+            CronSchedule(job['schedule'])
+            self.assertTrue(callable(import_string(job['task'])), name)
+        self.assertEqual(jobs['contacts.rescore']['task'], 'engagement.scoring.recompute_scores')
+
+    def test_warmed_dashboard_needs_no_post_query(self):
+        cache.clear()
+        group = FBGroup.objects.create(name='Group', group_url='https://facebook.com/groups/g', group_set='A')
+        Post.objects.create(ad=Ad.objects.create(name='Ad', text='Text'), fb_group=group, post_url='https://facebook.com/posts/1', posted_at=timezone.now())
+        self.assertEqual(warm_dashboard(), '1 posts')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('core:home'))
+        self.assertEqual(len(response.context['post_history']), 1)
+        self.assertFalse([query for query in queries if 'posts_post' in query['sql']])
+
+    def test_command_runs_a_job_by_hand(self):
+        out = StringIO()
+        call_command('scheduler', run=['warm'], stdout=out)
+        self.assertIn('warm: succeeded', out.getvalue())
+        call_command('scheduler', list=True, stdout=out)
+        self.assertIn('1 runs, 0 failed', out.getvalue())
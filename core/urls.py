@@ -5,5 +5,13 @@ app_name = 'core'
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('events/dashboard/', views.dashboard_events, name='dashboard_events'),
     path('test-lexical/', views.test_lexical, name='test_lexical'),
+    path('health/db-pool/', views.db_pool_stats, name='db_pool_stats'),
 ]
+
+# Mounted under admin/profiles/ by the project URLconf
+profile_urlpatterns = ([
+    path('', views.profile_list, name='list'),
+    path('<str:profile_id>/', views.profile_detail, name='detail'),
+], 'profiles')
@@ -1,47 +1,76 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.utils import timezone
-from datetime import datetime
+from core.cache import namespace_version
+from core.dashboard import get_today_set, post_history, set_groups
+from core.events import dashboard_changes, format_event, parse_cursor
 from core.models import FBGroup
-from posts.models import Post
+from core.pool import pool_stats
+from core.profiling import flame_rows, list_profiles, load_profile
+from core.routers import use_replica
 
 # Create your views here.
 
-def get_today_set():
-    """
-    Determine which set (A or B) should be posted to today.
-    Monday, Wednesday, Friday = A
-    Tuesday, Thursday, Saturday = B
-    Sunday = None
-    """
-    weekday = datetime.now().weekday()  # 0=Monday, 6=Sunday
-    if weekday in [0, 2, 4]:  # Monday, Wednesday, Friday
-        return 'A'
-    elif weekday in [1, 3, 5]:  # Tuesday, Thursday, Saturday
-        return 'B'
-    return None
-
+@use_replica
 def home(req):
-    today = timezone.now().date()
-    today_set = get_today_set()
-
-    # Get groups for today's set
-    if today_set:
-        today_groups = FBGroup.objects.filter(group_set=today_set)
-    else:
-        today_groups = FBGroup.objects.none()
-
-    # Get post history ordered by last_updated descending
-    post_history = Post.objects.all().order_by('-last_updated')
+    today = timezone.localdate()
+    today_set = get_today_set(today)
 
+    # Shared between workers until a post, ad, group or engagement changes,
+    # and computed ahead of the posting window, see core.dashboard
     context = {
         'today': today,
         'today_set': today_set,
-        'today_groups': today_groups,
-        'post_history': post_history,
+        'today_groups': set_groups(today_set) if today_set else [],
+        'post_history': post_history(),
+        'events_since': timezone.now().isoformat(),
     }
     return render(req, 'index.html', context)
 
 
+async def _dashboard_stream(since):
+    poll = settings.DASHBOARD_EVENTS_POLL
+    deadline = time.monotonic() + settings.DASHBOARD_EVENTS_MAX_AGE
+    version = await sync_to_async(namespace_version)('dashboard')
+    # Look once straight away for changes made since the page was rendered,
+    # and once more after every version bump, in case the bump was signalled
+    # before the write committed
+    recheck = True
+    idle = 0.0
+    yield f'retry: {settings.DASHBOARD_EVENTS_RETRY_MS}\n\n'
+    while time.monotonic() < deadline:
+        current = await sync_to_async(namespace_version)('dashboard')
+        if current != version or recheck:
+            recheck = current != version
+            version = current
+            changes, since = await sync_to_async(dashboard_changes)(since)
+            for change in changes:
+                yield format_event(change, event='post', event_id=since.isoformat())
+            idle = 0.0
+        elif idle >= settings.DASHBOARD_EVENTS_HEARTBEAT:
+            yield ': keepalive\n\n'
+            idle = 0.0
+        await asyncio.sleep(poll)
+        idle += poll
+
+
+async def dashboard_events(req):
+    """Stream post history changes to an open dashboard as server-sent events"""
+    since = parse_cursor(req.headers.get('Last-Event-ID') or req.GET.get('since')) or timezone.now()
+    return StreamingHttpResponse(
+        _dashboard_stream(since),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 def group_detail(req, group_id):
     group = FBGroup.objects.get(id=group_id)
     context = {'group': group}
@@ -50,4 +79,44 @@ def group_detail(req, group_id):
 
 def test_lexical(req):
     """Test page for Lexical editor"""
-    return render(req, 'test_lexical.html')
\ No newline at end of file
+    return render(req, 'test_lexical.html')
+
+
+@staff_member_required
+def db_pool_stats(req):
+    """Connection pool utilization and wait times for this worker process"""
+    return JsonResponse(pool_stats())
+
+
+@staff_member_required
+def profile_list(req):
+    """Stored request profiles, newest first"""
+    context = {
+        **admin.site.each_context(req),
+        'title': 'Request profiles',
+        'profiles': list_profiles(),
+    }
+    return render(req, 'admin/profiles/profile_list.html', context)
+
+
+@staff_member_required
+def profile_detail(req, profile_id):
+    """Flame graph and SQL queries of one stored request profile"""
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise Http404('No such profile')
+    boxes, max_depth = flame_rows(profile['tree'])
+    queries = sorted(profile['queries'], key=lambda query: query['time'], reverse=True)
+    for query in queries:
+        query['ms'] = round(query['time'] * 1000, 2)
+    context = {
+        **admin.site.each_context(req),
+        'title': f"{profile['method']} {profile['path']}",
+        'profile': profile,
+        'boxes': boxes,
+        'graph_height': (max_depth + 1) * 18,
+        'queries': queries,
+        'total_ms': round(profile['tree']['time'] * 1000, 1),
+        'query_ms': round(sum(query['time'] for query in queries) * 1000, 1),
+    }
+    return render(req, 'admin/profiles/profile_detail.html', context)
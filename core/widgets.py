@@ -0,0 +1,59 @@
+from django import forms
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+
+class AutocompleteSelect(forms.HiddenInput):
+    """
+    An autocomplete picker for foreign keys.
+    Stores the selected id in a hidden input and looks options up through a
+    JSON search endpoint, so the form renders in constant size no matter how
+    many rows the related table holds.
+    """
+
+    # Render with the visible fields rather than in the hidden-field block
+    is_hidden = False
+
+    def __init__(self, url_name, placeholder='Start typing to search', attrs=None):
+        self.url_name = url_name
+        self.placeholder = placeholder
+        super().__init__(attrs=attrs)
+
+    def render(self, name, value, attrs=None, renderer=None):
+        # Get the hidden input HTML from parent
+        hidden_html = super().render(name, value, attrs, renderer)
+
+        # Get the input ID
+        input_id = attrs.get('id', f'id_{name}') if attrs else f'id_{name}'
+
+        html = f'''
+        <div class="autocomplete-wrapper position-relative">
+            {hidden_html}
+            <input type="text" id="{input_id}_search" class="form-control autocomplete-input"
+                   value="{escape(self.get_label(value))}" placeholder="{escape(self.placeholder)}"
+                   autocomplete="off" data-autocomplete-url="{reverse(self.url_name)}"
+                   data-autocomplete-target="{input_id}">
+            <div class="list-group autocomplete-results position-absolute w-100 shadow-sm"></div>
+        </div>
+        '''
+        return mark_safe(html)
+
+    def id_for_label(self, id_):
+        # Point <label for=...> at the visible search box
+        return f'{id_}_search' if id_ else id_
+
+    def get_label(self, value):
+        """Look up the display label of the selected object, if any"""
+        if not value:
+            return ''
+        queryset = getattr(self.choices, 'queryset', None)
+        if queryset is None:
+            return ''
+        obj = queryset.filter(pk=value).first()
+        return str(obj) if obj else ''
+
+    class Media:
+        js = (
+            'js/autocomplete.js',
+        )
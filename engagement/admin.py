@@ -1,11 +1,14 @@
 from django.contrib import admin
-from .models import Contact, Engagement
+from django.db.models import F, OuterRef
+from core.expressions import SubqueryCount
+from .models import ArchiveBatch, Contact, Engagement
 
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
     list_display = ('name', 'engagement_count', 'fb_url')
     search_fields = ('name',)
     readonly_fields = ('engagement_count',)
+    show_full_result_count = False
     fieldsets = (
         ('Contact Information', {
             'fields': ('name', 'fb_url')
@@ -16,16 +19,26 @@ class ContactAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.annotate(
+            engagement_total=SubqueryCount(Engagement.objects.filter(contact=OuterRef('pk'))) + F('archived_engagements')
+        )
+
     def engagement_count(self, obj):
-        return obj.engagements.count()
+        return obj.engagement_total
     engagement_count.short_description = 'Total Engagements'
+    engagement_count.admin_order_field = 'engagement_total'
 
 @admin.register(Engagement)
 class EngagementAdmin(admin.ModelAdmin):
     list_display = ('contact', 'post', 'created_at', 'content_preview')
-    list_filter = ('created_at', 'contact', 'post__ad')
+    list_filter = ('created_at', 'post__fb_group')
+    list_select_related = ('contact', 'post__ad', 'post__fb_group')
     search_fields = ('contact__name', 'content', 'post__ad__name')
+    autocomplete_fields = ('contact', 'post')
     readonly_fields = ('created_at',)
+    show_full_result_count = False
     fieldsets = (
         ('Engagement Information', {
             'fields': ('contact', 'post')
@@ -45,3 +58,11 @@ class EngagementAdmin(admin.ModelAdmin):
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
     content_preview.short_description = 'Content Preview'
+
+@admin.register(ArchiveBatch)
+class ArchiveBatchAdmin(admin.ModelAdmin):
+    list_display = ('path', 'cutoff', 'engagement_count', 'post_count', 'created_at')
+    readonly_fields = ('path', 'cutoff', 'engagement_count', 'post_count', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class EngagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'engagement'
+
+    def ready(self):
+        from django.db.models.signals import post_save
+        from .models import Engagement
+        from .scoring import score_engagement
+
+        def score_new_engagement(sender, instance, created, raw=False, **kwargs):
+            if created and not raw:
+                score_engagement(instance)
+
+        post_save.connect(score_new_engagement, sender=Engagement, dispatch_uid='engagement:score', weak=False)
@@ -0,0 +1,232 @@
+"""
+Archival of old engagements and posts into compressed cold storage.
+
+Rows older than a cutoff are written to a gzipped JSONL file through the
+default storage (local media in DEV, S3 in AWS) and removed from the hot
+tables. Per-post and per-contact engagement totals are carried over to the
+``archived_engagements`` counters so counts shown in the app stay intact,
+and archived rows are read back for the post history page and a post's
+archived engagements. Archival is
+local to each deployment: its writes reach change feed consumers but are
+never sent to sync peers.
+"""
+
+import gzip
+import json
+import tempfile
+from collections import Counter
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.conf import settings
+from django.db.models import Case, Count, F, PositiveIntegerField, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import cached_query, invalidate
+from core.changes import ARCHIVE_ORIGIN, change_origin
+from posts.models import Post
+from .models import ArchiveBatch, Contact, Engagement
+
+# Number of rows fetched from the database at a time while writing an archive
+ARCHIVE_CHUNK_SIZE = 2000
+
+# Rows whose archived counters are raised by one UPDATE
+COUNTER_CHUNK_SIZE = 500
+
+
+def _engagement_record(engagement):
+    return {
+        'type': 'engagement',
+        'id': engagement.id,
+        'post_id': engagement.post_id,
+        'contact_id': engagement.contact_id,
+        'contact_name': engagement.contact.name,
+        'content': engagement.content,
+        'notes': engagement.notes,
+        'message_url': engagement.message_url,
+        'created_at': engagement.created_at,
+    }
+
+
+def _post_record(post):
+    return {
+        'type': 'post',
+        'id': post.id,
+        'ad_id': post.ad_id,
+        'ad_name': post.ad.name,
+        'fb_group_id': post.fb_group_id,
+        'fb_group_name': post.fb_group.name,
+        'post_url': post.post_url,
+        'posted_at': post.posted_at,
+        'last_updated': post.last_updated,
+        'engagement_count': post.archived_engagements,
+    }
+
+
+def _write_line(stream, record):
+    stream.write(json.dumps(record, cls=DjangoJSONEncoder).encode() + b'\n')
+
+
+def _add_archived_counts(model, counts):
+    """Add to the archived_engagements counters, one CASE update per chunk of rows"""
+    pks = sorted(counts)
+    for start in range(0, len(pks), COUNTER_CHUNK_SIZE):
+        chunk = pks[start:start + COUNTER_CHUNK_SIZE]
+        model.objects.filter(pk__in=chunk).update(archived_engagements=Case(
+            *[When(pk=pk, then=F('archived_engagements') + counts[pk]) for pk in chunk],
+            default=F('archived_engagements'),
+            output_field=PositiveIntegerField(),
+        ))
+
+
+def archive_before(cutoff, dry_run=False):
+    """
+    Move engagements created before ``cutoff`` to cold storage, along with
+    posts published before ``cutoff`` that have no live engagements left.
+
+    Rows are deleted in the same transaction that saves the file and records
+    the batch, so a failed upload leaves the hot tables untouched. Only files
+    with a recorded batch are ever read back.
+
+    Args:
+        cutoff (datetime): Rows older than this are archived
+        dry_run (bool): Only count what would be archived
+
+    Returns:
+        ArchiveBatch: The recorded batch (unsaved on a dry run), or None if
+        there was nothing to archive
+    """
+    engagements = Engagement.objects.filter(created_at__lt=cutoff)
+    if dry_run:
+        post_count = Post.objects.filter(posted_at__lt=cutoff).exclude(
+            engagements__created_at__gte=cutoff
+        ).count()
+        return ArchiveBatch(
+            cutoff=cutoff,
+            engagement_count=engagements.count(),
+            post_count=post_count,
+        )
+
+    with tempfile.TemporaryFile() as buffer, change_origin(ARCHIVE_ORIGIN):
+        with transaction.atomic():
+            per_post = Counter()
+            per_contact = Counter()
+            with gzip.GzipFile(fileobj=buffer, mode='wb') as stream:
+                rows = engagements.select_related('contact').order_by('id')
+                for engagement in rows.iterator(chunk_size=ARCHIVE_CHUNK_SIZE):
+                    _write_line(stream, _engagement_record(engagement))
+                    per_post[engagement.post_id] += 1
+                    per_contact[engagement.contact_id] += 1
+
+                # Carry the archived engagements over to the rollup counters
+                _add_archived_counts(Post, per_post)
+                _add_archived_counts(Contact, per_contact)
+                engagement_count = engagements.delete()[0]
+
+                posts = Post.objects.filter(posted_at__lt=cutoff, engagements__isnull=True)
+                post_count = 0
+                for post in posts.select_related('ad', 'fb_group').order_by('id').iterator(chunk_size=ARCHIVE_CHUNK_SIZE):
+                    _write_line(stream, _post_record(post))
+                    post_count += 1
+                posts.delete()
+
+            if not engagement_count and not post_count:
+                return None
+            # Bulk deletes and counter updates send no signals
+            transaction.on_commit(lambda: invalidate('dashboard'))
+
+            buffer.seek(0)
+            stamp = timezone.now().strftime('%Y%m%d%H%M%S')
+            path = default_storage.save(f'archive/engagements-{stamp}.jsonl.gz', File(buffer))
+            return ArchiveBatch.objects.create(
+                cutoff=cutoff,
+                path=path,
+                engagement_count=engagement_count,
+                post_count=post_count,
+            )
+
+
+def read_batch(batch):
+    """
+    Read back the records stored in an archive batch.
+
+    Args:
+        batch (ArchiveBatch): The batch to read
+
+    Yields:
+        dict: Engagement and post records, as written by ``archive_before``
+    """
+    with default_storage.open(batch.path, 'rb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='rb') as stream:
+            for line in stream:
+                yield json.loads(line)
+
+
+def archived_records(record_type=None, **filters):
+    """
+    Read back archived records across every batch, oldest batch first.
+
+    Args:
+        record_type (str): 'engagement' or 'post' to restrict the type
+        **filters: Record fields that must match, e.g. ``post_id=3``
+
+    Yields:
+        dict: Matching records
+    """
+    for batch in ArchiveBatch.objects.all():
+        for record in read_batch(batch):
+            if record_type and record['type'] != record_type:
+                continue
+            if all(record.get(field) == value for field, value in filters.items()):
+                yield record
+
+
+def archived_posts():
+    """
+    Every archived post record. Batches are never changed once written, so
+    the records are cached until a new batch is recorded.
+    """
+    latest = ArchiveBatch.objects.order_by('-id').values_list('id', 'path').first()
+    if latest is None:
+        return []
+    return cached_query(
+        'archive', 'posts:{}:{}'.format(*latest), lambda: list(archived_records('post')), ttl=settings.CACHE_WARM_TTL,
+    )
+
+
+def post_history(include_archived=True):
+    """
+    List every post with its engagement count, live and archived alike,
+    for historical reports.
+
+    Returns:
+        list: dicts with ad_name, fb_group_name, posted_at and engagement_count
+    """
+    history = []
+    posts = Post.objects.select_related('ad', 'fb_group').annotate(
+        engagement_total=Count('engagements') + F('archived_engagements')
+    )
+    for post in posts:
+        history.append({
+            'id': post.id,
+            'ad_name': post.ad.name,
+            'fb_group_name': post.fb_group.name,
+            'posted_at': post.posted_at,
+            'engagement_count': post.engagement_total,
+            'archived': False,
+        })
+    if include_archived:
+        for record in archived_posts():
+            history.append({
+                'id': record['id'],
+                'ad_name': record['ad_name'],
+                'fb_group_name': record['fb_group_name'],
+                'posted_at': parse_datetime(record['posted_at']),
+                'engagement_count': record['engagement_count'],
+                'archived': True,
+            })
+    history.sort(key=lambda row: row['posted_at'])
+    return history
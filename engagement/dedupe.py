@@ -0,0 +1,96 @@
+"""
+Merging of duplicate engagements.
+
+An engagement is a duplicate when another one has the same post, contact
+and normalized content (``Engagement.content_hash``). New ones are kept
+out by the unique constraint on those columns; rows recorded before it are
+merged here: every duplicate row comes back, with the id of the copy kept,
+from one windowed query over the constraint's columns, and that copy keeps
+the others' notes and message URL.
+
+The copy kept is the one with the lowest ``sync_id``, not the earliest id:
+ids differ between deployments, and each side logs its deletes for sync,
+so both must keep the same copy or each would delete the other's. The
+sync_ids merged away become aliases (see sync.models.SyncAlias) of the
+copy kept, so a peer's changes to them still apply.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import FirstValue
+from django.utils import timezone
+
+from sync.models import SyncAlias
+from .models import Engagement
+
+# Separates the merged notes of duplicate engagements
+NOTES_SEPARATOR = '\n\n'
+
+# Rows written or deleted per query
+MERGE_BATCH_SIZE = 1000
+
+
+def duplicate_rows():
+    """
+    Every engagement that shares post, contact and content hash with
+    another, the copy kept first within each group.
+
+    Returns:
+        list: dicts with id, sync_id, keeper (id of the copy with the
+        lowest sync_id), contact_id, notes and message_url
+    """
+    group = [F('post_id'), F('contact_id'), F('content_hash')]
+    return list(
+        Engagement.objects.annotate(
+            copies=Window(Count('id'), partition_by=group),
+            keeper=Window(FirstValue('id'), partition_by=group, order_by=F('sync_id').asc()),
+        ).filter(copies__gt=1).order_by('keeper', 'sync_id').values(
+            'id', 'sync_id', 'keeper', 'contact_id', 'notes', 'message_url',
+        )
+    )
+
+
+def merge_duplicates(dry_run=False):
+    """
+    Fold duplicate engagements into the copy with the lowest sync_id.
+
+    Args:
+        dry_run (bool): Only count the duplicates
+
+    Returns:
+        dict: 'groups' merged, 'removed' rows and 'contact_ids' whose
+        scores need rebuilding
+    """
+    rows = duplicate_rows()
+    merged = {}
+    doomed = []
+    aliases = []
+    for row in rows:
+        # The copy kept comes first in its group
+        keeper = merged.setdefault(row['keeper'], {'sync_id': row['sync_id'], 'notes': [], 'message_url': None})
+        if row['notes'] and row['notes'] not in keeper['notes']:
+            keeper['notes'].append(row['notes'])
+        keeper['message_url'] = keeper['message_url'] or row['message_url']
+        if row['id'] != row['keeper']:
+            doomed.append(row['id'])
+            aliases.append(SyncAlias(model='engagement.Engagement', sync_id=row['sync_id'], local_sync_id=keeper['sync_id']))
+
+    result = {
+        'groups': len(merged),
+        'removed': len(doomed),
+        'contact_ids': {row['contact_id'] for row in rows},
+    }
+    if dry_run or not doomed:
+        return result
+
+    now = timezone.now()
+    with transaction.atomic():
+        keepers = [
+            Engagement(pk=pk, notes=NOTES_SEPARATOR.join(values['notes']), message_url=values['message_url'], last_updated=now)
+            for pk, values in merged.items()
+        ]
+        Engagement.objects.bulk_update(keepers, ['notes', 'message_url', 'last_updated'], batch_size=MERGE_BATCH_SIZE)
+        for start in range(0, len(doomed), MERGE_BATCH_SIZE):
+            Engagement.objects.filter(pk__in=doomed[start:start + MERGE_BATCH_SIZE]).delete()
+        SyncAlias.objects.bulk_create(aliases, batch_size=MERGE_BATCH_SIZE, ignore_conflicts=True)
+    return result
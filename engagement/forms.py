@@ -1,5 +1,6 @@
 from django import forms
-from .models import Contact, Engagement
+from .models import Contact, Engagement, content_hash
+from core.widgets import AutocompleteSelect
 
 class ContactForm(forms.ModelForm):
     class Meta:
@@ -15,9 +16,35 @@ class EngagementForm(forms.ModelForm):
         model = Engagement
         fields = ['contact', 'content', 'notes', 'message_url']
         widgets = {
-            'contact': forms.Select(attrs={'class': 'form-control'}),
+            'contact': AutocompleteSelect('engagement:contact_search', placeholder='Start typing a contact name'),
             'content': forms.Textarea(attrs={'class': 'form-control', 'placeholder': 'Engagement Content', 'rows': 4}),
             'notes': forms.Textarea(attrs={'class': 'form-control', 'placeholder': 'Notes', 'rows': 3}),
             'message_url': forms.URLInput(attrs={'class': 'form-control', 'placeholder': 'Message URL (optional)'}),
         }
 
+    # Shown when the post already has the same content from the contact
+    DUPLICATE_ERROR = 'This engagement is already recorded for this contact on the post.'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        contact, content = cleaned_data.get('contact'), cleaned_data.get('content')
+        # The post is set on the instance by the view; the bulk grid leaves
+        # its duplicates to the constraint
+        post_id = self.instance.post_id
+        if post_id and contact and content and Engagement.objects.filter(
+            post_id=post_id, contact=contact, content_hash=content_hash(content),
+        ).exclude(pk=self.instance.pk).exists():
+            self.add_error('content', self.DUPLICATE_ERROR)
+        return cleaned_data
+
+class BulkEngagementForm(EngagementForm):
+    """A compact engagement form used as one row of the bulk entry grid"""
+    class Meta(EngagementForm.Meta):
+        widgets = {
+            'contact': AutocompleteSelect('engagement:contact_search', placeholder='Start typing a contact name'),
+            'content': forms.Textarea(attrs={'class': 'form-control', 'placeholder': 'Content', 'rows': 2}),
+            'notes': forms.Textarea(attrs={'class': 'form-control', 'placeholder': 'Notes', 'rows': 2}),
+            'message_url': forms.URLInput(attrs={'class': 'form-control', 'placeholder': 'Message URL'}),
+        }
+
+EngagementFormSet = forms.modelformset_factory(Engagement, form=BulkEngagementForm, extra=5)
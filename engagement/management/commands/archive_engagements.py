@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from analytics.rollups import refresh_post_velocity
+from engagement.archive import archive_before
+
+
+class Command(BaseCommand):
+    help = 'Move old engagements and posts into compressed cold storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.ARCHIVE_RETENTION_DAYS,
+            help='Archive rows older than this many days (default: ARCHIVE_RETENTION_DAYS)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be archived',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        if not options['dry_run']:
+            # Velocity can only be measured while engagements are live
+            refresh_post_velocity()
+        batch = archive_before(cutoff, dry_run=options['dry_run'])
+
+        if batch is None:
+            self.stdout.write(f'Nothing older than {cutoff:%Y-%m-%d} to archive.')
+        elif options['dry_run']:
+            self.stdout.write(
+                f'Would archive {batch.engagement_count} engagements and '
+                f'{batch.post_count} posts older than {cutoff:%Y-%m-%d}.'
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Archived {batch.engagement_count} engagements and '
+                f'{batch.post_count} posts to {batch.path}.'
+            ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.cache import invalidate
+from engagement.dedupe import merge_duplicates
+from engagement.scoring import recompute_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Merge engagements recorded more than once for the same post, contact and content '
+        '(run after `migrate engagement 0011`, before the unique constraint is added)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the duplicates without merging them',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            result = merge_duplicates(dry_run=options['dry_run'])
+            if result['removed'] and not options['dry_run']:
+                recompute_scores(contact_ids=result['contact_ids'])
+                transaction.on_commit(lambda: invalidate('dashboard'))
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['removed']} duplicate engagements in {result['groups']} groups."
+        ))
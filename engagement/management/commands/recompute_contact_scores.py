@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from engagement.scoring import recompute_scores
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every contact score from scratch (the nightly contacts.rescore job does this)'
+
+    def handle(self, *args, **options):
+        scored = recompute_scores()
+        self.stdout.write(self.style.SUCCESS(f'Recomputed scores for {scored} contacts.'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0003_engagement_created_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contact',
+            name='name',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:46
+
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    # pg_trgm only exists on PostgreSQL; other databases fall back to LIKE scans
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS engagement_contact_name_trgm '
+        'ON engagement_contact USING gin (UPPER(name::text) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS engagement_contact_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0004_contact_name_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
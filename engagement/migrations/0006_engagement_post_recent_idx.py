@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0005_contact_name_trigram_index'),
+        ('posts', '0006_ad_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='engagement',
+            index=models.Index(fields=['post', '-created_at', '-id'], name='engagement_post_recent_idx'),
+        ),
+    ]
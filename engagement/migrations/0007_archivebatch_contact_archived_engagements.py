@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0006_engagement_post_recent_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cutoff', models.DateTimeField()),
+                ('path', models.CharField(max_length=255)),
+                ('engagement_count', models.PositiveIntegerField(default=0)),
+                ('post_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='archived_engagements',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
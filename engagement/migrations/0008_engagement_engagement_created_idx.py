@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0007_archivebatch_contact_archived_engagements'),
+        ('posts', '0008_alter_post_last_updated'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='engagement',
+            index=models.Index(fields=['created_at'], name='engagement_created_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+import uuid
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def assign_sync_ids(apps, schema_editor):
+    for name in ['Contact', 'Engagement']:
+        model = apps.get_model('engagement', name)
+        batch = []
+        for row in model.objects.only('id').iterator(chunk_size=5000):
+            row.sync_id = uuid.uuid4()
+            batch.append(row)
+            if len(batch) == 5000:
+                model.objects.bulk_update(batch, ['sync_id'])
+                batch = []
+        model.objects.bulk_update(batch, ['sync_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0009_contact_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='last_updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='engagement',
+            name='last_updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        # Unique ids for existing rows: add nullable, fill, then constrain
+        migrations.AddField(
+            model_name='contact',
+            name='sync_id',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='engagement',
+            name='sync_id',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(assign_sync_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='contact',
+            name='sync_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='engagement',
+            name='sync_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+import hashlib
+import unicodedata
+
+from django.db import migrations, models
+
+
+def content_hash(content):
+    # A frozen copy of engagement.models.content_hash as of this migration
+    normalized = ' '.join(unicodedata.normalize('NFKC', content).casefold().split())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def assign_content_hashes(apps, schema_editor):
+    Engagement = apps.get_model('engagement', 'Engagement')
+    batch = []
+    for row in Engagement.objects.only('id', 'content').iterator(chunk_size=5000):
+        row.content_hash = content_hash(row.content)
+        batch.append(row)
+        if len(batch) == 5000:
+            Engagement.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    Engagement.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0010_sync_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='engagement',
+            name='content_hash',
+            field=models.CharField(default='', editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(assign_content_hashes, migrations.RunPython.noop),
+    ]
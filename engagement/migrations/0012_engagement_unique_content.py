@@ -0,0 +1,72 @@
+from django.db import migrations, models
+from django.db.models import Count, F, Window
+from django.db.models.functions import FirstValue
+from django.utils import timezone
+
+# Rows written or deleted per query
+MERGE_BATCH_SIZE = 1000
+
+
+def merge_existing_duplicates(apps, schema_editor):
+    # A frozen copy of engagement.dedupe.merge_duplicates as of this
+    # migration. Normally done beforehand by merge_duplicate_engagements,
+    # which also rebuilds the affected scores; otherwise the nightly
+    # 'contacts.rescore' job does. The copy with the lowest sync_id keeps
+    # the others' notes and message URL, so every deployment keeps the same
+    # one; the merges are logged as changes, and the sync_ids merged away
+    # become aliases of the copy kept, as in posts/0011.
+    Engagement = apps.get_model('engagement', 'Engagement')
+    ChangeLog = apps.get_model('core', 'ChangeLog')
+    SyncAlias = apps.get_model('sync', 'SyncAlias')
+    group = [F('post_id'), F('contact_id'), F('content_hash')]
+    rows = Engagement.objects.annotate(
+        copies=Window(Count('id'), partition_by=group),
+        keeper=Window(FirstValue('id'), partition_by=group, order_by=F('sync_id').asc()),
+    ).filter(copies__gt=1).order_by('keeper', 'sync_id').values('id', 'sync_id', 'keeper', 'notes', 'message_url')
+
+    merged = {}
+    doomed = []
+    for row in rows:
+        # The copy kept comes first in its group
+        keeper = merged.setdefault(row['keeper'], {'sync_id': row['sync_id'], 'notes': [], 'message_url': None})
+        if row['notes'] and row['notes'] not in keeper['notes']:
+            keeper['notes'].append(row['notes'])
+        keeper['message_url'] = keeper['message_url'] or row['message_url']
+        if row['id'] != row['keeper']:
+            doomed.append((row['id'], row['sync_id'], keeper['sync_id']))
+    if not doomed:
+        return
+
+    now = timezone.now()
+    keepers = [
+        Engagement(pk=pk, notes='\n\n'.join(values['notes']), message_url=values['message_url'], last_updated=now)
+        for pk, values in merged.items()
+    ]
+    Engagement.objects.bulk_update(keepers, ['notes', 'message_url', 'last_updated'], batch_size=MERGE_BATCH_SIZE)
+    for start in range(0, len(doomed), MERGE_BATCH_SIZE):
+        Engagement.objects.filter(pk__in=[pk for pk, _, _ in doomed[start:start + MERGE_BATCH_SIZE]]).delete()
+    SyncAlias.objects.bulk_create([
+        SyncAlias(model='engagement.Engagement', sync_id=sync_id, local_sync_id=keeper_sync_id)
+        for _, sync_id, keeper_sync_id in doomed
+    ], batch_size=MERGE_BATCH_SIZE, ignore_conflicts=True)
+    ChangeLog.objects.bulk_create([
+        *(ChangeLog(model='engagement.Engagement', object_id=pk, sync_id=values['sync_id'], action='save') for pk, values in merged.items()),
+        *(ChangeLog(model='engagement.Engagement', object_id=pk, sync_id=sync_id, action='delete') for pk, sync_id, _ in doomed),
+    ], batch_size=MERGE_BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0011_engagement_content_hash'),
+        ('core', '0003_changelog_feed'),
+        ('sync', '0002_syncalias'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_existing_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='engagement',
+            constraint=models.UniqueConstraint(fields=('post', 'contact', 'content_hash'), name='engagement_unique_content'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+
+def create_prefix_index(apps, schema_editor):
+    # istartswith compiles to LIKE on SQLite, which only a NOCASE index
+    # serves, and to UPPER(name::text) LIKE on PostgreSQL, which needs
+    # text_pattern_ops under a non-C collation; a plain btree serves neither
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS engagement_contact_name_prefix '
+            'ON engagement_contact (name COLLATE NOCASE)'
+        )
+    elif schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS engagement_contact_name_prefix '
+            'ON engagement_contact (UPPER(name::text) text_pattern_ops)'
+        )
+
+
+def drop_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP INDEX IF EXISTS engagement_contact_name_prefix')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0012_engagement_unique_content'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contact',
+            name='name',
+            field=models.CharField(max_length=200),
+        ),
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
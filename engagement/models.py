@@ -1,20 +1,71 @@
+import hashlib
+import unicodedata
+import uuid
+
 from django.db import models
+from core.changes import TrackedModel
 from posts.models import Post
 
-class Contact(models.Model):
+
+def content_hash(content):
+    """Hash of an engagement's content, ignoring case, Unicode form and whitespace"""
+    normalized = ' '.join(unicodedata.normalize('NFKC', content).casefold().split())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class Contact(TrackedModel):
     name = models.CharField(max_length=200)
     fb_url = models.URLField()
+    # Engagements moved to cold storage by the archive_engagements command
+    archived_engagements = models.PositiveIntegerField(default=0, editable=False)
+    # Recency-weighted engagement score, see engagement.scoring
+    score = models.FloatField(default=0.0, editable=False, db_index=True)
+    last_engaged_at = models.DateTimeField(null=True, blank=True, editable=False)
+    sync_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
     
-class Engagement(models.Model):
+class Engagement(TrackedModel):
+    # Above the fields: the content_hash field hides the function of that name
+    DERIVED_FIELDS = {'content_hash': ('content', content_hash)}
+
     contact = models.ForeignKey(Contact, related_name='engagements', on_delete=models.CASCADE)
     post = models.ForeignKey(Post, related_name='engagements', on_delete=models.CASCADE)
     content = models.TextField()
     notes = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     message_url = models.URLField(blank=True, null=True)
+    # Normalized content hash; a contact's comment is recorded once per post
+    content_hash = models.CharField(max_length=64, editable=False)
+    sync_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.contact.name} - {self.content[:20]}..."
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'contact', 'content_hash'], name='engagement_unique_content'),
+        ]
+        indexes = [
+            # Serves the newest-first windows on the engagement thread
+            models.Index(fields=['post', '-created_at', '-id'], name='engagement_post_recent_idx'),
+            # Finds engagements added since the last analytics refresh
+            models.Index(fields=['created_at'], name='engagement_created_idx'),
+        ]
+
+class ArchiveBatch(models.Model):
+    """A compressed JSONL file of engagements and posts moved out of the hot tables"""
+    created_at = models.DateTimeField(auto_now_add=True)
+    cutoff = models.DateTimeField()
+    path = models.CharField(max_length=255)
+    engagement_count = models.PositiveIntegerField(default=0)
+    post_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.path} ({self.engagement_count} engagements, {self.post_count} posts)"
+
+    class Meta:
+        ordering = ['created_at']
@@ -0,0 +1,120 @@
+"""
+Contact scoring for the top contacts leaderboard.
+
+Every engagement adds a weight to its contact's score: 1, plus a bonus the
+first time the contact engages with a post, and another the first time in
+a group, so breadth across posts and groups counts as well as volume. The
+weight decays with the engagement's age, halving every
+``CONTACT_SCORE_HALF_LIFE_DAYS``.
+
+Scores are stored relative to a fixed epoch: an engagement at time t adds
+``weight * 2 ** ((t - epoch) / half_life)``. Decaying every score to the
+present multiplies them all by the same factor, so the stored column ranks
+contacts exactly as the decayed scores do, an insert only has to add its
+own term, and a "top N" query is a range scan over the score index.
+
+Only inserts are scored incrementally. Deleting, merging or archiving an
+engagement subtracts nothing: its weight, and the bonuses it may have
+taken from later engagements, depend on the contact's whole history. The
+nightly 'contacts.rescore' job (``recompute_scores``) rebuilds every score
+from the live engagements, so scores run ahead of it by at most a day of
+removals. Changing the half-life or bonuses needs
+`manage.py recompute_contact_scores`.
+"""
+
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from posts.models import Post
+from .models import Contact, Engagement
+
+SCORE_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+# Contacts written per query by the full recompute
+SCORE_BATCH_SIZE = 1000
+
+
+def _half_life_seconds():
+    return settings.CONTACT_SCORE_HALF_LIFE_DAYS * 86400
+
+
+def engagement_weight(created_at, first_on_post, first_in_group):
+    """Stored score contribution of one engagement"""
+    weight = 1.0
+    if first_on_post:
+        weight += settings.CONTACT_SCORE_NEW_POST_BONUS
+    if first_in_group:
+        weight += settings.CONTACT_SCORE_NEW_GROUP_BONUS
+    return weight * 2 ** ((created_at - SCORE_EPOCH).total_seconds() / _half_life_seconds())
+
+
+def current_score(stored, now=None):
+    """Decay a stored score to the present, for display"""
+    now = now or timezone.now()
+    return stored * 2 ** (-(now - SCORE_EPOCH).total_seconds() / _half_life_seconds())
+
+
+def score_engagement(engagement):
+    """Add a newly saved engagement to its contact's score"""
+    # Same ordering as recompute_scores, so both agree on which engagement
+    # was the contact's first on a post or in a group
+    earlier = Engagement.objects.filter(contact_id=engagement.contact_id).filter(
+        Q(created_at__lt=engagement.created_at)
+        | Q(created_at=engagement.created_at, id__lt=engagement.pk)
+    )
+    first_on_post = not earlier.filter(post_id=engagement.post_id).exists()
+    # The post's group by subquery: engagement.post is often not loaded
+    first_in_group = first_on_post and not earlier.filter(
+        post__fb_group_id=Subquery(Post.objects.filter(pk=engagement.post_id).values('fb_group_id')[:1])
+    ).exists()
+    Contact.objects.filter(pk=engagement.contact_id).update(
+        score=F('score') + engagement_weight(engagement.created_at, first_on_post, first_in_group),
+        # Greatest is NULL on SQLite when either side is
+        last_engaged_at=Greatest(Coalesce('last_engaged_at', Value(engagement.created_at)), Value(engagement.created_at)),
+    )
+
+
+def recompute_scores(contact_ids=None):
+    """
+    Rebuild contact scores from their live engagements in one pass.
+
+    Args:
+        contact_ids: Only rebuild these contacts; defaults to all of them
+
+    Returns:
+        int: Number of contacts with at least one engagement
+    """
+    engagements = Engagement.objects.all()
+    contacts = Contact.objects.all()
+    if contact_ids is not None:
+        engagements = engagements.filter(contact_id__in=contact_ids)
+        contacts = contacts.filter(pk__in=contact_ids)
+    rows = engagements.order_by('contact_id', 'created_at', 'id').values_list(
+        'contact_id', 'post_id', 'post__fb_group_id', 'created_at'
+    )
+    updates = []
+    current = None
+    scored = 0
+    with transaction.atomic():
+        contacts.update(score=0.0, last_engaged_at=None)
+        for contact_id, post_id, group_id, created_at in rows.iterator(chunk_size=5000):
+            if current is None or current.pk != contact_id:
+                current = Contact(pk=contact_id, score=0.0)
+                posts, groups = set(), set()
+                updates.append(current)
+                scored += 1
+            current.score += engagement_weight(created_at, post_id not in posts, group_id not in groups)
+            current.last_engaged_at = created_at
+            posts.add(post_id)
+            groups.add(group_id)
+            # Keep the contact being accumulated until its last row is seen
+            if len(updates) > SCORE_BATCH_SIZE:
+                Contact.objects.bulk_update(updates[:-1], ['score', 'last_engaged_at'])
+                updates = updates[-1:]
+        Contact.objects.bulk_update(updates, ['score', 'last_engaged_at'])
+    return scored
@@ -1,9 +1,25 @@
-from django.test import TestCase, Client
+import tempfile
+import uuid
+from unittest import skipUnless
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
-from .models import Contact, Engagement
+from .archive import archive_before, archived_records, post_history
+from .dedupe import merge_duplicates
+from .forms import EngagementForm
+from .models import ArchiveBatch, Contact, Engagement, content_hash
+from .scoring import current_score, recompute_scores, score_engagement
 from posts.models import Ad, Post
-from core.models import FBGroup
+from core.models import ChangeLog, FBGroup
+from sync.models import SyncAlias
 
 class ContactModelTest(TestCase):
     def setUp(self):
@@ -143,3 +159,428 @@ class ViewEngagementsTest(TestCase):
         self.assertIn('engagements', response.context)
         engagements = response.context['engagements']
         self.assertEqual(len(engagements), 1)
+
+    def test_view_engagements_query_count(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('engagement:view_engagements', args=[self.post.id]))
+        self.assertEqual(response.context['post'].engagement_total, 1)
+
+class EngagementWindowTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.group = FBGroup.objects.create(
+            name='Test Group',
+            group_url='https://facebook.com/groups/test',
+            group_set='A'
+        )
+        self.ad = Ad.objects.create(
+            name='Test Ad',
+            text='Test ad text'
+        )
+        self.post = Post.objects.create(
+            ad=self.ad,
+            fb_group=self.group,
+            post_url='https://facebook.com/posts/123',
+            posted_at=timezone.now()
+        )
+        self.contact = Contact.objects.create(
+            name='John Doe',
+            fb_url='https://facebook.com/johndoe'
+        )
+        Engagement.objects.bulk_create([
+            Engagement(contact=self.contact, post=self.post, content=f'Comment {i}', notes='')
+            for i in range(30)
+        ])
+
+    def test_view_engagements_renders_first_window(self):
+        response = self.client.get(reverse('engagement:view_engagements', args=[self.post.id]))
+        self.assertEqual(len(response.context['engagements']), 25)
+        self.assertEqual(response.context['post'].engagement_total, 30)
+        self.assertIsNotNone(response.context['next_cursor'])
+
+    def test_engagement_window_returns_older_engagements(self):
+        response = self.client.get(reverse('engagement:view_engagements', args=[self.post.id]))
+        first_ids = {engagement.id for engagement in response.context['engagements']}
+        response = self.client.get(
+            reverse('engagement:engagement_window', args=[self.post.id]),
+            {'before': response.context['next_cursor']}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'engagement/_engagement_window.html')
+        older_ids = {engagement.id for engagement in response.context['engagements']}
+        self.assertEqual(len(older_ids), 5)
+        self.assertFalse(first_ids & older_ids)
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_engagement_window_rejects_bad_cursor(self):
+        response = self.client.get(
+            reverse('engagement:engagement_window', args=[self.post.id]),
+            {'before': 'not-a-cursor'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+class BulkAddEngagementsTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.group = FBGroup.objects.create(
+            name='Test Group',
+            group_url='https://facebook.com/groups/test',
+            group_set='A'
+        )
+        self.ad = Ad.objects.create(
+            name='Test Ad',
+            text='Test ad text'
+        )
+        self.post = Post.objects.create(
+            ad=self.ad,
+            fb_group=self.group,
+            post_url='https://facebook.com/posts/123',
+            posted_at=timezone.now()
+        )
+        self.contact1 = Contact.objects.create(name='Alice', fb_url='https://facebook.com/alice')
+        self.contact2 = Contact.objects.create(name='Bob', fb_url='https://facebook.com/bob')
+
+    def _formset_data(self, rows, total=5):
+        data = {
+            'form-TOTAL_FORMS': str(total),
+            'form-INITIAL_FORMS': '0',
+            'form-MIN_NUM_FORMS': '0',
+            'form-MAX_NUM_FORMS': '1000',
+        }
+        for index, row in enumerate(rows):
+            for field, value in row.items():
+                data[f'form-{index}-{field}'] = value
+        return data
+
+    def test_bulk_add_view_get_status_code(self):
+        response = self.client.get(reverse('engagement:bulk_add_engagements', args=[self.post.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'engagement/bulk_add_engagements.html')
+
+    def test_bulk_add_does_not_list_every_contact(self):
+        response = self.client.get(reverse('engagement:bulk_add_engagements', args=[self.post.id]))
+        self.assertNotContains(response, '<option')
+        self.assertNotContains(response, 'Alice')
+
+    def test_bulk_add_post_creates_filled_rows_only(self):
+        data = self._formset_data([
+            {'contact': self.contact1.id, 'content': 'Interested!', 'notes': 'Follow up'},
+            {'contact': self.contact2.id, 'content': 'How much?', 'notes': 'Send pricing'},
+        ])
+        response = self.client.post(reverse('engagement:bulk_add_engagements', args=[self.post.id]), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Engagement.objects.filter(post=self.post).count(), 2)
+        self.assertIsNotNone(Engagement.objects.first().created_at)
+
+    def test_bulk_add_post_invalid_row_saves_nothing(self):
+        data = self._formset_data([
+            {'contact': self.contact1.id, 'content': 'Interested!', 'notes': 'Follow up'},
+            {'contact': self.contact2.id, 'content': '', 'notes': 'Missing content'},
+        ])
+        response = self.client.post(reverse('engagement:bulk_add_engagements', args=[self.post.id]), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Engagement.objects.count(), 0)
+
+    def test_bulk_add_skips_recorded_comments(self):
+        Engagement.objects.create(contact=self.contact1, post=self.post, content='Interested!', notes='')
+        data = self._formset_data([
+            {'contact': self.contact1.id, 'content': '  interested! ', 'notes': 'Again'},
+            {'contact': self.contact2.id, 'content': 'How much?', 'notes': 'Send pricing'},
+            {'contact': self.contact2.id, 'content': 'How  much?', 'notes': 'Twice in one submit'},
+        ])
+        response = self.client.post(reverse('engagement:bulk_add_engagements', args=[self.post.id]), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            sorted(Engagement.objects.values_list('contact__name', 'content')),
+            [('Alice', 'Interested!'), ('Bob', 'How much?')],
+        )
+        response = self.client.get(response.url)
+        self.assertContains(response, 'Skipped 2 comment(s) already recorded for this post.')
+
+    def test_add_engagement_reports_recorded_comment(self):
+        Engagement.objects.create(contact=self.contact1, post=self.post, content='Interested!')
+        response = self.client.post(reverse('engagement:add_engagement', args=[self.post.id]), {
+            'contact': self.contact1.id, 'content': ' interested!', 'notes': '',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response.context['form'], 'content', EngagementForm.DUPLICATE_ERROR)
+        self.assertEqual(Engagement.objects.count(), 1)
+
+class ContactScoringTest(TestCase):
+    def setUp(self):
+        self.group_a = FBGroup.objects.create(name='Group A', group_url='https://facebook.com/groups/a', group_set='A')
+        self.group_b = FBGroup.objects.create(name='Group B', group_url='https://facebook.com/groups/b', group_set='B')
+        ad = Ad.objects.create(name='Ad', text='Text')
+        self.post_a1 = Post.objects.create(ad=ad, fb_group=self.group_a, post_url='https://facebook.com/posts/a1', posted_at=timezone.now())
+        self.post_a2 = Post.objects.create(ad=ad, fb_group=self.group_a, post_url='https://facebook.com/posts/a2', posted_at=timezone.now())
+        self.post_b = Post.objects.create(ad=ad, fb_group=self.group_b, post_url='https://facebook.com/posts/b', posted_at=timezone.now())
+        self.alice = Contact.objects.create(name='Alice', fb_url='https://facebook.com/alice')
+        self.bob = Contact.objects.create(name='Bob', fb_url='https://facebook.com/bob')
+
+    def engage(self, contact, post):
+        # Distinct content, as a repeated comment is recorded once
+        return Engagement.objects.create(contact=contact, post=post, content=f'Hi {Engagement.objects.count()}', notes='')
+
+    def test_breadth_scores_higher_than_repetition(self):
+        for post in [self.post_a1, self.post_a2, self.post_b]:
+            self.engage(self.alice, post)
+        for _ in range(3):
+            self.engage(self.bob, self.post_a1)
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertGreater(self.alice.score, self.bob.score)
+        self.assertAlmostEqual(current_score(self.alice.score), (1 + 1 + 2) + (1 + 1) + (1 + 1 + 2), places=2)
+        self.assertAlmostEqual(current_score(self.bob.score), (1 + 1 + 2) + 1 + 1, places=2)
+
+    def test_older_engagements_count_less(self):
+        self.engage(self.alice, self.post_a1)
+        old = self.engage(self.bob, self.post_a1)
+        Engagement.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=30))
+        recompute_scores()
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertAlmostEqual(self.bob.score / self.alice.score, 0.5, places=3)
+
+    def test_incremental_matches_full_recompute(self):
+        for contact, post in [(self.alice, self.post_a1), (self.bob, self.post_b), (self.alice, self.post_a1), (self.alice, self.post_b)]:
+            self.engage(contact, post)
+        incremental = dict(Contact.objects.values_list('name', 'score'))
+        self.assertEqual(recompute_scores(), 2)
+        for name, score in Contact.objects.values_list('name', 'score'):
+            self.assertAlmostEqual(score, incremental[name], delta=incremental[name] * 1e-9)
+
+    def test_scoring_does_not_load_the_post(self):
+        self.engage(self.alice, self.post_a1)
+        engagement = Engagement.objects.get()
+        # First on the post, first in the group, then the tracked update
+        # (rows read, update, change log); none loads the post
+        with self.assertNumQueries(5):
+            score_engagement(engagement)
+
+    def test_top_contacts_view(self):
+        self.engage(self.alice, self.post_a1)
+        self.engage(self.alice, self.post_b)
+        self.engage(self.bob, self.post_a1)
+        response = self.client.get(reverse('engagement:top_contacts'), {'n': 1})
+        self.assertEqual([c.name for c in response.context['contacts']], ['Alice'])
+
+    def test_bulk_add_scores_each_row_in_order(self):
+        self.client.post(reverse('engagement:bulk_add_engagements', args=[self.post_a1.id]), {
+            'form-TOTAL_FORMS': '2', 'form-INITIAL_FORMS': '0', 'form-MIN_NUM_FORMS': '0', 'form-MAX_NUM_FORMS': '1000',
+            'form-0-contact': self.alice.id, 'form-0-content': 'One', 'form-0-notes': 'n',
+            'form-1-contact': self.alice.id, 'form-1-content': 'Two', 'form-1-notes': 'n',
+        })
+        self.alice.refresh_from_db()
+        self.assertAlmostEqual(current_score(self.alice.score), (1 + 1 + 2) + 1, places=2)
+
+
+class ContactSearchTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        Contact.objects.create(name='Alice Smith', fb_url='https://facebook.com/alice')
+        Contact.objects.create(name='Albert Jones', fb_url='https://facebook.com/albert')
+        Contact.objects.create(name='Bob Alston', fb_url='https://facebook.com/bob')
+
+    def test_contact_search_prefix_matches_first(self):
+        response = self.client.get(reverse('engagement:contact_search'), {'q': 'al'})
+        names = [result['text'] for result in response.json()['results']]
+        self.assertEqual(names, ['Albert Jones', 'Alice Smith', 'Bob Alston'])
+
+    def test_contact_search_is_cached(self):
+        self.client.get(reverse('engagement:contact_search'), {'q': 'bob'})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('engagement:contact_search'), {'q': 'bob'})
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertIn('max-age', response['Cache-Control'])
+
+    def test_new_contact_invalidates_cached_search(self):
+        self.client.get(reverse('engagement:contact_search'), {'q': 'bob'})
+        Contact.objects.create(name='Bobby Tables', fb_url='https://facebook.com/bobby')
+        response = self.client.get(reverse('engagement:contact_search'), {'q': 'bob'})
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_contact_search_empty_query(self):
+        response = self.client.get(reverse('engagement:contact_search'), {'q': ''})
+        self.assertEqual(response.json()['results'], [])
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite query plan')
+    def test_prefix_search_uses_index(self):
+        plan = Contact.objects.filter(name__istartswith='al').values_list('pk', 'name').explain()
+        self.assertIn('engagement_contact_name_prefix', plan)
+
+class EngagementAdminChangelistTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+        group = FBGroup.objects.create(
+            name='Test Group',
+            group_url='https://facebook.com/groups/test',
+            group_set='A'
+        )
+        ad = Ad.objects.create(name='Test Ad', text='Test ad text')
+        self.post = Post.objects.create(
+            ad=ad,
+            fb_group=group,
+            post_url='https://facebook.com/posts/123',
+            posted_at=timezone.now()
+        )
+
+    def _add_engagements(self, count):
+        for i in range(count):
+            contact = Contact.objects.create(name=f'Contact {i}', fb_url=f'https://facebook.com/c{i}')
+            Engagement.objects.create(contact=contact, post=self.post, content='Hi', notes='')
+
+    def _changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for name in ('admin:engagement_engagement_changelist', 'admin:engagement_contact_changelist'):
+            self._add_engagements(2)
+            few = self._changelist_queries(reverse(name))
+            self._add_engagements(8)
+            many = self._changelist_queries(reverse(name))
+            self.assertEqual(few, many, name)
+
+class ArchiveEngagementsTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.now = timezone.now()
+        self.old = self.now - timedelta(days=400)
+        group = FBGroup.objects.create(
+            name='Test Group',
+            group_url='https://facebook.com/groups/test',
+            group_set='A'
+        )
+        ad = Ad.objects.create(name='Test Ad', text='Test ad text')
+        self.contact = Contact.objects.create(name='John Doe', fb_url='https://facebook.com/johndoe')
+        self.old_post = Post.objects.create(
+            ad=ad, fb_group=group, post_url='https://facebook.com/posts/1', posted_at=self.old
+        )
+        self.mixed_post = Post.objects.create(
+            ad=ad, fb_group=group, post_url='https://facebook.com/posts/2', posted_at=self.old
+        )
+        for post in (self.old_post, self.mixed_post):
+            engagement = Engagement.objects.create(contact=self.contact, post=post, content='Old', notes='')
+            Engagement.objects.filter(pk=engagement.pk).update(created_at=self.old)
+        Engagement.objects.create(contact=self.contact, post=self.mixed_post, content='New', notes='')
+
+    def test_archive_moves_old_rows_out_of_hot_tables(self):
+        batch = archive_before(self.now - timedelta(days=365))
+        self.assertEqual(batch.engagement_count, 2)
+        self.assertEqual(batch.post_count, 1)
+        self.assertEqual(Engagement.objects.count(), 1)
+        self.assertFalse(Post.objects.filter(pk=self.old_post.pk).exists())
+
+    def test_archive_keeps_counts_intact(self):
+        archive_before(self.now - timedelta(days=365))
+        self.mixed_post.refresh_from_db()
+        self.assertEqual(self.mixed_post.engagement_count(), 2)
+        self.contact.refresh_from_db()
+        self.assertEqual(self.contact.archived_engagements, 2)
+
+    def test_archived_rows_can_be_read_back(self):
+        archive_before(self.now - timedelta(days=365))
+        records = list(archived_records('engagement', post_id=self.old_post.pk))
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['contact_name'], 'John Doe')
+        history = post_history()
+        self.assertEqual(len(history), 2)
+        archived = [row for row in history if row['archived']]
+        self.assertEqual(archived[0]['engagement_count'], 1)
+
+    def test_archived_rows_are_shown(self):
+        cache.clear()
+        archive_before(self.now - timedelta(days=365))
+        response = self.client.get(reverse('engagement:post_history'))
+        self.assertContains(response, 'Archived</span>', count=1)
+        url = reverse('engagement:view_engagements', args=[self.mixed_post.pk])
+        self.assertContains(self.client.get(url), 'Show archived engagements')
+        response = self.client.get(url, {'archived': 1})
+        self.assertEqual([record['content'] for record in response.context['archived_engagements']], ['Old'])
+
+    def test_dry_run_changes_nothing(self):
+        batch = archive_before(self.now - timedelta(days=365), dry_run=True)
+        self.assertEqual(batch.engagement_count, 2)
+        self.assertEqual(batch.post_count, 1)
+        self.assertEqual(Engagement.objects.count(), 3)
+        self.assertFalse(ArchiveBatch.objects.exists())
+
+    def test_nothing_to_archive(self):
+        self.assertIsNone(archive_before(self.now - timedelta(days=1000)))
+
+
+class EngagementDedupeTest(TransactionTestCase):
+    """Merges duplicates recorded before the unique constraint existed"""
+
+    def migrate(self, target):
+        # Posts stay before their URL key, which needs the constraint
+        targets = [('engagement', target), ('posts', '0010_ad_image_pending')]
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        call_command('migrate', verbosity=0)
+
+    def test_hash_normalizes_content(self):
+        self.assertEqual(content_hash('Price  please?\n'), content_hash('price please?'))
+        self.assertNotEqual(content_hash('Price please?'), content_hash('Price please!'))
+
+    def create_duplicates(self):
+        """Engagements as recorded before the constraint; the lowest sync_id comes third"""
+        apps = self.migrate('0011_engagement_content_hash')
+        HistoricalEngagement = apps.get_model('engagement', 'Engagement')
+        group = FBGroup.objects.create(name='G', group_url='https://facebook.com/g', group_set='A')
+        ad = Ad.objects.create(name='Ad', text='Text')
+        post = apps.get_model('posts', 'Post').objects.create(
+            ad_id=ad.pk, fb_group_id=group.pk, post_url='https://facebook.com/p', posted_at=timezone.now(),
+        )
+        contact = apps.get_model('engagement', 'Contact').objects.create(name='Alice', fb_url='https://facebook.com/a')
+        for sync_id, content, notes, url in [
+            (3, 'Hi', 'first', None), (2, 'hi ', 'second', 'https://m.me/1'), (1, 'Hi', 'first', None), (4, 'Bye', '', None),
+        ]:
+            HistoricalEngagement.objects.create(
+                sync_id=uuid.UUID(int=sync_id), contact=contact, post_id=post.pk, content=content, notes=notes,
+                message_url=url, content_hash=content_hash(content),
+            )
+        return HistoricalEngagement
+
+    def assertMerged(self, HistoricalEngagement):
+        # The copy kept has the lowest sync_id, whatever its id here
+        self.assertEqual(
+            sorted(HistoricalEngagement.objects.values_list('sync_id', 'content', 'notes', 'message_url')),
+            [(uuid.UUID(int=1), 'Hi', 'first\n\nsecond', 'https://m.me/1'), (uuid.UUID(int=4), 'Bye', '', None)],
+        )
+        merged = {uuid.UUID(int=2), uuid.UUID(int=3)}
+        self.assertEqual(
+            set(SyncAlias.objects.values_list('sync_id', 'local_sync_id')),
+            {(sync_id, uuid.UUID(int=1)) for sync_id in merged},
+        )
+        # Peers get tombstones for the copies merged away only
+        self.assertEqual(set(ChangeLog.objects.filter(action='delete').values_list('sync_id', flat=True)), merged)
+
+    def test_migration_merges_and_logs_duplicates(self):
+        self.create_duplicates()
+        apps = self.migrate('0012_engagement_unique_content')
+        self.assertMerged(apps.get_model('engagement', 'Engagement'))
+        self.assertTrue(ChangeLog.objects.filter(sync_id=uuid.UUID(int=1), action='save').exists())
+
+    def test_existing_duplicates_are_merged(self):
+        HistoricalEngagement = self.create_duplicates()
+        result = merge_duplicates(dry_run=True)
+        self.assertEqual((result['groups'], result['removed']), (1, 2))
+        self.assertEqual(HistoricalEngagement.objects.count(), 4)
+        merge_duplicates()
+        self.assertMerged(HistoricalEngagement)
+        # Nothing is left for the constraint to trip over
+        self.migrate('0012_engagement_unique_content')
@@ -5,8 +5,13 @@ app_name = 'engagement'
 
 urlpatterns = [
     path('post/<int:post_id>/', views.view_engagements, name='view_engagements'),
+    path('post/<int:post_id>/window/', views.engagement_window, name='engagement_window'),
     path('post/<int:post_id>/add/', views.add_engagement, name='add_engagement'),
+    path('post/<int:post_id>/add/bulk/', views.bulk_add_engagements, name='bulk_add_engagements'),
+    path('history/', views.post_history, name='post_history'),
     path('contacts/', views.contacts_list, name='contacts_list'),
+    path('contacts/top/', views.top_contacts, name='top_contacts'),
     path('contacts/create/', views.create_contact, name='create_contact'),
+    path('contacts/search/', views.contact_search, name='contact_search'),
 ]
 
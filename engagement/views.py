@@ -1,36 +1,159 @@
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.http import HttpResponseBadRequest
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils.dateparse import parse_datetime
+from core.autocomplete import autocomplete_response
+from core.cache import invalidate
+from core.routers import use_replica
 from posts.models import Post
+from .archive import archived_records, post_history as full_post_history
 from .models import Contact, Engagement
-from .forms import ContactForm, EngagementForm
+from .forms import ContactForm, EngagementForm, EngagementFormSet
+from .scoring import current_score, score_engagement
 
+# Number of engagements rendered per window on the engagement thread
+ENGAGEMENT_WINDOW_SIZE = 25
+
+# Default and largest size of the top contacts leaderboard
+TOP_CONTACTS_DEFAULT = 25
+TOP_CONTACTS_MAX = 200
+
+def _parse_cursor(value):
+    """Split a ``<created_at>_<id>`` window cursor into its parts"""
+    created_at, _, pk = value.rpartition('_')
+    created_at = parse_datetime(created_at)
+    if created_at is None or not pk.isdigit():
+        return None
+    return created_at, int(pk)
+
+def _engagement_window(post, cursor=None):
+    """
+    Fetch one window of a post's engagements, newest first, with contacts
+    joined in the same query. Returns the window and the cursor of the next
+    (older) window, or None when this is the last one.
+    """
+    engagements = post.engagements.select_related('contact').order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = cursor
+        engagements = engagements.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+    # Fetch one extra row to learn whether an older window exists
+    window = list(engagements[:ENGAGEMENT_WINDOW_SIZE + 1])
+    next_cursor = None
+    if len(window) > ENGAGEMENT_WINDOW_SIZE:
+        window = window[:ENGAGEMENT_WINDOW_SIZE]
+        last = window[-1]
+        next_cursor = f'{last.created_at.isoformat()}_{last.id}'
+    return window, next_cursor
+
+@use_replica
 def view_engagements(request, post_id):
-    """View all engagements for a specific post"""
-    post = get_object_or_404(Post, id=post_id)
-    engagements = post.engagements.all().order_by('-created_at')
-    context = {'post': post, 'engagements': engagements}
+    """View the newest engagements for a specific post"""
+    posts = Post.objects.select_related('ad', 'fb_group').annotate(
+        engagement_total=Count('engagements') + F('archived_engagements')
+    )
+    post = get_object_or_404(posts, id=post_id)
+    engagements, next_cursor = _engagement_window(post)
+    context = {'post': post, 'engagements': engagements, 'next_cursor': next_cursor}
+    if post.archived_engagements and request.GET.get('archived'):
+        # Reads the archive files, so only on request
+        context['archived_engagements'] = [
+            dict(record, created_at=parse_datetime(record['created_at']))
+            for record in archived_records('engagement', post_id=post.id)
+        ]
     return render(request, 'engagement/view_engagements.html', context)
 
+@use_replica
+def post_history(request):
+    """Every post with its engagement count, archived posts included"""
+    history = full_post_history()
+    history.reverse()
+    context = {'history': history}
+    return render(request, 'engagement/post_history.html', context)
+
+@use_replica
+def engagement_window(request, post_id):
+    """Render an older window of a post's engagements as an HTML fragment"""
+    post = get_object_or_404(Post, id=post_id)
+    cursor = _parse_cursor(request.GET.get('before', ''))
+    if cursor is None:
+        return HttpResponseBadRequest('Invalid cursor')
+    engagements, next_cursor = _engagement_window(post, cursor)
+    context = {'post': post, 'engagements': engagements, 'next_cursor': next_cursor}
+    return render(request, 'engagement/_engagement_window.html', context)
+
 def add_engagement(request, post_id):
     """Add a new engagement for a post"""
     post = get_object_or_404(Post, id=post_id)
     if request.method == 'POST':
-        form = EngagementForm(request.POST)
+        form = EngagementForm(request.POST, instance=Engagement(post=post))
         if form.is_valid():
-            engagement = form.save(commit=False)
-            engagement.post = post
-            engagement.save()
-            return redirect('engagement:view_engagements', post_id=post_id)
+            try:
+                with transaction.atomic():
+                    form.save()
+            except IntegrityError:
+                # Recorded by another request since the form was checked
+                form.add_error('content', EngagementForm.DUPLICATE_ERROR)
+            else:
+                return redirect('engagement:view_engagements', post_id=post_id)
     else:
         form = EngagementForm()
     context = {'form': form, 'post': post}
     return render(request, 'engagement/add_engagement.html', context)
 
+def bulk_add_engagements(request, post_id):
+    """Add several engagements for a post in a single submit"""
+    post = get_object_or_404(Post, id=post_id)
+    if request.method == 'POST':
+        formset = EngagementFormSet(request.POST, queryset=Engagement.objects.none())
+        if formset.is_valid():
+            engagements = formset.save(commit=False)
+            for engagement in engagements:
+                engagement.post = post
+            with transaction.atomic():
+                # Rows already recorded are left to the content hash constraint
+                Engagement.objects.bulk_create(engagements, ignore_conflicts=True)
+                inserted = list(
+                    Engagement.objects.filter(sync_id__in=[engagement.sync_id for engagement in engagements])
+                    .select_related('post').order_by('id')
+                )
+                # bulk_create sends no post_save, so score the rows here
+                for engagement in inserted:
+                    score_engagement(engagement)
+            skipped = len(engagements) - len(inserted)
+            if skipped:
+                messages.warning(request, f'Skipped {skipped} comment(s) already recorded for this post.')
+            invalidate('dashboard')
+            return redirect('engagement:view_engagements', post_id=post_id)
+    else:
+        formset = EngagementFormSet(queryset=Engagement.objects.none())
+    context = {'formset': formset, 'post': post}
+    return render(request, 'engagement/bulk_add_engagements.html', context)
+
+@use_replica
 def contacts_list(request):
     """List all contacts ordered by last engagement"""
     contacts = Contact.objects.all()
     context = {'contacts': contacts}
     return render(request, 'engagement/contacts_list.html', context)
 
+@use_replica
+def top_contacts(request):
+    """Leaderboard of the highest scoring contacts"""
+    try:
+        limit = min(max(int(request.GET.get('n', TOP_CONTACTS_DEFAULT)), 1), TOP_CONTACTS_MAX)
+    except ValueError:
+        limit = TOP_CONTACTS_DEFAULT
+    # A range scan over the first rows of the score index
+    contacts = list(Contact.objects.filter(score__gt=0).order_by('-score')[:limit])
+    for contact in contacts:
+        contact.current_score = current_score(contact.score)
+    context = {'contacts': contacts, 'limit': limit}
+    return render(request, 'engagement/top_contacts.html', context)
+
 def create_contact(request):
     """Create a new contact"""
     if request.method == 'POST':
@@ -42,3 +165,8 @@ def create_contact(request):
         form = ContactForm()
     context = {'form': form}
     return render(request, 'engagement/create_contact.html', context)
+
+@use_replica
+def contact_search(request):
+    """Return contacts matching the query, for autocomplete pickers"""
+    return autocomplete_response(request, Contact.objects.all(), 'name')
@@ -0,0 +1,85 @@
+/**
+ * Autocomplete pickers
+ * Queries a JSON search endpoint as the user types and stores the
+ * chosen id in the hidden input named by data-autocomplete-target.
+ * Requests are debounced, and responses are remembered per page so
+ * retyping or deleting characters does not hit the server again.
+ */
+
+const AUTOCOMPLETE_DELAY_MS = 250;
+const autocompleteCache = new Map();
+
+function fetchAutocomplete(url) {
+    if (!autocompleteCache.has(url)) {
+        const request = fetch(url, {headers: {'Accept': 'application/json'}})
+            .then(response => response.json())
+            .catch(error => {
+                autocompleteCache.delete(url);
+                throw error;
+            });
+        autocompleteCache.set(url, request);
+    }
+    return autocompleteCache.get(url);
+}
+
+function initAutocomplete(input) {
+    if (input.dataset.autocompleteReady) {
+        return;
+    }
+    input.dataset.autocompleteReady = 'true';
+
+    const target = document.getElementById(input.dataset.autocompleteTarget);
+    const results = input.parentElement.querySelector('.autocomplete-results');
+    let timer = null;
+
+    function clearResults() {
+        results.innerHTML = '';
+    }
+
+    function showResults(term, data) {
+        // Ignore responses for a term the user has already typed past
+        if (input.value.trim() !== term) {
+            return;
+        }
+        clearResults();
+        data.results.forEach(function(item) {
+            const option = document.createElement('button');
+            option.type = 'button';
+            option.className = 'list-group-item list-group-item-action';
+            option.textContent = item.text;
+            option.addEventListener('click', function() {
+                target.value = item.id;
+                input.value = item.text;
+                clearResults();
+            });
+            results.appendChild(option);
+        });
+    }
+
+    input.addEventListener('input', function() {
+        const term = input.value.trim();
+        target.value = '';
+        clearTimeout(timer);
+        if (!term) {
+            clearResults();
+            return;
+        }
+        timer = setTimeout(function() {
+            const url = input.dataset.autocompleteUrl + '?q=' + encodeURIComponent(term.toLowerCase());
+            fetchAutocomplete(url).then(data => showResults(term, data));
+        }, AUTOCOMPLETE_DELAY_MS);
+    });
+
+    input.addEventListener('blur', function() {
+        // Delay so a click on a result registers before the list closes
+        setTimeout(clearResults, 200);
+    });
+}
+
+function initAutocompletes(root) {
+    root.querySelectorAll('.autocomplete-input').forEach(initAutocomplete);
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    initAutocompletes(document);
+});
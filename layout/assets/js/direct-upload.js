@@ -0,0 +1,116 @@
+/**
+ * Direct-to-S3 image uploads
+ * Asks the app to presign an upload, sends the file straight to the
+ * bucket (as one POST, or in parts for large files) and stores the
+ * resulting storage name in the hidden input named by
+ * data-upload-target. The form's submit buttons wait for the upload.
+ */
+
+function csrfToken(form) {
+    const input = form.querySelector('input[name="csrfmiddlewaretoken"]');
+    return input ? input.value : '';
+}
+
+function postForm(url, form, data) {
+    const body = new FormData();
+    Object.entries(data).forEach(([key, value]) => {
+        [].concat(value).forEach(item => body.append(key, item));
+    });
+    return fetch(url, {
+        method: 'POST',
+        headers: {'X-CSRFToken': csrfToken(form), 'Accept': 'application/json'},
+        body: body,
+    }).then(response => response.json().then(json => {
+        if (!response.ok) {
+            throw new Error(json.error || 'Upload failed');
+        }
+        return json;
+    }));
+}
+
+function uploadSingle(upload, file) {
+    const body = new FormData();
+    Object.entries(upload.fields).forEach(([key, value]) => body.append(key, value));
+    // S3 requires the file to be the last field
+    body.append('file', file);
+    return fetch(upload.url, {method: 'POST', body: body}).then(response => {
+        if (!response.ok) {
+            throw new Error('Upload failed');
+        }
+    });
+}
+
+function uploadParts(upload, file, onProgress) {
+    const etags = [];
+    let chain = Promise.resolve();
+    upload.parts.forEach((part, index) => {
+        chain = chain.then(() => {
+            const start = index * upload.part_size;
+            return fetch(part.url, {method: 'PUT', body: file.slice(start, start + upload.part_size)});
+        }).then(response => {
+            if (!response.ok) {
+                throw new Error('Upload failed');
+            }
+            etags.push(response.headers.get('ETag'));
+            onProgress((index + 1) / upload.parts.length);
+        });
+    });
+    return chain.then(() => etags);
+}
+
+function initDirectUpload(input) {
+    if (input.dataset.directUploadReady) {
+        return;
+    }
+    input.dataset.directUploadReady = 'true';
+    const form = input.form;
+    const target = document.getElementById(input.dataset.uploadTarget);
+    const wrapper = input.closest('.direct-upload-wrapper');
+    const progress = wrapper.querySelector('.progress');
+    const bar = wrapper.querySelector('.progress-bar');
+    const status = wrapper.querySelector('.direct-upload-status');
+    const buttons = form.querySelectorAll('button[type="submit"]');
+
+    function setProgress(fraction) {
+        bar.style.width = Math.round(fraction * 100) + '%';
+    }
+
+    input.addEventListener('change', function() {
+        const file = input.files[0];
+        target.value = '';
+        if (!file) {
+            return;
+        }
+        buttons.forEach(button => { button.disabled = true; });
+        progress.classList.remove('d-none');
+        setProgress(0);
+        status.textContent = 'Uploading…';
+
+        postForm(input.dataset.uploadUrl, form, {filename: file.name, content_type: file.type, size: file.size})
+            .then(upload => {
+                if (!upload.parts) {
+                    return uploadSingle(upload, file).then(() => upload.name);
+                }
+                return uploadParts(upload, file, setProgress)
+                    .then(etags => postForm(input.dataset.completeUrl, form, {name: upload.name, upload_id: upload.upload_id, etag: etags}))
+                    .then(() => upload.name);
+            })
+            .then(name => {
+                target.value = name;
+                setProgress(1);
+                status.textContent = 'Uploaded.';
+            })
+            .catch(error => {
+                input.value = '';
+                progress.classList.add('d-none');
+                status.textContent = error.message;
+            })
+            .finally(() => {
+                buttons.forEach(button => { button.disabled = false; });
+            });
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('.direct-upload-input').forEach(initDirectUpload);
+});
@@ -0,0 +1,21 @@
+/**
+ * Copy for Facebook
+ * Buttons with data-fb-copy-url fetch the ad text converted to Unicode
+ * styled characters and put it on the clipboard, ready to paste into a post.
+ */
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-fb-copy-url]').forEach(function(button) {
+        const label = button.textContent;
+        button.addEventListener('click', function(event) {
+            event.preventDefault();
+            fetch(button.dataset.fbCopyUrl, {headers: {'Accept': 'application/json'}})
+                .then(response => response.json())
+                .then(data => navigator.clipboard.writeText(data.text))
+                .then(function() {
+                    button.textContent = 'Copied!';
+                    setTimeout(function() { button.textContent = label; }, 1500);
+                });
+        });
+    });
+});
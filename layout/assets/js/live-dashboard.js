@@ -0,0 +1,59 @@
+/**
+ * Live dashboard
+ * Listens to the dashboard event stream and patches the post history table
+ * in place: engagement totals and last-updated times of known posts, and a
+ * new row for posts added elsewhere. Patches are re-applied whenever
+ * Simple-DataTables re-renders a page, sort or search.
+ */
+
+function escapeHtml(text) {
+    const element = document.createElement('span');
+    element.textContent = text;
+    return element.innerHTML;
+}
+
+function initLiveDashboard(table, dataTable) {
+    const known = new Map();
+
+    // Rows on other pages are not in the DOM; they are patched when shown
+    function applyPatch(post) {
+        const badge = table.querySelector('[data-post-total="' + post.id + '"]');
+        const updated = table.querySelector('[data-post-updated="' + post.id + '"]');
+        if (badge) {
+            badge.textContent = post.engagement_total;
+        }
+        if (updated) {
+            updated.textContent = post.last_updated;
+        }
+    }
+
+    function addRow(post) {
+        dataTable.insert({data: [[
+            escapeHtml(post.ad_name),
+            escapeHtml(post.fb_group_name),
+            escapeHtml(post.posted_at),
+            '<span data-post-updated="' + post.id + '">' + escapeHtml(post.last_updated) + '</span>',
+            '<span class="badge bg-info" data-post-total="' + post.id + '">' + post.engagement_total + '</span>',
+            '<a href="' + post.url + '" class="btn btn-sm btn-info">View Engagements</a>',
+        ]]});
+    }
+
+    const rendered = new Set(table.dataset.postIds.split(',').filter(Boolean).map(Number));
+    const source = new EventSource(table.dataset.eventsUrl);
+    source.addEventListener('post', function(event) {
+        const post = JSON.parse(event.data);
+        known.set(post.id, post);
+        if (rendered.has(post.id)) {
+            applyPatch(post);
+        } else {
+            rendered.add(post.id);
+            addRow(post);
+        }
+    });
+
+    ['datatable.page', 'datatable.sort', 'datatable.search', 'datatable.update'].forEach(function(name) {
+        dataTable.on(name, function() {
+            known.forEach(applyPatch);
+        });
+    });
+}
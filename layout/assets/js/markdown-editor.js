@@ -4,6 +4,21 @@
  * Stores content as markdown, which is Facebook-compatible
  */
 
+/**
+ * Wrap the selection in a marker, or insert an empty pair at the cursor.
+ * Used for the Facebook-only styles EasyMDE has no built-in action for.
+ */
+function wrapSelection(editor, marker) {
+    const cm = editor.codemirror;
+    const selection = cm.getSelection();
+    cm.replaceSelection(marker + selection + marker);
+    if (!selection) {
+        const cursor = cm.getCursor();
+        cm.setCursor(cursor.line, cursor.ch - marker.length);
+    }
+    cm.focus();
+}
+
 document.addEventListener('DOMContentLoaded', function() {
     // Find all markdown editor textareas
     const editors = document.querySelectorAll('.markdown-editor-input');
@@ -33,6 +48,18 @@ document.addEventListener('DOMContentLoaded', function() {
                     className: "fa fa-strikethrough",
                     title: "Strikethrough (~text~)",
                 },
+                {
+                    name: "cursive",
+                    action: editor => wrapSelection(editor, "^^"),
+                    className: "fa fa-signature",
+                    title: "Cursive (^^text^^)",
+                },
+                {
+                    name: "double-struck",
+                    action: editor => wrapSelection(editor, "||"),
+                    className: "fa fa-font",
+                    title: "Double Struck (||text||)",
+                },
                 "|",
                 {
                     name: "quote",
@@ -0,0 +1,10 @@
+from django.contrib.staticfiles.apps import StaticFilesConfig
+
+
+class AssetsConfig(StaticFilesConfig):
+    # Template demo scripts and the archived Lexical build are not shipped
+    ignore_patterns = StaticFilesConfig.ignore_patterns + [
+        'demo/*',
+        'lexical/*',
+        'js/datatables-simple-demo.js',
+    ]
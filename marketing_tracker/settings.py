@@ -48,19 +48,23 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    'marketing_tracker.apps.AssetsConfig',  # django.contrib.staticfiles
 
     "core",
     "posts",
     "engagement",
+    "analytics",
+    "sync",
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -88,13 +92,33 @@ WSGI_APPLICATION = 'marketing_tracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuning for the laptop deployment, applied to every new connection.
+# WAL lets readers carry on while a write commits, and IMMEDIATE transactions
+# take the write lock up front so concurrent writers wait on busy_timeout
+# instead of failing with "database is locked" halfway through.
+# Compare against the stock pragmas with `manage.py bench_sqlite`.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': env.int('SQLITE_MMAP_SIZE', default=128 * 1024 * 1024),
+    'cache_size': env.int('SQLITE_CACHE_SIZE', default=-32000),  # negative = KiB
+    'busy_timeout': env.int('SQLITE_BUSY_TIMEOUT', default=20000),  # ms
+    'temp_store': 'MEMORY',
+}
+
+SQLITE_DATABASE = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'db.sqlite3',
+    'OPTIONS': {
+        'init_command': ''.join(f'PRAGMA {name}={value};' for name, value in SQLITE_PRAGMAS.items()),
+        'transaction_mode': 'IMMEDIATE',
+    },
+}
+
 if ENVIRONMENT == 'DEV':
     # Local development with SQLite
     DATABASES = {
-        'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
-        }
+        'default': SQLITE_DATABASE,
     }
 elif ENVIRONMENT == 'AWS':
     # AWS production with PostgreSQL (RDS) or other database
@@ -109,24 +133,157 @@ elif ENVIRONMENT == 'AWS':
                 conn_health_checks=True,
             )
         }
+        if env.bool('DB_POOL', default=True):
+            # psycopg 3 connection pool, one per worker process. It caps the
+            # connections each worker can open, so size DB_POOL_MAX_SIZE x
+            # gunicorn workers below the RDS max_connections limit.
+            # Persistent connections are handled by the pool instead.
+            DATABASES['default'].update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)
+            DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+                'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+                'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+                'timeout': env.float('DB_POOL_TIMEOUT', default=10.0),  # checkout wait, seconds
+                'max_idle': env.float('DB_POOL_MAX_IDLE', default=300.0),  # reap idle, seconds
+                'max_lifetime': env.float('DB_POOL_MAX_LIFETIME', default=3600.0),
+            }
     else:
         # Fallback to SQLite if DATABASE_URL not provided (not recommended for production)
         DATABASES = {
-            'default': {
-                'ENGINE': 'django.db.backends.sqlite3',
-                'NAME': BASE_DIR / 'db.sqlite3',
-            }
+            'default': SQLITE_DATABASE,
         }
 else:
     # Unknown environment - default to SQLite
     DATABASES = {
-        'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
-        }
+        'default': SQLITE_DATABASE,
     }
 
 
+# Read replicas, as comma-separated database URLs. Views decorated with
+# core.routers.use_replica read from a healthy replica; writes, and reads made
+# after a write, go to the primary.
+DATABASE_REPLICAS = []
+for index, replica_url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[]), start=1):
+    import dj_database_url
+    alias = f'replica_{index}'
+    DATABASES[alias] = dj_database_url.parse(replica_url)
+    if 'pool' in DATABASES['default'].get('OPTIONS', {}):
+        DATABASES[alias].setdefault('OPTIONS', {})['pool'] = DATABASES['default']['OPTIONS']['pool']
+        DATABASES[alias].update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = env.int('DATABASE_REPLICA_PIN_SECONDS', default=5)
+DATABASE_REPLICA_HEALTH_TTL = env.int('DATABASE_REPLICA_HEALTH_TTL', default=30)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# locmem is private to each process; choose 'file' or 'redis' so gunicorn
+# workers share cached dashboard and list results (see core.cache). Only
+# redis makes the stampede lock and version bumps atomic across workers:
+# the file backend's add and incr read then write the file, so two workers
+# may both take a lock or bump a namespace once between them.
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'marketing-tracker',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env('CACHE_LOCATION', default=str(BASE_DIR / '.cache')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': env('REDIS_URL', default='redis://127.0.0.1:6379/0'),
+    },
+}
+CACHES = {
+    'default': {
+        **CACHE_BACKENDS[env('CACHE_BACKEND', default='locmem')],
+        'TIMEOUT': env.int('CACHE_TIMEOUT', default=300),
+        'KEY_PREFIX': 'marketing_tracker',
+    },
+}
+# Default lifetime of core.cache.cached_query results, in seconds
+CACHE_QUERY_TTL = env.int('CACHE_QUERY_TTL', default=60)
+# Lifetime of the dashboard and analytics results the scheduler warms; their
+# namespaces are invalidated on every write they show
+CACHE_WARM_TTL = env.int('CACHE_WARM_TTL', default=12 * 60 * 60)
+
+# Live dashboard stream (core:dashboard_events). Each open dashboard checks
+# the dashboard cache version every POLL seconds and reconnects after
+# MAX_AGE seconds, so ASGI workers can be recycled.
+DASHBOARD_EVENTS_POLL = env.float('DASHBOARD_EVENTS_POLL', default=2.0)
+DASHBOARD_EVENTS_HEARTBEAT = env.float('DASHBOARD_EVENTS_HEARTBEAT', default=15.0)
+DASHBOARD_EVENTS_MAX_AGE = env.float('DASHBOARD_EVENTS_MAX_AGE', default=300.0)
+DASHBOARD_EVENTS_RETRY_MS = env.int('DASHBOARD_EVENTS_RETRY_MS', default=3000)
+
+
+# Two-way sync between deployments (sync app). This side calls itself
+# SYNC_NAME; peers call its sync/changes/ endpoint with SYNC_TOKEN, and
+# `manage.py sync <peer>` exchanges changes with an entry of SYNC_PEERS.
+SYNC_NAME = env('SYNC_NAME', default=ENVIRONMENT.lower())
+SYNC_TOKEN = env('SYNC_TOKEN', default='')
+SYNC_PEERS = {}
+if env('SYNC_PEER_URL', default=None):
+    SYNC_PEERS[env('SYNC_PEER_NAME', default='aws')] = {
+        'url': env('SYNC_PEER_URL'),  # e.g. https://example.com/sync/changes/
+        'token': SYNC_TOKEN,
+    }
+SYNC_BATCH_SIZE = env.int('SYNC_BATCH_SIZE', default=1000)
+
+# Change feed (core.changes), read in commit order. Consumers map a name to
+# a handler taking a list of ChangeLog entries; run them with
+# `manage.py consume_changes`, or let the scheduler run them every minute
+# (the 'changes.consume' job below). Entries every consumer and sync peer
+# has read are pruned daily ('changes.prune').
+CHANGE_FEED_CONSUMERS = {
+    'analytics.velocity': 'analytics.rollups.consume_velocity_changes',
+    'posts.images': 'posts.uploads.process_pending_images',
+}
+
+# Scheduled jobs (core.scheduler), run by `manage.py scheduler` as a worker,
+# or every minute from cron with --once. Schedules are cron expressions in
+# TIME_ZONE: the rollups, today's set and the dashboard and analytics caches
+# are computed shortly before the posting window opens at 9:00. Warming only
+# helps the web workers with a shared CACHE_BACKEND ('file' or 'redis').
+# Contact scores are rebuilt nightly, dropping engagements deleted, merged
+# or archived since. Slots missed by up to SCHEDULER_CATCH_UP_MINUTES still run; run history
+# is kept for SCHEDULER_HISTORY_DAYS.
+SCHEDULED_JOBS = {
+    'analytics.rollups': {'schedule': '30 8 * * *', 'task': 'analytics.rollups.refresh_rollups'},
+    'dashboard.schedule': {'schedule': '45 8 * * mon-sat', 'task': 'core.dashboard.precompute_schedule'},
+    'dashboard.warm': {'schedule': '45 8 * * *', 'task': 'core.dashboard.warm_dashboard'},
+    'analytics.warm': {'schedule': '45 8 * * *', 'task': 'analytics.rollups.warm_velocity_report'},
+    'scheduler.prune': {'schedule': '15 3 * * *', 'task': 'core.scheduler.prune_job_runs'},
+    'contacts.rescore': {'schedule': '0 3 * * *', 'task': 'engagement.scoring.recompute_scores'},
+    'changes.consume': {'schedule': '* * * * *', 'task': 'core.changes.consume_all'},
+    'changes.prune': {'schedule': '30 3 * * *', 'task': 'core.changes.prune_change_log'},
+}
+SCHEDULER_CATCH_UP_MINUTES = env.int('SCHEDULER_CATCH_UP_MINUTES', default=60)
+SCHEDULER_HISTORY_DAYS = env.int('SCHEDULER_HISTORY_DAYS', default=30)
+
+# Direct-to-S3 ad image uploads (posts.uploads). The browser sends images
+# straight to the default storage's bucket through presigned requests, in
+# parts of DIRECT_UPLOAD_PART_SIZE when larger, and create_ad only receives
+# the object's name; the 'posts.images' consumer then checks the image.
+# The bucket's CORS rules must allow POST and PUT from the site and expose
+# the ETag header.
+DIRECT_UPLOADS_ENABLED = env.bool('DIRECT_UPLOADS_ENABLED', default=ENVIRONMENT == 'AWS')
+DIRECT_UPLOAD_MAX_SIZE = env.int('DIRECT_UPLOAD_MAX_SIZE', default=50 * 1024 * 1024)
+DIRECT_UPLOAD_PART_SIZE = env.int('DIRECT_UPLOAD_PART_SIZE', default=8 * 1024 * 1024)
+DIRECT_UPLOAD_EXPIRES = env.int('DIRECT_UPLOAD_EXPIRES', default=900)
+
+# Request profiling (core.profiling). Staff add ?profile=1 to a URL, or send
+# an X-Profile: 1 header, to store a call tree and SQL list for that request
+# under PROFILING_DIR; view them at /admin/profiles/. Only the newest
+# PROFILING_MAX_ENTRIES are kept.
+PROFILING_ENABLED = env.bool('PROFILING_ENABLED', default=True)
+PROFILING_DIR = env('PROFILING_DIR', default=str(BASE_DIR / '.profiles'))
+PROFILING_MAX_ENTRIES = env.int('PROFILING_MAX_ENTRIES', default=50)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -166,6 +323,16 @@ USE_TZ = True
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Engagements older than this many days are moved to cold storage by
+# `manage.py archive_engagements`
+ARCHIVE_RETENTION_DAYS = env.int('ARCHIVE_RETENTION_DAYS', default=365)
+
+# Contact scoring (engagement.scoring). Changing these takes effect for
+# existing scores after `manage.py recompute_contact_scores`.
+CONTACT_SCORE_HALF_LIFE_DAYS = env.float('CONTACT_SCORE_HALF_LIFE_DAYS', default=30.0)
+CONTACT_SCORE_NEW_POST_BONUS = env.float('CONTACT_SCORE_NEW_POST_BONUS', default=1.0)
+CONTACT_SCORE_NEW_GROUP_BONUS = env.float('CONTACT_SCORE_NEW_GROUP_BONUS', default=2.0)
+
 
 # ============================================================================
 # ENVIRONMENT-SPECIFIC CONFIGURATION
@@ -185,6 +352,17 @@ if ENVIRONMENT == 'DEV':
     MEDIA_URL = 'media/'
     MEDIA_ROOT = BASE_DIR / 'media'
 
+    # Content-hashed static file names; run `manage.py build_assets` and
+    # `manage.py collectstatic` to produce the bundles and the manifest
+    STORAGES = {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'core.storage.LenientManifestStaticFilesStorage',
+        },
+    }
+
 elif ENVIRONMENT == 'AWS':
     # ========================================================================
     # AWS ENVIRONMENT (EC2, ECS, Lambda, or Elastic Beanstalk)
@@ -205,6 +383,9 @@ elif ENVIRONMENT == 'AWS':
     AWS_ACCESS_KEY_ID = env('AWS_ACCESS_KEY_ID', default=None)
     AWS_SECRET_ACCESS_KEY = env('AWS_SECRET_ACCESS_KEY', default=None)
 
+    # S3-compatible stand-in for local testing (e.g. MinIO or moto_server)
+    AWS_S3_ENDPOINT_URL = env('AWS_S3_ENDPOINT_URL', default=None)
+
     # Use AWS S3 for static files
     STATIC_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/static/'
     STATIC_ROOT = BASE_DIR / 'staticfiles'  # For collectstatic
@@ -224,17 +405,21 @@ elif ENVIRONMENT == 'AWS':
                 'region_name': AWS_S3_REGION_NAME,
                 'custom_domain': AWS_S3_CUSTOM_DOMAIN,
                 'object_parameters': AWS_S3_OBJECT_PARAMETERS,
+                'endpoint_url': AWS_S3_ENDPOINT_URL,
                 'location': 'media',
                 'file_overwrite': False,
             },
         },
         'staticfiles': {
-            'BACKEND': 'storages.backends.s3boto3.S3StaticStorage',
+            # Content-hashed names, so browsers can cache them for a year
+            'BACKEND': 'storages.backends.s3boto3.S3ManifestStaticStorage',
             'OPTIONS': {
                 'bucket_name': AWS_STORAGE_BUCKET_NAME,
                 'region_name': AWS_S3_REGION_NAME,
                 'custom_domain': AWS_S3_CUSTOM_DOMAIN,
-                'object_parameters': AWS_S3_OBJECT_PARAMETERS,
+                'object_parameters': {
+                    'CacheControl': 'public, max-age=31536000, immutable',
+                },
                 'location': 'static',
             },
         },
@@ -251,3 +436,12 @@ else:
 
     MEDIA_URL = 'media/'
     MEDIA_ROOT = BASE_DIR / 'media'
+
+    STORAGES = {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'core.storage.LenientManifestStaticFilesStorage',
+        },
+    }
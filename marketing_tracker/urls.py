@@ -18,12 +18,16 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from core.urls import profile_urlpatterns
 
 urlpatterns = [
+    path('admin/profiles/', include(profile_urlpatterns)),
     path('admin/', admin.site.urls),
     path('', include('core.urls')),
     path('posts/', include('posts.urls')),
     path('engagement/', include('engagement.urls')),
+    path('analytics/', include('analytics.urls')),
+    path('sync/', include('sync.urls')),
 ]
 
 # Serve media files in development
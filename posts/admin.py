@@ -1,4 +1,7 @@
 from django.contrib import admin
+from django.db.models import F, OuterRef
+from core.expressions import SubqueryCount
+from engagement.models import Engagement
 from .models import Post, Ad
 
 @admin.register(Ad)
@@ -7,6 +10,7 @@ class AdAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
     search_fields = ('name', 'text')
     readonly_fields = ('created_at',)
+    show_full_result_count = False
     fieldsets = (
         ('Ad Information', {
             'fields': ('name', 'text')
@@ -20,16 +24,24 @@ class AdAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.annotate(post_total=SubqueryCount(Post.objects.filter(ad=OuterRef('pk'))))
+
     def post_count(self, obj):
-        return obj.posts.count()
+        return obj.post_total
     post_count.short_description = 'Number of Posts'
+    post_count.admin_order_field = 'post_total'
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
     list_display = ('ad', 'fb_group', 'posted_at', 'last_updated', 'engagement_count')
-    list_filter = ('posted_at', 'fb_group', 'ad')
+    list_filter = ('posted_at', 'fb_group')
+    list_select_related = ('ad', 'fb_group')
     search_fields = ('ad__name', 'fb_group__name')
+    autocomplete_fields = ('ad', 'fb_group')
     readonly_fields = ('last_updated', 'engagement_count')
+    show_full_result_count = False
     fieldsets = (
         ('Post Information', {
             'fields': ('ad', 'fb_group', 'post_url')
@@ -44,6 +56,15 @@ class PostAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # __str__ reads the ad and group names, so join them everywhere
+        # (changelist, autocomplete results and change forms)
+        queryset = super().get_queryset(request).select_related('ad', 'fb_group')
+        return queryset.annotate(
+            engagement_total=SubqueryCount(Engagement.objects.filter(post=OuterRef('pk'))) + F('archived_engagements')
+        )
+
     def engagement_count(self, obj):
-        return obj.engagements.count()
+        return obj.engagement_total
     engagement_count.short_description = 'Total Engagements'
+    engagement_count.admin_order_field = 'engagement_total'
@@ -1,6 +1,9 @@
 from django import forms
 from .models import Ad, Post
-from .widgets import MarkdownRichTextWidget
+from .permalinks import post_url_key
+from .uploads import verify_upload
+from .widgets import DirectUploadImageInput, MarkdownRichTextWidget
+from core.widgets import AutocompleteSelect
 
 class AdForm(forms.ModelForm):
     class Meta:
@@ -12,13 +15,46 @@ class AdForm(forms.ModelForm):
             'image': forms.FileInput(attrs={'class': 'form-control', 'accept': 'image/*'}),
         }
 
+class DirectUploadAdForm(AdForm):
+    """
+    AdForm for direct-to-storage uploads: the image arrives as the storage
+    name of an upload (see posts.uploads) and is processed after saving.
+    """
+    image = forms.CharField(
+        required=False,
+        widget=DirectUploadImageInput('posts:ad_image_upload', 'posts:ad_image_upload_complete'),
+    )
+
+    class Meta(AdForm.Meta):
+        fields = ['name', 'text']
+
+    def clean_image(self):
+        name = self.cleaned_data['image']
+        if name:
+            verify_upload(name)
+        return name
+
+    def save(self, commit=True):
+        ad = super().save(commit=False)
+        if self.cleaned_data['image']:
+            ad.image = self.cleaned_data['image']
+            ad.image_pending = True
+        if commit:
+            ad.save()
+        return ad
+
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ['ad', 'post_url', 'posted_at']
         widgets = {
-            'ad': forms.Select(attrs={'class': 'form-control'}),
+            'ad': AutocompleteSelect('posts:ad_search', placeholder='Start typing an ad name'),
             'post_url': forms.URLInput(attrs={'class': 'form-control', 'placeholder': 'Post URL'}),
             'posted_at': forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
         }
 
+    def clean_post_url(self):
+        url = self.cleaned_data['post_url']
+        if Post.objects.filter(post_url_key=post_url_key(url)).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError('This post is already logged.')
+        return url
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:46
+
+from django.db import migrations, models
+
+
+def create_trigram_index(apps, schema_editor):
+    # pg_trgm only exists on PostgreSQL; other databases fall back to LIKE scans
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS posts_ad_name_trgm '
+        'ON posts_ad USING gin (UPPER(name::text) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS posts_ad_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_alter_ad_image'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ad',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_ad_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='archived_engagements',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_post_archived_engagements'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='last_updated',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
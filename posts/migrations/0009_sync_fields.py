@@ -0,0 +1,51 @@
+import uuid
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def assign_sync_ids(apps, schema_editor):
+    for name in ['Ad', 'Post']:
+        model = apps.get_model('posts', name)
+        rows = list(model.objects.only('id'))
+        for row in rows:
+            row.sync_id = uuid.uuid4()
+        model.objects.bulk_update(rows, ['sync_id'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_alter_post_last_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='last_updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        # Unique ids for existing rows: add nullable, fill, then constrain
+        migrations.AddField(
+            model_name='ad',
+            name='sync_id',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='sync_id',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(assign_sync_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ad',
+            name='sync_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='sync_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_sync_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='image_pending',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
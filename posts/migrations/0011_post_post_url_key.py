@@ -0,0 +1,153 @@
+import hashlib
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# A frozen copy of posts.permalinks.post_url_key as of this migration, so
+# later changes to the runtime function cannot change what it computes
+FACEBOOK_HOSTS = {'facebook.com', 'fb.com'}
+HOST_PREFIXES = ('www.', 'm.', 'mbasic.', 'web.', 'touch.')
+_POST_ID = r'(\d+|pfbid[0-9A-Za-z]+)'
+_POST_PATH_RES = [
+    re.compile(rf'^/groups/[^/]+/(?:posts|permalink)/{_POST_ID}$'),
+    re.compile(rf'^/[^/]+/posts/{_POST_ID}$'),
+]
+_POST_ID_RE = re.compile(rf'^{_POST_ID}$')
+_POST_PARAMS = {
+    '/permalink.php': 'story_fbid',
+    '/story.php': 'story_fbid',
+    '/groups': 'multi_permalinks',
+}
+TRACKING_PARAMS = {
+    'fbclid', '__tn__', 'comment_id', 'reply_comment_id', 'notif_id', 'notif_t',
+    'ref', 'mibextid', 'rdid', 'sfnsn', 'paipv', 'eav',
+}
+TRACKING_PREFIXES = ('__cft__', 'utm_')
+
+
+def post_url_key(url):
+    parts = urlsplit(url.strip())
+    host = parts.netloc.rsplit('@', 1)[-1].split(':', 1)[0].lower().rstrip('.')
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    path = re.sub(r'/{2,}', '/', parts.path).rstrip('/') or '/'
+    params = [
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name not in TRACKING_PARAMS and not name.startswith(TRACKING_PREFIXES)
+    ]
+
+    if host in FACEBOOK_HOSTS:
+        for pattern in _POST_PATH_RES:
+            match = pattern.match(path)
+            if match:
+                return f'fb:{match.group(1)}'
+        name = _POST_PARAMS.get('/groups' if path.startswith('/groups/') else path)
+        value = dict(params).get(name, '') if name else ''
+        if _POST_ID_RE.match(value):
+            return f'fb:{value}'
+
+    key = f'url:{host}{path}'
+    if params:
+        key += '?' + urlencode(sorted(params))
+    if len(key) > 255:
+        key = 'url#' + hashlib.sha256(key.encode()).hexdigest()
+    return key
+
+
+def assign_post_url_keys(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    batch = []
+    for row in Post.objects.only('id', 'post_url').iterator(chunk_size=5000):
+        row.post_url_key = post_url_key(row.post_url)
+        batch.append(row)
+        if len(batch) == 5000:
+            Post.objects.bulk_update(batch, ['post_url_key'])
+            batch = []
+    Post.objects.bulk_update(batch, ['post_url_key'])
+
+
+def merge_duplicate_posts(apps, schema_editor):
+    # The post of a key with the lowest sync_id keeps the others'
+    # engagements, except those it already has: every deployment picks the
+    # same one, so synced copies merge alike. Merges are logged as changes,
+    # and the sync_ids merged away become aliases of the rows they went
+    # into, so a peer's rows under them still apply here.
+    # `refresh_analytics --full` and `recompute_contact_scores` rebuild
+    # what depends on the merged posts.
+    Post = apps.get_model('posts', 'Post')
+    Engagement = apps.get_model('engagement', 'Engagement')
+    ChangeLog = apps.get_model('core', 'ChangeLog')
+    SyncAlias = apps.get_model('sync', 'SyncAlias')
+    now = timezone.now()
+    keepers = {}
+    rows = Post.objects.values_list('id', 'sync_id', 'post_url_key', 'archived_engagements')
+    for pk, sync_id, key, archived in sorted(rows, key=lambda row: str(row[1])):
+        if key not in keepers:
+            keepers[key] = {'id': pk, 'sync_id': sync_id, 'archived': archived, 'duplicates': []}
+        else:
+            keepers[key]['archived'] += archived
+            keepers[key]['duplicates'].append((pk, sync_id))
+
+    for keeper in keepers.values():
+        if not keeper['duplicates']:
+            continue
+        duplicate_ids = [pk for pk, _ in keeper['duplicates']]
+        seen = dict(
+            ((contact_id, digest), sync_id) for contact_id, digest, sync_id
+            in Engagement.objects.filter(post_id=keeper['id']).values_list('contact_id', 'content_hash', 'sync_id')
+        )
+        moved, dropped, aliases = [], [], []
+        for pk, sync_id, contact_id, digest in Engagement.objects.filter(
+            post_id__in=duplicate_ids,
+        ).order_by('id').values_list('id', 'sync_id', 'contact_id', 'content_hash'):
+            if (contact_id, digest) in seen:
+                dropped.append((pk, sync_id))
+                aliases.append(SyncAlias(model='engagement.Engagement', sync_id=sync_id, local_sync_id=seen[contact_id, digest]))
+            else:
+                seen[contact_id, digest] = sync_id
+                moved.append((pk, sync_id))
+        aliases += [
+            SyncAlias(model='posts.Post', sync_id=sync_id, local_sync_id=keeper['sync_id'])
+            for _, sync_id in keeper['duplicates']
+        ]
+
+        Engagement.objects.filter(pk__in=[pk for pk, _ in dropped]).delete()
+        Engagement.objects.filter(pk__in=[pk for pk, _ in moved]).update(post_id=keeper['id'], last_updated=now)
+        Post.objects.filter(pk=keeper['id']).update(archived_engagements=keeper['archived'], last_updated=now)
+        Post.objects.filter(pk__in=duplicate_ids).delete()
+        SyncAlias.objects.bulk_create(aliases, ignore_conflicts=True)
+        ChangeLog.objects.bulk_create([
+            *(ChangeLog(model='engagement.Engagement', object_id=pk, sync_id=sync_id, action='delete') for pk, sync_id in dropped),
+            *(ChangeLog(model='engagement.Engagement', object_id=pk, sync_id=sync_id, action='save') for pk, sync_id in moved),
+            ChangeLog(model='posts.Post', object_id=keeper['id'], sync_id=keeper['sync_id'], action='save'),
+            *(ChangeLog(model='posts.Post', object_id=pk, sync_id=sync_id, action='delete') for pk, sync_id in keeper['duplicates']),
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_ad_image_pending'),
+        ('engagement', '0012_engagement_unique_content'),
+        ('core', '0003_changelog_feed'),
+        ('sync', '0002_syncalias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='post_url_key',
+            field=models.CharField(editable=False, max_length=255, null=True),
+        ),
+        migrations.RunPython(assign_post_url_keys, migrations.RunPython.noop),
+        migrations.RunPython(merge_duplicate_posts, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='post',
+            name='post_url_key',
+            field=models.CharField(editable=False, max_length=255, unique=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+
+def create_prefix_index(apps, schema_editor):
+    # See engagement 0013: istartswith needs a NOCASE index on SQLite and
+    # an UPPER(name) text_pattern_ops one on PostgreSQL
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS posts_ad_name_prefix '
+            'ON posts_ad (name COLLATE NOCASE)'
+        )
+    elif schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS posts_ad_name_prefix '
+            'ON posts_ad (UPPER(name::text) text_pattern_ops)'
+        )
+
+
+def drop_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP INDEX IF EXISTS posts_ad_name_prefix')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_post_url_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ad',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
@@ -1,11 +1,20 @@
+import uuid
+
 from django.db import models
+from core.changes import TrackedModel
+from core.fields import ImageField
 from core.models import FBGroup
+from .permalinks import post_url_key
 
-class Ad(models.Model):
+class Ad(TrackedModel):
     name = models.CharField(max_length=100)
     text = models.TextField()
-    image = models.ImageField(upload_to='ads/', blank=True, null=True)
+    image = ImageField(upload_to='ads/', blank=True, null=True)
+    # Uploaded straight to storage and not yet checked, see posts.uploads
+    image_pending = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    sync_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -13,15 +22,23 @@ class Ad(models.Model):
     class Meta:
         ordering = ['-created_at']
     
-class Post(models.Model):
+class Post(TrackedModel):
+    # Above the fields: the post_url_key field hides the function of that name
+    DERIVED_FIELDS = {'post_url_key': ('post_url', post_url_key)}
+
     ad = models.ForeignKey(Ad, related_name='posts', on_delete=models.CASCADE)
     fb_group = models.ForeignKey(FBGroup, on_delete=models.CASCADE)
     post_url = models.URLField()
+    # One key per post whichever of its URLs was logged, see posts.permalinks
+    post_url_key = models.CharField(max_length=255, unique=True, editable=False)
     posted_at = models.DateTimeField()
-    last_updated = models.DateTimeField(auto_now=True)
+    last_updated = models.DateTimeField(auto_now=True, db_index=True)
+    sync_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    # Engagements moved to cold storage by the archive_engagements command
+    archived_engagements = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.ad.name} in {self.fb_group.name}"
 
     def engagement_count(self):
-        return self.engagements.count()
+        return self.engagements.count() + self.archived_engagements
@@ -0,0 +1,126 @@
+"""
+Canonical keys of post URLs.
+
+The same Facebook post is reachable under many URLs: the group permalink,
+``/groups/<group>/posts/<id>``, ``permalink.php?story_fbid=<id>``, the
+mobile and mbasic hosts, and any of these with tracking parameters
+(``fbclid``, ``__cft__[0]``, ``mibextid`` ...) appended by the share
+button. ``post_url_key`` reduces a URL to one key per post:
+
+- ``fb:<id>`` when a Facebook URL names its post id
+- otherwise ``url:<host><path>?<query>``, lowercased host, no ``www.``,
+  fragment, trailing slash or tracking parameters, the rest of the query
+  sorted
+
+``Post.post_url_key`` keeps the key under a unique index, so a post can
+only be logged once and ``find_posts`` looks URLs up by index, in batches.
+"""
+
+import hashlib
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Longest key stored as is; longer ones are hashed
+MAX_KEY_LENGTH = 255
+
+# Lookups per query in find_posts
+LOOKUP_BATCH_SIZE = 500
+
+# Hosts of Facebook, after the subdomains below are removed
+FACEBOOK_HOSTS = {'facebook.com', 'fb.com'}
+HOST_PREFIXES = ('www.', 'm.', 'mbasic.', 'web.', 'touch.')
+
+# A post id: numeric, or the opaque pfbid form (case-sensitive)
+_POST_ID = r'(\d+|pfbid[0-9A-Za-z]+)'
+_POST_PATH_RES = [
+    # /groups/<group>/posts/<id>, /groups/<group>/permalink/<id>
+    re.compile(rf'^/groups/[^/]+/(?:posts|permalink)/{_POST_ID}$'),
+    # /<page>/posts/<id>
+    re.compile(rf'^/[^/]+/posts/{_POST_ID}$'),
+]
+_POST_ID_RE = re.compile(rf'^{_POST_ID}$')
+# Query parameters naming the post, by path
+_POST_PARAMS = {
+    '/permalink.php': 'story_fbid',
+    '/story.php': 'story_fbid',
+    '/groups': 'multi_permalinks',
+}
+
+# Query parameters that never change which post a URL shows
+TRACKING_PARAMS = {
+    'fbclid', '__tn__', 'comment_id', 'reply_comment_id', 'notif_id', 'notif_t',
+    'ref', 'mibextid', 'rdid', 'sfnsn', 'paipv', 'eav',
+}
+TRACKING_PREFIXES = ('__cft__', 'utm_')
+
+
+def _host(netloc):
+    host = netloc.rsplit('@', 1)[-1].split(':', 1)[0].lower().rstrip('.')
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            return host[len(prefix):]
+    return host
+
+
+def _facebook_post_id(path, params):
+    for pattern in _POST_PATH_RES:
+        match = pattern.match(path)
+        if match:
+            return match.group(1)
+    name = _POST_PARAMS.get('/groups' if path.startswith('/groups/') else path)
+    value = params.get(name, '') if name else ''
+    return value if _POST_ID_RE.match(value) else None
+
+
+def post_url_key(url):
+    """
+    Canonical key of a post URL; URLs of the same post share it.
+
+    Args:
+        url (str): Post URL as pasted
+
+    Returns:
+        str: 'fb:<post id>' for Facebook URLs naming their post, else the
+        normalized URL as 'url:<host><path>?<query>'; keys above
+        MAX_KEY_LENGTH are replaced by a hash
+    """
+    parts = urlsplit(url.strip())
+    host = _host(parts.netloc)
+    path = re.sub(r'/{2,}', '/', parts.path).rstrip('/') or '/'
+    params = [
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name not in TRACKING_PARAMS and not name.startswith(TRACKING_PREFIXES)
+    ]
+
+    if host in FACEBOOK_HOSTS:
+        post_id = _facebook_post_id(path, dict(params))
+        if post_id:
+            return f'fb:{post_id}'
+
+    key = f'url:{host}{path}'
+    if params:
+        key += '?' + urlencode(sorted(params))
+    if len(key) > MAX_KEY_LENGTH:
+        key = 'url#' + hashlib.sha256(key.encode()).hexdigest()
+    return key
+
+
+def find_posts(urls, batch_size=LOOKUP_BATCH_SIZE):
+    """
+    Posts logged under any URL of the same post, by unique index.
+
+    Args:
+        urls: Post URLs, e.g. from an import file
+        batch_size (int): Keys looked up per query
+
+    Returns:
+        dict: URL -> Post, for the URLs whose post is logged
+    """
+    from .models import Post
+
+    keys = {url: post_url_key(url) for url in urls}
+    unique = list(set(keys.values()))
+    found = {}
+    for start in range(0, len(unique), batch_size):
+        found.update(Post.objects.in_bulk(unique[start:start + batch_size], field_name='post_url_key'))
+    return {url: found[key] for url, key in keys.items() if key in found}
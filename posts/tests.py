@@ -1,8 +1,24 @@
-from django.test import TestCase, Client
+import io
+import tempfile
+import uuid
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from .models import Ad, Post
-from core.models import FBGroup
+from .permalinks import find_posts, post_url_key
+from .uploads import process_pending_images
+from core.models import ChangeLog, FBGroup
+from engagement.models import Contact, Engagement, content_hash
+from sync.models import SyncAlias
 
 class AdModelTest(TestCase):
     def setUp(self):
@@ -52,6 +68,60 @@ class PostModelTest(TestCase):
     def test_post_last_updated(self):
         self.assertIsNotNone(self.post.last_updated)
 
+class PostUrlKeyTest(TestCase):
+    def setUp(self):
+        self.group = FBGroup.objects.create(name='Group', group_url='https://facebook.com/groups/test', group_set='A')
+        self.ad = Ad.objects.create(name='Ad', text='Text')
+        self.post = Post.objects.create(
+            ad=self.ad,
+            fb_group=self.group,
+            post_url='https://www.facebook.com/groups/test/posts/1234567890/',
+            posted_at=timezone.now()
+        )
+
+    def test_facebook_variants_share_a_key(self):
+        for url in [
+            'https://facebook.com/groups/test/permalink/1234567890',
+            'https://m.facebook.com/groups/987/posts/1234567890/?mibextid=abc',
+            'https://www.facebook.com/permalink.php?story_fbid=1234567890&id=42&__cft__[0]=AZX&__tn__=R',
+            'https://mbasic.facebook.com/story.php?id=42&story_fbid=1234567890',
+            'https://www.facebook.com/groups/test/?multi_permalinks=1234567890&ref=share',
+            'https://www.facebook.com/groups/test/posts/1234567890#comments',
+        ]:
+            self.assertEqual(post_url_key(url), 'fb:1234567890', url)
+        self.assertEqual(post_url_key('https://facebook.com/somepage/posts/pfbid02AbC'), 'fb:pfbid02AbC')
+
+    def test_other_urls_drop_tracking_and_sort_query(self):
+        self.assertEqual(
+            post_url_key('https://WWW.Example.com/post/?b=2&utm_source=x&a=1&fbclid=y#top'),
+            'url:example.com/post?a=1&b=2',
+        )
+        self.assertTrue(post_url_key('https://example.com/?q=' + 'x' * 300).startswith('url#'))
+
+    def test_key_follows_the_url(self):
+        self.assertEqual(self.post.post_url_key, 'fb:1234567890')
+        self.post.post_url = 'https://facebook.com/groups/test/posts/42'
+        self.post.save(update_fields=['post_url'])
+        self.assertEqual(Post.objects.get(pk=self.post.pk).post_url_key, 'fb:42')
+
+    def test_find_posts_looks_urls_up_in_one_query(self):
+        urls = [
+            'https://m.facebook.com/groups/test/permalink/1234567890/?fbclid=x',
+            'https://facebook.com/groups/test/posts/555',
+        ]
+        with self.assertNumQueries(1):
+            found = find_posts(urls)
+        self.assertEqual(found, {urls[0]: self.post})
+
+    def test_form_rejects_a_logged_post(self):
+        response = self.client.post(reverse('posts:add_post', args=[self.group.id]), {
+            'ad': self.ad.id,
+            'post_url': 'https://www.facebook.com/permalink.php?story_fbid=1234567890&id=1',
+            'posted_at': '2026-01-01T10:00',
+        })
+        self.assertContains(response, 'This post is already logged.')
+        self.assertEqual(Post.objects.count(), 1)
+
 class AdsListViewTest(TestCase):
     def setUp(self):
         self.client = Client()
@@ -93,3 +163,233 @@ class CreateAdViewTest(TestCase):
         self.assertEqual(response.status_code, 302)  # Redirect after successful creation
         self.assertEqual(Ad.objects.count(), 1)
         self.assertEqual(Ad.objects.first().name, 'New Ad')
+
+class AdSearchViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.ad1 = Ad.objects.create(name='Spring Sale', text='Text 1')
+        self.ad2 = Ad.objects.create(name='Summer Sale', text='Text 2')
+
+    def test_ad_search_returns_matches(self):
+        response = self.client.get(reverse('posts:ad_search'), {'q': 'spr'})
+        self.assertEqual(response.json()['results'], [{'id': self.ad1.id, 'text': 'Spring Sale'}])
+
+    def test_ad_search_limits_results(self):
+        Ad.objects.bulk_create([Ad(name=f'Sale {i}', text='Text') for i in range(30)])
+        response = self.client.get(reverse('posts:ad_search'), {'q': 'sale'})
+        self.assertEqual(len(response.json()['results']), 20)
+
+    def test_add_post_form_does_not_list_every_ad(self):
+        group = FBGroup.objects.create(
+            name='Test Group',
+            group_url='https://facebook.com/groups/test',
+            group_set='A'
+        )
+        response = self.client.get(reverse('posts:add_post', args=[group.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, '<option')
+        self.assertNotContains(response, 'Summer Sale')
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite query plan')
+    def test_prefix_search_uses_index(self):
+        plan = Ad.objects.filter(name__istartswith='su').values_list('pk', 'name').explain()
+        self.assertIn('posts_ad_name_prefix', plan)
+
+class AdFbTextViewTest(TestCase):
+    def test_returns_unicode_formatted_text(self):
+        ad = Ad.objects.create(name='Promo', text='**Big** sale')
+        response = self.client.get(reverse('posts:ad_fb_text', args=[ad.id]))
+        self.assertEqual(response.json(), {'id': ad.id, 'text': '𝐁𝐢𝐠 sale'})
+
+    def test_missing_ad_returns_404(self):
+        response = self.client.get(reverse('posts:ad_fb_text', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+class PostAdminChangelistTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+        self.group = FBGroup.objects.create(
+            name='Test Group',
+            group_url='https://facebook.com/groups/test',
+            group_set='A'
+        )
+        self.contact = Contact.objects.create(name='John Doe', fb_url='https://facebook.com/johndoe')
+
+    def _add_posts(self, count):
+        for i in range(count):
+            ad = Ad.objects.create(name=f'Ad {i}', text='Text')
+            post = Post.objects.create(
+                ad=ad,
+                fb_group=self.group,
+                post_url=f'https://facebook.com/posts/{ad.pk}',
+                posted_at=timezone.now()
+            )
+            Engagement.objects.create(contact=self.contact, post=post, content='Hi', notes='')
+
+    def _changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for name in ('admin:posts_post_changelist', 'admin:posts_ad_changelist'):
+            self._add_posts(2)
+            few = self._changelist_queries(reverse(name))
+            self._add_posts(8)
+            many = self._changelist_queries(reverse(name))
+            self.assertEqual(few, many, name)
+
+    def test_post_changelist_sorts_by_engagement_count(self):
+        self._add_posts(3)
+        response = self.client.get(reverse('admin:posts_post_changelist'), {'o': '-5'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Total Engagements')
+
+
+class FakeS3:
+    """Stand-in for the few boto3 S3 client calls made by posts.uploads"""
+
+    class exceptions:
+        class ClientError(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+        self.multipart = {}
+
+    def generate_presigned_post(self, bucket, key, Fields, Conditions, ExpiresIn):
+        return {'url': f'https://{bucket}.s3.test/', 'fields': {**Fields, 'key': key}}
+
+    def create_multipart_upload(self, Bucket, Key, ContentType):
+        self.multipart['upload-1'] = (Key, ContentType)
+        return {'UploadId': 'upload-1'}
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://{Params['Bucket']}.s3.test/{Params['Key']}?part={Params['PartNumber']}&length={Params['ContentLength']}"
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        key, content_type = self.multipart.pop(UploadId)
+        self.objects[key] = {'ContentType': content_type, 'ContentLength': len(MultipartUpload['Parts'])}
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self.exceptions.ClientError(Key)
+        return self.objects[Key]
+
+
+@override_settings(DIRECT_UPLOADS_ENABLED=True, DIRECT_UPLOAD_MAX_SIZE=30 * 1024 * 1024, DIRECT_UPLOAD_PART_SIZE=8 * 1024 * 1024)
+class DirectUploadTest(TestCase):
+    def setUp(self):
+        self.s3 = FakeS3()
+        target = mock.patch('posts.uploads.upload_target', return_value=(self.s3, 'bucket', 'media'))
+        target.start()
+        self.addCleanup(target.stop)
+
+    def start(self, size, content_type='image/png'):
+        return self.client.post(reverse('posts:ad_image_upload'), {'filename': 'ad.png', 'content_type': content_type, 'size': size})
+
+    def test_small_image_gets_presigned_post(self):
+        upload = self.start(1024).json()
+        self.assertRegex(upload['name'], r'^ads/[0-9a-f]{32}\.png$')
+        self.assertEqual(upload['fields'], {'Content-Type': 'image/png', 'key': f"media/{upload['name']}"})
+        self.assertEqual(self.start(1024, 'text/html').status_code, 400)
+        self.assertEqual(self.start(31 * 1024 * 1024).status_code, 400)
+
+    def test_large_image_is_uploaded_in_parts(self):
+        upload = self.start(20 * 1024 * 1024).json()
+        self.assertEqual(upload['part_size'], 8 * 1024 * 1024)
+        self.assertEqual([part['url'].rsplit('length=')[1] for part in upload['parts']], ['8388608', '8388608', '4194304'])
+        response = self.client.post(reverse('posts:ad_image_upload_complete'), {
+            'name': upload['name'], 'upload_id': upload['upload_id'], 'etag': ['"a"', '"b"', '"c"'],
+        })
+        self.assertEqual(response.json(), {'name': upload['name']})
+        self.assertIn(f"media/{upload['name']}", self.s3.objects)
+
+    def test_create_ad_receives_only_the_name(self):
+        self.assertContains(self.client.get(reverse('posts:create_ad')), 'data-upload-url="/posts/ads/image-upload/"')
+        name = self.start(1024).json()['name']
+        data = {'name': 'Direct', 'text': 'Text', 'image': name}
+        response = self.client.post(reverse('posts:create_ad'), data)
+        self.assertFormError(response.context['form'], 'image', 'The image has not finished uploading.')
+        response = self.client.post(reverse('posts:create_ad'), {**data, 'image': 'ads/../secret.png'})
+        self.assertFormError(response.context['form'], 'image', 'Unknown upload.')
+
+        self.s3.objects[f'media/{name}'] = {'ContentType': 'image/png', 'ContentLength': 1024}
+        self.assertRedirects(self.client.post(reverse('posts:create_ad'), data), reverse('posts:ads_list'))
+        ad = Ad.objects.get()
+        self.assertEqual((ad.image.name, ad.image_pending), (name, True))
+
+    def test_pending_images_are_checked(self):
+        from PIL import Image
+
+        png = io.BytesIO()
+        Image.new('RGB', (2, 2)).save(png, 'PNG')
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            good = Ad.objects.create(name='Good', text='t', image=default_storage.save('ads/good.png', png), image_pending=True)
+            bad = Ad.objects.create(name='Bad', text='t', image=default_storage.save('ads/bad.png', io.BytesIO(b'<html>')), image_pending=True)
+            process_pending_images(list(ChangeLog.objects.filter(model='posts.Ad')))
+            good.refresh_from_db()
+            bad.refresh_from_db()
+            self.assertEqual((good.image.name, good.image_pending), ('ads/good.png', False))
+            self.assertFalse(bad.image)
+            self.assertFalse(bad.image_pending)
+            self.assertFalse(default_storage.exists('ads/bad.png'))
+
+    def test_storage_errors_leave_image_pending(self):
+        ad = Ad.objects.create(name='Ad', text='t', image='ads/missing.png', image_pending=True)
+        with mock.patch.object(default_storage, 'open', side_effect=ConnectionError), self.assertRaises(ConnectionError):
+            process_pending_images(list(ChangeLog.objects.filter(model='posts.Ad')))
+        ad.refresh_from_db()
+        self.assertEqual((ad.image.name, ad.image_pending), ('ads/missing.png', True))
+
+
+class PostMergeMigrationTest(TransactionTestCase):
+    """Merges posts logged under several URLs before their key was unique"""
+
+    def migrate(self, target):
+        targets = [('posts', target), ('engagement', '0012_engagement_unique_content')]
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        call_command('migrate', verbosity=0)
+
+    def test_duplicates_are_merged_and_logged(self):
+        apps = self.migrate('0010_ad_image_pending')
+        HistoricalPost = apps.get_model('posts', 'Post')
+        HistoricalEngagement = apps.get_model('engagement', 'Engagement')
+        group = FBGroup.objects.create(name='G', group_url='https://facebook.com/groups/g', group_set='A')
+        ad = Ad.objects.create(name='Ad', text='Text')
+        contact = Contact.objects.create(name='Alice', fb_url='https://facebook.com/alice')
+        kept, merged = (uuid.UUID(int=1), uuid.UUID(int=2))
+        posts = {
+            sync_id: HistoricalPost.objects.create(
+                sync_id=sync_id, ad_id=ad.pk, fb_group_id=group.pk, post_url=url, posted_at=timezone.now(),
+            )
+            # The copy logged first loses: the lower sync_id is kept everywhere
+            for sync_id, url in [(merged, 'https://facebook.com/groups/g/posts/7'), (kept, 'https://m.facebook.com/groups/g/posts/7/?fbclid=x')]
+        }
+        for sync_id, content in [(kept, 'Hi'), (merged, 'hi'), (merged, 'Bye')]:
+            HistoricalEngagement.objects.create(
+                post_id=posts[sync_id].pk, contact_id=contact.pk, content=content, content_hash=content_hash(content),
+            )
+        dropped = HistoricalEngagement.objects.get(content='hi')
+
+        self.migrate('0011_post_post_url_key')
+        post = Post.objects.get()
+        self.assertEqual(post.sync_id, kept)
+        self.assertEqual(sorted(post.engagements.values_list('content', flat=True)), ['Bye', 'Hi'])
+        self.assertEqual(
+            set(SyncAlias.objects.values_list('model', 'sync_id', 'local_sync_id')),
+            {('posts.Post', merged, kept), ('engagement.Engagement', dropped.sync_id, post.engagements.get(content='Hi').sync_id)},
+        )
+        self.assertEqual(
+            set(ChangeLog.objects.filter(model='posts.Post', origin='').values_list('sync_id', 'action')),
+            {(kept, 'save'), (merged, 'delete')},
+        )
+        self.assertTrue(ChangeLog.objects.filter(sync_id=dropped.sync_id, action='delete').exists())
@@ -0,0 +1,190 @@
+"""
+Direct-to-S3 uploads of ad images.
+
+With DIRECT_UPLOADS_ENABLED, the create ad page sends the image straight
+from the browser to the bucket of the default storage, so no gunicorn
+worker streams the file in and out again:
+
+1. ``start_upload`` picks a fresh object key and returns a presigned POST
+   for it, or, above DIRECT_UPLOAD_PART_SIZE, starts a multipart upload and
+   returns a presigned PUT URL for each part.
+2. A multipart upload is closed with ``complete_upload`` once every part
+   is in, from the ETags S3 returned for them.
+3. The ad form only carries the key; ``verify_upload`` checks it names an
+   upload of ours that exists, is an image and is within the size limit.
+   The ad is saved with ``image_pending`` set.
+4. Its change log entry queues the image: the 'posts.images' change feed
+   consumer (``process_pending_images``) opens it with Pillow, drops it if
+   it is not a readable image, and clears ``image_pending``. The scheduler
+   runs the change feed consumers every minute (the 'changes.consume' job).
+
+Multipart uploads the browser abandons should be cleaned up by the
+bucket's AbortIncompleteMultipartUpload lifecycle rule. Tests, or a local
+S3 stand-in, replace ``upload_target``.
+"""
+
+import math
+import mimetypes
+import posixpath
+import re
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+
+# Image types accepted, by content type, with the extension of their keys
+IMAGE_TYPES = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+}
+
+# Storage names given to uploads; the key is the name under the storage location
+UPLOAD_DIR = 'ads/'
+UPLOAD_NAME_RE = re.compile(r'^ads/[0-9a-f]{32}\.(jpg|png|gif|webp)$')
+
+# S3 caps a multipart upload at 10000 parts of at least 5 MiB, bar the last
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def upload_target():
+    """(boto3 client, bucket name, key prefix) of the default storage, an S3Boto3Storage"""
+    return default_storage.connection.meta.client, default_storage.bucket_name, default_storage.location
+
+
+def _object_key(location, name):
+    return posixpath.join(location, name) if location else name
+
+
+def start_upload(filename, content_type, size):
+    """
+    Reserve a key for an image and presign the browser's upload of it.
+
+    Args:
+        filename (str): Name of the file picked, for its type if
+            ``content_type`` is blank
+        content_type (str): MIME type the browser reports
+        size (int): File size in bytes
+
+    Returns:
+        dict: 'name' (storage name to send back with the form) and either
+        'url' and 'fields' of a presigned POST, or 'upload_id', 'part_size'
+        and 'parts' (part number and presigned PUT URL) of a multipart upload
+
+    Raises:
+        ValidationError: Not an accepted image type, or too large
+    """
+    content_type = content_type or mimetypes.guess_type(filename)[0] or ''
+    if content_type not in IMAGE_TYPES:
+        raise ValidationError('Upload a JPEG, PNG, GIF or WebP image.')
+    if not 0 < size <= settings.DIRECT_UPLOAD_MAX_SIZE:
+        raise ValidationError(f'Images must be at most {settings.DIRECT_UPLOAD_MAX_SIZE // (1024 * 1024)} MB.')
+
+    client, bucket, location = upload_target()
+    name = f'{UPLOAD_DIR}{uuid.uuid4().hex}{IMAGE_TYPES[content_type]}'
+    key = _object_key(location, name)
+    expires = settings.DIRECT_UPLOAD_EXPIRES
+    part_size = max(settings.DIRECT_UPLOAD_PART_SIZE, MIN_PART_SIZE, math.ceil(size / MAX_PARTS))
+
+    if size <= part_size:
+        post = client.generate_presigned_post(
+            bucket, key,
+            Fields={'Content-Type': content_type},
+            Conditions=[{'Content-Type': content_type}, ['content-length-range', 1, settings.DIRECT_UPLOAD_MAX_SIZE]],
+            ExpiresIn=expires,
+        )
+        return {'name': name, 'url': post['url'], 'fields': post['fields']}
+
+    upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)['UploadId']
+    parts = []
+    for number in range(1, math.ceil(size / part_size) + 1):
+        length = min(part_size, size - (number - 1) * part_size)
+        url = client.generate_presigned_url(
+            'upload_part',
+            Params={'Bucket': bucket, 'Key': key, 'UploadId': upload_id, 'PartNumber': number, 'ContentLength': length},
+            ExpiresIn=expires,
+        )
+        parts.append({'number': number, 'url': url})
+    return {'name': name, 'upload_id': upload_id, 'part_size': part_size, 'parts': parts}
+
+
+def complete_upload(name, upload_id, etags):
+    """
+    Assemble a multipart upload from its parts.
+
+    Args:
+        name (str): Storage name from ``start_upload``
+        upload_id (str): Upload id from ``start_upload``
+        etags (list): ETag S3 returned for each part, in part order
+
+    Raises:
+        ValidationError: Not a name ``start_upload`` hands out
+    """
+    if not UPLOAD_NAME_RE.match(name):
+        raise ValidationError('Unknown upload.')
+    client, bucket, location = upload_target()
+    client.complete_multipart_upload(
+        Bucket=bucket,
+        Key=_object_key(location, name),
+        UploadId=upload_id,
+        MultipartUpload={'Parts': [{'PartNumber': number, 'ETag': etag} for number, etag in enumerate(etags, start=1)]},
+    )
+
+
+def verify_upload(name):
+    """
+    Check an uploaded image before an ad refers to it, without reading it.
+
+    Raises:
+        ValidationError: Not one of our upload names, missing, not an
+        image, or too large
+    """
+    if not UPLOAD_NAME_RE.match(name):
+        raise ValidationError('Unknown upload.')
+    client, bucket, location = upload_target()
+    try:
+        head = client.head_object(Bucket=bucket, Key=_object_key(location, name))
+    except client.exceptions.ClientError:
+        raise ValidationError('The image has not finished uploading.')
+    if head.get('ContentType') not in IMAGE_TYPES:
+        raise ValidationError('Upload a JPEG, PNG, GIF or WebP image.')
+    if head['ContentLength'] > settings.DIRECT_UPLOAD_MAX_SIZE:
+        raise ValidationError(f'Images must be at most {settings.DIRECT_UPLOAD_MAX_SIZE // (1024 * 1024)} MB.')
+
+
+def process_image(ad):
+    """
+    Validate a directly uploaded image, as ImageField would on a form upload.
+
+    Only Pillow rejecting the file drops it; any other error, such as the
+    storage being unreachable, propagates, so the consumer's batch is
+    handed over again on its next run.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    with default_storage.open(ad.image.name) as stream:
+        try:
+            with Image.open(stream) as image:
+                image.verify()
+        except (UnidentifiedImageError, SyntaxError, OSError, Image.DecompressionBombError):
+            # Unreadable or not an image: do not keep it
+            readable = False
+        else:
+            readable = True
+    if not readable:
+        default_storage.delete(ad.image.name)
+        ad.image = None
+    ad.image_pending = False
+    ad.save(update_fields=['image', 'image_pending'])
+
+
+def process_pending_images(changes):
+    """Change feed consumer (see core.changes) processing newly uploaded ad images"""
+    from .models import Ad
+
+    ad_ids = {change.object_id for change in changes if change.model == 'posts.Ad' and change.action == 'save'}
+    for ad in Ad.objects.filter(pk__in=ad_ids, image_pending=True):
+        process_image(ad)
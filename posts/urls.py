@@ -6,6 +6,10 @@ app_name = 'posts'
 urlpatterns = [
     path('ads/', views.ads_list, name='ads_list'),
     path('ads/create/', views.create_ad, name='create_ad'),
+    path('ads/image-upload/', views.ad_image_upload, name='ad_image_upload'),
+    path('ads/image-upload/complete/', views.ad_image_upload_complete, name='ad_image_upload_complete'),
+    path('ads/search/', views.ad_search, name='ad_search'),
+    path('ads/<int:ad_id>/fb-text/', views.ad_fb_text, name='ad_fb_text'),
     path('add-post/<int:group_id>/', views.add_post, name='add_post'),
 ]
 
@@ -1,26 +1,68 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import require_http_methods, require_POST
+from core.autocomplete import autocomplete_response
+from core.markdown_utils import markdown_to_unicode, strip_many
+from core.routers import use_replica
 from .models import Ad, Post
-from .forms import AdForm, PostForm
+from .forms import AdForm, DirectUploadAdForm, PostForm
+from .uploads import complete_upload, start_upload
 
+@use_replica
 def ads_list(request):
     """List all ads ordered by date created descending"""
-    ads = Ad.objects.all()
+    ads = list(Ad.objects.all())
+    # Strip the previews of every row in one pass rather than per row in the template
+    for ad, preview in zip(ads, strip_many([ad.text for ad in ads])):
+        ad.text_preview = preview
     context = {'ads': ads}
     return render(request, 'posts/ads_list.html', context)
 
 def create_ad(request):
     """Create a new ad"""
+    # With direct uploads the image goes to storage first; the form only names it
+    form_class = DirectUploadAdForm if settings.DIRECT_UPLOADS_ENABLED else AdForm
     if request.method == 'POST':
-        form = AdForm(request.POST, request.FILES)
+        form = form_class(request.POST, request.FILES)
         if form.is_valid():
             form.save()
             return redirect('posts:ads_list')
     else:
-        form = AdForm()
+        form = form_class()
     context = {'form': form}
     return render(request, 'posts/create_ad.html', context)
 
+@require_POST
+def ad_image_upload(request):
+    """Presign the browser's upload of an ad image straight to storage"""
+    if not settings.DIRECT_UPLOADS_ENABLED:
+        raise Http404
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid size'}, status=400)
+    try:
+        upload = start_upload(request.POST.get('filename', ''), request.POST.get('content_type', ''), size)
+    except ValidationError as error:
+        return JsonResponse({'error': error.messages[0]}, status=400)
+    return JsonResponse(upload)
+
+@require_POST
+def ad_image_upload_complete(request):
+    """Assemble a multipart ad image upload once its parts are in"""
+    if not settings.DIRECT_UPLOADS_ENABLED:
+        raise Http404
+    etags = request.POST.getlist('etag')
+    if not etags or not request.POST.get('upload_id'):
+        return JsonResponse({'error': 'Missing parts'}, status=400)
+    try:
+        complete_upload(request.POST.get('name', ''), request.POST['upload_id'], etags)
+    except ValidationError as error:
+        return JsonResponse({'error': error.messages[0]}, status=400)
+    return JsonResponse({'name': request.POST['name']})
+
 def add_post(request, group_id):
     """Add a post for a specific group"""
     if request.method == 'POST':
@@ -34,3 +76,14 @@ def add_post(request, group_id):
         form = PostForm()
     context = {'form': form, 'group_id': group_id}
     return render(request, 'posts/add_post.html', context)
+
+@use_replica
+def ad_search(request):
+    """Return ads matching the query, for autocomplete pickers"""
+    return autocomplete_response(request, Ad.objects.all(), 'name')
+
+@use_replica
+def ad_fb_text(request, ad_id):
+    """Return an ad's text formatted for pasting into Facebook"""
+    ad = get_object_or_404(Ad.objects.only('text'), pk=ad_id)
+    return JsonResponse({'id': ad.id, 'text': markdown_to_unicode(ad.text)})
@@ -1,4 +1,5 @@
 from django import forms
+from django.urls import reverse
 from django.utils.safestring import mark_safe
 
 
@@ -36,13 +37,14 @@ class MarkdownRichTextWidget(forms.Textarea):
         return mark_safe(html)
 
     class Media:
+        # EasyMDE 2.18.0, vendored under layout/assets/vendor/easymde
         css = {
             'all': (
-                'https://cdn.jsdelivr.net/npm/easymde@2.18.0/dist/easymde.min.css',
+                'vendor/easymde/easymde.min.css',
             )
         }
         js = (
-            'https://cdn.jsdelivr.net/npm/easymde@2.18.0/dist/easymde.min.js',
+            'vendor/easymde/easymde.min.js',
             'js/markdown-editor.js',
         )
 
@@ -55,3 +57,48 @@ class LexicalRichTextWidget(forms.Textarea):
     """
     pass
 
+
+
+class DirectUploadImageInput(forms.HiddenInput):
+    """
+    An image picker that uploads the file straight to storage (see
+    posts.uploads) and submits only the resulting storage name, kept in a
+    hidden input. The file input has no name, so the file itself is never
+    posted to the app.
+    """
+
+    # Render with the visible fields rather than in the hidden-field block
+    is_hidden = False
+
+    def __init__(self, start_url_name, complete_url_name, attrs=None):
+        self.start_url_name = start_url_name
+        self.complete_url_name = complete_url_name
+        super().__init__(attrs=attrs)
+
+    def render(self, name, value, attrs=None, renderer=None):
+        hidden_html = super().render(name, value, attrs, renderer)
+        input_id = attrs.get('id', f'id_{name}') if attrs else f'id_{name}'
+
+        html = f'''
+        <div class="direct-upload-wrapper">
+            {hidden_html}
+            <input type="file" id="{input_id}_file" class="form-control direct-upload-input" accept="image/*"
+                   data-upload-url="{reverse(self.start_url_name)}"
+                   data-complete-url="{reverse(self.complete_url_name)}"
+                   data-upload-target="{input_id}">
+            <div class="progress mt-2 d-none" style="height: 6px;">
+                <div class="progress-bar" role="progressbar" style="width: 0%"></div>
+            </div>
+            <small class="form-text text-muted d-block mt-1 direct-upload-status"></small>
+        </div>
+        '''
+        return mark_safe(html)
+
+    def id_for_label(self, id_):
+        # Point <label for=...> at the file picker
+        return f'{id_}_file' if id_ else id_
+
+    class Media:
+        js = (
+            'js/direct-upload.js',
+        )
@@ -77,12 +77,12 @@ if [ -f requirements.txt ]; then
     pip install -r requirements.txt
 else
     echo -e "${RED}requirements.txt not found. Creating basic one...${NC}"
-    pip install django gunicorn psycopg2-binary
+    pip install django gunicorn uvicorn "psycopg[binary,pool]"
     pip freeze > requirements.txt
 fi
 
-# Install psycopg2 if not already in requirements
-pip install psycopg2-binary
+# Install psycopg 3 with its connection pool if not already in requirements
+pip install "psycopg[binary,pool]"
 
 # ----------------------------
 # CREATE ENVIRONMENT VARIABLES SCRIPT
@@ -314,8 +314,10 @@ EnvironmentFile=/home/ubuntu/$PROJECT_NAME/.env
 ExecStart=/home/ubuntu/$PROJECT_NAME/venv/bin/gunicorn \
           --access-logfile - \
           --workers 3 \
+          --worker-class uvicorn.workers.UvicornWorker \
+          --preload \
           --bind unix:/run/gunicorn.sock \
-          ${PROJECT_NAME}.wsgi:application
+          ${PROJECT_NAME}.asgi:application
 Restart=always
 
 [Install]
@@ -0,0 +1,12 @@
+from django.contrib import admin
+from .models import SyncAlias, SyncPeer
+
+@admin.register(SyncPeer)
+class SyncPeerAdmin(admin.ModelAdmin):
+    list_display = ('name', 'pushed_version', 'pulled_version', 'last_synced_at')
+    readonly_fields = ('last_synced_at',)
+
+@admin.register(SyncAlias)
+class SyncAliasAdmin(admin.ModelAdmin):
+    list_display = ('model', 'sync_id', 'local_sync_id')
+    search_fields = ('sync_id', 'local_sync_id')
@@ -0,0 +1,69 @@
+import json
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from sync.transfer import decode_payload, encode_payload, sync_with_peer
+
+
+class HttpTransport:
+    """Talks to a peer's sync:changes endpoint"""
+
+    def __init__(self, url, token, name, timeout=60):
+        self.url = url
+        self.headers = {'Authorization': f'Bearer {token}', 'X-Sync-Peer': name}
+        self.timeout = timeout
+
+    def pull(self, since, limit):
+        query = urllib.parse.urlencode({'since': since, 'limit': limit})
+        request = urllib.request.Request(f'{self.url}?{query}', headers=self.headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return decode_payload(response.read())
+
+    def push(self, payload):
+        request = urllib.request.Request(
+            self.url,
+            data=encode_payload(payload),
+            headers={**self.headers, 'Content-Type': 'application/gzip'},
+            method='POST',
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+class Command(BaseCommand):
+    help = 'Exchange the changes made since the last sync with a peer deployment'
+
+    def add_arguments(self, parser):
+        parser.add_argument('peer', help='Peer name from SYNC_PEERS')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Change log entries per payload (default: SYNC_BATCH_SIZE)',
+        )
+        direction = parser.add_mutually_exclusive_group()
+        direction.add_argument('--push-only', action='store_true', help='Only send local changes')
+        direction.add_argument('--pull-only', action='store_true', help="Only apply the peer's changes")
+
+    def handle(self, *args, **options):
+        try:
+            peer = settings.SYNC_PEERS[options['peer']]
+        except KeyError:
+            raise CommandError(f"Unknown peer {options['peer']!r}; configure it in SYNC_PEERS")
+        transport = HttpTransport(peer['url'], peer['token'], settings.SYNC_NAME)
+        totals = sync_with_peer(
+            options['peer'],
+            transport,
+            batch_size=options['batch_size'],
+            push=not options['pull_only'],
+            pull=not options['push_only'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Pulled {totals['pulled']} and pushed {totals['pushed']} batches: "
+            f"{totals.get('created', 0)} created, {totals.get('updated', 0)} updated, "
+            f"{totals.get('deleted', 0)} deleted, {totals.get('conflicts', 0)} kept local, "
+            f"{totals.get('skipped', 0)} skipped, {totals.get('duplicates', 0)} duplicates."
+        ))
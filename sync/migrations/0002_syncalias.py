@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50)),
+                ('sync_id', models.UUIDField(unique=True)),
+                ('local_sync_id', models.UUIDField()),
+            ],
+            options={
+                'verbose_name_plural': 'sync aliases',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import models
+
+class SyncPeer(models.Model):
+    """Another deployment this one exchanges changes with, and how far each side has got"""
+    name = models.CharField(max_length=50, unique=True)
+    # Last local change log sequence the peer has received, whether pushed
+    # to it or pulled by it
+    pushed_version = models.BigIntegerField(default=0)
+    # Last change log sequence of the peer's that was applied here
+    pulled_version = models.BigIntegerField(default=0)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
+
+class SyncAlias(models.Model):
+    """
+    A sync_id a peer knows a row by, other than the row's own: the peer's
+    copy of a post or engagement this side already had under its natural
+    key, or a duplicate merged into another row. Rows from the peer that
+    refer to, or change, the alias apply to the local row.
+    """
+    model = models.CharField(max_length=50)
+    sync_id = models.UUIDField(unique=True)
+    # sync_id of the local row the alias stands for
+    local_sync_id = models.UUIDField()
+
+    class Meta:
+        verbose_name_plural = 'sync aliases'
+
+    def __str__(self):
+        return f"{self.model} {self.sync_id} -> {self.local_sync_id}"
@@ -0,0 +1,195 @@
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from core.changes import untracked
+from core.models import ChangeLog, FBGroup
+from engagement.models import Contact, Engagement
+from posts.models import Ad, Post
+from .models import SyncPeer
+from .transfer import apply_changes, decode_payload, encode_payload, export_changes, sync_with_peer
+
+class FakeTransport:
+    """Peer returning canned payloads and keeping what it is sent"""
+
+    def __init__(self, pulls):
+        self.pulls = list(pulls)
+        self.pushed = []
+
+    def pull(self, since, limit):
+        return self.pulls.pop(0)
+
+    def push(self, payload):
+        self.pushed.append(payload)
+        return {}
+
+@override_settings(SYNC_TOKEN='secret')
+class SyncTest(TestCase):
+    def setUp(self):
+        self.group = FBGroup.objects.create(name='Group', group_url='https://facebook.com/groups/g', group_set='A')
+        self.ad = Ad.objects.create(name='Spring Sale', text='Text')
+        self.post = Post.objects.create(ad=self.ad, fb_group=self.group, post_url='https://facebook.com/posts/1', posted_at=timezone.now())
+        self.contact = Contact.objects.create(name='Jane', fb_url='https://facebook.com/jane')
+        self.engagement = Engagement.objects.create(post=self.post, contact=self.contact, content='Hi')
+
+    def export(self, since=0):
+        # Through the wire format, as a peer would receive it
+        return decode_payload(encode_payload(export_changes(since, 100)))
+
+    def test_writes_are_logged(self):
+        self.assertEqual(
+            list(ChangeLog.objects.order_by('id').values_list('model', 'sync_id', 'fields')),
+            [('core.FBGroup', self.group.sync_id, ''), ('posts.Ad', self.ad.sync_id, ''),
+             ('posts.Post', self.post.sync_id, ''), ('engagement.Contact', self.contact.sync_id, ''),
+             # Scoring the new engagement updates its contact first
+             ('engagement.Contact', self.contact.sync_id, 'score,last_engaged_at'),
+             ('engagement.Engagement', self.engagement.sync_id, '')],
+        )
+
+    def test_payload_recreates_rows_on_the_other_side(self):
+        payload = self.export()
+        self.assertEqual(payload['version'], ChangeLog.objects.latest('sequence').sequence)
+        with untracked():
+            FBGroup.objects.all().delete()
+            Ad.objects.all().delete()
+            Contact.objects.all().delete()
+
+        stats = apply_changes(payload, origin='aws')
+        self.assertEqual(stats['created'], 5)
+        post = Post.objects.get(sync_id=self.post.sync_id)
+        self.assertEqual(post.ad.sync_id, self.ad.sync_id)
+        self.assertEqual(post.last_updated, self.post.last_updated)
+        engagement = Engagement.objects.get(sync_id=self.engagement.sync_id)
+        self.assertEqual(engagement.created_at, self.engagement.created_at)
+        self.assertGreater(Contact.objects.get().score, 0)
+        # Applied rows are logged, but never sent back to the peer they came from
+        self.assertEqual(ChangeLog.objects.filter(origin='aws', fields='').count(), 5)
+        self.assertEqual(export_changes(payload['version'], 100, exclude_origin='aws')['models'], {})
+
+    def test_newer_local_row_wins(self):
+        payload = self.export()
+        self.ad.name = 'Summer Sale'
+        self.ad.save()
+        stats = apply_changes(payload, origin='aws')
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.name, 'Summer Sale')
+        self.assertEqual(stats['conflicts'], 1)
+
+    def test_post_logged_under_variant_url_keeps_its_engagements(self):
+        fields = self.export()['models']
+        post_id, engagement_id, later_id = (str(uuid.uuid4()) for _ in range(3))
+        now = timezone.now().isoformat()
+        post_fields = fields['posts.Post']['fields']
+        post_values = {'ad': str(self.ad.sync_id), 'fb_group': str(self.group.sync_id),
+                       'post_url': 'https://www.facebook.com/posts/1/?fbclid=x', 'posted_at': now, 'last_updated': now}
+        post_row = [post_id, *(post_values[name] for name in post_fields)]
+        engagement_fields = fields['engagement.Engagement']['fields']
+
+        def engagement_row(sync_id, content):
+            values = {'contact': str(self.contact.sync_id), 'post': post_id, 'content': content, 'notes': '',
+                      'created_at': now, 'message_url': None, 'last_updated': now}
+            return [sync_id, *(values[name] for name in engagement_fields)]
+
+        def payload(models):
+            return {'version': 1, 'more': False, 'models': {
+                label: {'fields': {'posts.Post': post_fields, 'engagement.Engagement': engagement_fields}[label], 'rows': rows, 'deleted': []}
+                for label, rows in models.items()
+            }}
+
+        stats = apply_changes(payload({
+            'posts.Post': [post_row],
+            'engagement.Engagement': [engagement_row(engagement_id, 'Thanks!')],
+        }), origin='aws')
+        self.assertEqual((stats['duplicates'], stats['created'], stats['skipped']), (1, 1, 0))
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Engagement.objects.get(sync_id=engagement_id).post, self.post)
+
+        # The alias outlives the payload it came in
+        apply_changes(payload({'engagement.Engagement': [engagement_row(later_id, 'More please')]}), origin='aws')
+        self.assertEqual(Engagement.objects.get(sync_id=later_id).post, self.post)
+
+    def test_update_onto_another_rows_key_is_skipped(self):
+        other = Engagement.objects.create(post=self.post, contact=self.contact, content='Hello')
+        payload = self.export()
+        # The peer edits its copy to match another engagement this side has
+        row = next(row for row in payload['models']['engagement.Engagement']['rows'] if row[0] == str(self.engagement.sync_id))
+        fields = payload['models']['engagement.Engagement']['fields']
+        row[1 + fields.index('content')] = 'hello'
+        row[1 + fields.index('last_updated')] = (timezone.now() + timedelta(minutes=1)).isoformat()
+
+        stats = apply_changes(payload, origin='aws')
+        self.assertEqual(stats['duplicates'], 1)
+        self.engagement.refresh_from_db()
+        self.assertEqual(self.engagement.content, 'Hi')
+        self.assertEqual(Engagement.objects.get(pk=other.pk).content, 'Hello')
+
+    def test_deletes_travel_as_tombstones(self):
+        created = self.export()
+        self.post.delete()
+        deleted = self.export(created['version'])
+        self.assertEqual([row[0] for row in deleted['models']['posts.Post']['deleted']], [str(self.post.sync_id)])
+
+        apply_changes(created, origin='aws')
+        self.assertTrue(Post.objects.filter(sync_id=self.post.sync_id).exists())
+        self.assertEqual(apply_changes(deleted, origin='aws')['deleted'], 1)
+        self.assertFalse(Post.objects.filter(sync_id=self.post.sync_id).exists())
+
+    def test_delete_keeps_parent_of_newer_children(self):
+        def tombstone(row, at):
+            return {'version': 1, 'more': False, 'models': {
+                'core.FBGroup': {'fields': [], 'rows': [], 'deleted': [[str(row.sync_id), at.isoformat()]]},
+            }}
+
+        # The engagement, two levels down, changed after the peer deleted the group
+        stats = apply_changes(tombstone(self.group, self.post.last_updated), origin='aws')
+        self.assertEqual((stats['deleted'], stats['conflicts']), (0, 1))
+        self.assertTrue(Engagement.objects.filter(pk=self.engagement.pk).exists())
+
+        stats = apply_changes(tombstone(self.group, timezone.now()), origin='aws')
+        self.assertEqual((stats['deleted'], stats['conflicts']), (1, 0))
+        self.assertFalse(Post.objects.filter(pk=self.post.pk).exists())
+
+    def test_sync_with_peer_advances_watermarks(self):
+        transport = FakeTransport([
+            {'version': 7, 'more': True, 'models': {}},
+            {'version': 9, 'more': False, 'models': {}},
+        ])
+        totals = sync_with_peer('aws', transport, batch_size=2)
+        peer = SyncPeer.objects.get(name='aws')
+        self.assertEqual(peer.pulled_version, 9)
+        self.assertEqual(peer.pushed_version, ChangeLog.objects.latest('sequence').sequence)
+        self.assertEqual(totals['pushed'], 3)
+        self.assertEqual(sum(len(payload['models']) for payload in transport.pushed), 5)
+        self.assertIsNotNone(peer.last_synced_at)
+
+        transport = FakeTransport([{'version': 9, 'more': False, 'models': {}}])
+        self.assertEqual(sync_with_peer('aws', transport)['pushed'], 0)
+
+    def test_endpoint(self):
+        headers = {'Authorization': 'Bearer secret', 'X-Sync-Peer': 'laptop'}
+        response = self.client.get(reverse('sync:changes'), {'since': 0}, headers=headers)
+        self.assertEqual(len(decode_payload(response.content)['models']), 5)
+        # Asking from a watermark acknowledges what came before it
+        self.client.get(reverse('sync:changes'), {'since': 3}, headers=headers)
+        self.assertEqual(SyncPeer.objects.get(name='laptop').pushed_version, 3)
+
+        payload = encode_payload(export_changes(0, 100))
+        response = self.client.post(reverse('sync:changes'), payload, content_type='application/gzip', headers=headers)
+        self.assertEqual(response.json()['updated'], 5)
+
+        response = self.client.get(reverse('sync:changes'), headers={**headers, 'Authorization': 'Bearer wrong'})
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(SYNC_PEERS={'aws': {'url': 'https://example.com/sync/changes/', 'token': 'secret'}})
+    def test_command(self):
+        transport = FakeTransport([{'version': 3, 'more': False, 'models': {}}])
+        with mock.patch('sync.management.commands.sync.HttpTransport', return_value=transport):
+            out = StringIO()
+            call_command('sync', 'aws', '--pull-only', stdout=out)
+        self.assertIn('pushed 0 batches', out.getvalue())
+        self.assertEqual(SyncPeer.objects.get().pulled_version, 3)
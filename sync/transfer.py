@@ -0,0 +1,390 @@
+"""
+Incremental two-way sync between deployments, e.g. the laptop's SQLite
+database and the AWS PostgreSQL one.
+
+Each side keeps a change log of its synced models (see core.changes).
+``export_changes`` packs the current state of every row changed after a
+watermark into one payload, with each model's field names listed once and
+its rows as plain lists. ``apply_changes`` writes a peer's payload in bulk,
+keeping whichever side of a conflict has the newer ``last_updated``.
+Rows are matched by ``sync_id`` and foreign keys travel as the parent's
+``sync_id``, since the two databases number their rows independently. A
+post or engagement a peer logged separately under the same natural key is
+not copied; its sync_id becomes an alias (SyncAlias) of the local row.
+
+Changes applied from a peer are logged with the peer as origin and never
+sent back to it. Archival, and derived fields (scores, archive counters),
+are not synced; each side keeps its own.
+"""
+
+import gzip
+import json
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.db.models import Max
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import invalidate
+from core.changes import (
+    ARCHIVE_ORIGIN, change_origin, derive_fields, pending_changes, record_changes, sequence_changes,
+)
+from core.signals import CACHE_DEPENDENCIES
+from .models import SyncAlias, SyncPeer
+
+# Fields sent for each synced model, besides sync_id; parents before children
+SYNC_FIELDS = {
+    'core.FBGroup': ['name', 'group_url', 'group_set', 'last_updated'],
+    'posts.Ad': ['name', 'text', 'image', 'created_at', 'last_updated'],
+    'posts.Post': ['ad', 'fb_group', 'post_url', 'posted_at', 'last_updated'],
+    'engagement.Contact': ['name', 'fb_url', 'last_updated'],
+    'engagement.Engagement': ['contact', 'post', 'content', 'notes', 'created_at', 'message_url', 'last_updated'],
+}
+
+# Columns identifying a row besides its sync_id, under a unique constraint
+NATURAL_KEYS = {
+    'posts.Post': ['post_url_key'],
+    'engagement.Engagement': ['post_id', 'contact_id', 'content_hash'],
+}
+
+class SyncEncoder(DjangoJSONEncoder):
+    """JSON encoder keeping full microsecond timestamps, so last_updated compares exactly"""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_payload(payload):
+    return gzip.compress(json.dumps(payload, cls=SyncEncoder, separators=(',', ':')).encode())
+
+
+def decode_payload(data):
+    return json.loads(gzip.decompress(data))
+
+
+def export_changes(since, limit, exclude_origin=''):
+    """
+    Pack the rows changed after a change log sequence.
+
+    Args:
+        since (int): Watermark; only later changes are exported
+        limit (int): Change log entries covered by one payload
+        exclude_origin (str): Leave out changes received from this peer
+
+    Returns:
+        dict: 'version' (watermark for the next call), 'more' (whether
+        entries are left after it) and 'models': per model label, its
+        'fields', 'rows' ([sync_id, *values]) and 'deleted' ([sync_id,
+        deleted_at]) tombstones
+    """
+    sequence_changes()
+    entries = list(pending_changes(since, limit).values_list('sequence', 'model', 'sync_id', 'fields', 'origin', 'recorded_at'))
+    changed = defaultdict(dict)
+    for _, label, sync_id, fields, origin, recorded_at in entries:
+        if label not in SYNC_FIELDS or origin == ARCHIVE_ORIGIN or (exclude_origin and origin == exclude_origin):
+            continue
+        if fields and not set(fields.split(',')) & set(SYNC_FIELDS[label]):
+            # Only derived fields changed, e.g. a contact's score
+            continue
+        changed[label][sync_id] = recorded_at
+
+    models = {}
+    for label in SYNC_FIELDS:
+        if label not in changed:
+            continue
+        model = apps.get_model(label)
+        fields = SYNC_FIELDS[label]
+        columns = [f'{name}__sync_id' if model._meta.get_field(name).is_relation else name for name in fields]
+        rows = [list(row) for row in model.objects.filter(sync_id__in=changed[label]).values_list('sync_id', *columns)]
+        present = {row[0] for row in rows}
+        models[label] = {
+            'fields': fields,
+            'rows': rows,
+            'deleted': [[sync_id, at] for sync_id, at in changed[label].items() if sync_id not in present],
+        }
+    return {
+        'version': entries[-1][0] if entries else since,
+        'more': len(entries) == limit,
+        'models': models,
+    }
+
+
+def _aliases(model, sync_ids):
+    """Local sync_id of each of the sync_ids that is an alias (see SyncAlias)"""
+    return dict(SyncAlias.objects.filter(model=model._meta.label, sync_id__in=sync_ids).values_list('sync_id', 'local_sync_id'))
+
+
+def _parent_ids(field, sync_ids):
+    """Local primary keys of the parent rows a foreign key refers to, by sync_id or alias"""
+    model = field.related_model
+    ids = dict(model.objects.filter(sync_id__in=sync_ids).values_list('sync_id', 'pk'))
+    aliases = _aliases(model, set(sync_ids) - set(ids))
+    if aliases:
+        local = dict(model.objects.filter(sync_id__in=aliases.values()).values_list('sync_id', 'pk'))
+        ids.update({sync_id: local[target] for sync_id, target in aliases.items() if target in local})
+    return ids
+
+
+def _existing_rows(model, sync_ids):
+    """Local rows the peer's rows are copies of, by sync_id or alias"""
+    rows = model.objects.in_bulk(sync_ids, field_name='sync_id')
+    aliases = _aliases(model, set(sync_ids) - set(rows))
+    if aliases:
+        local = model.objects.in_bulk(set(aliases.values()), field_name='sync_id')
+        rows.update({sync_id: local[target] for sync_id, target in aliases.items() if target in local})
+    return rows
+
+
+def _decode_row(meta_fields, row, parents):
+    """Field values of a payload row by attname, or None if a parent is missing"""
+    values = {}
+    for field, value in zip(meta_fields, row[1:]):
+        if field.is_relation:
+            value = parents[field.name].get(uuid.UUID(value)) if value else None
+            if value is None and not field.null:
+                return None
+            values[field.attname] = value
+        else:
+            values[field.attname] = field.to_python(value)
+    return values
+
+
+def _apply_rows(model, fields, rows, stats):
+    """Insert or update one model's rows; returns the (created, updated) objects"""
+    meta_fields = [model._meta.get_field(name) for name in fields]
+    parents = {
+        field.name: _parent_ids(field, {uuid.UUID(row[index]) for row in rows if row[index]})
+        for index, field in enumerate(meta_fields, start=1)
+        if field.is_relation
+    }
+    existing = _existing_rows(model, [uuid.UUID(row[0]) for row in rows])
+
+    created, updated, updated_pks = [], [], set()
+    for row in rows:
+        values = _decode_row(meta_fields, row, parents)
+        if values is None:
+            # A parent that never arrived; keep the row out rather than dangling
+            stats['skipped'] += 1
+            continue
+        obj = existing.get(uuid.UUID(row[0]))
+        if obj is None:
+            created.append((model(sync_id=uuid.UUID(row[0]), **values), values))
+        elif obj.pk in updated_pks:
+            # Sent under its own sync_id and an alias; the first copy applies
+            stats['duplicates'] += 1
+        elif obj.last_updated > values['last_updated']:
+            stats['conflicts'] += 1
+        else:
+            for attname, value in values.items():
+                setattr(obj, attname, value)
+            updated.append(obj)
+            updated_pks.add(obj.pk)
+
+    created = [obj for obj, _ in created]
+    # The raw upsert does not compute derived fields, e.g. content hashes
+    meta_fields += [model._meta.get_field(name) for name in derive_fields(model, created + updated)]
+    created, updated = _drop_duplicates(model, created, updated, stats)
+    _upsert(model, created + updated, meta_fields)
+    return created, updated
+
+
+def _drop_duplicates(model, created, updated, stats):
+    """
+    Leave out rows whose NATURAL_KEYS another row of this side already has,
+    under another sync_id: new rows, and updates that would move a row onto
+    another's key, which would otherwise fail the whole payload on the
+    unique constraint every time it is sent.
+
+    A new row left out becomes an alias of the row holding its key, so the
+    peer's rows under it (a post's engagements) and later changes to it
+    apply to that row.
+    """
+    names = NATURAL_KEYS.get(model._meta.label)
+    if not names or not created + updated:
+        return created, updated
+    objs = created + updated
+    lookups = {f'{name}__in': {getattr(obj, name) for obj in objs} for name in names}
+    # Natural key -> (pk, sync_id) of the row holding it
+    seen = {tuple(row[2:]): row[:2] for row in model.objects.filter(**lookups).values_list('pk', 'sync_id', *names)}
+    kept, aliases = [], []
+    for obj in objs:
+        key = tuple(getattr(obj, name) for name in names)
+        if key in seen and seen[key][0] != obj.pk:
+            stats['duplicates'] += 1
+            if obj.pk is None:
+                aliases.append(SyncAlias(model=model._meta.label, sync_id=obj.sync_id, local_sync_id=seen[key][1]))
+        else:
+            seen[key] = (obj.pk, obj.sync_id)
+            kept.append(obj)
+    SyncAlias.objects.bulk_create(aliases, ignore_conflicts=True)
+    return [obj for obj in kept if obj.pk is None], [obj for obj in kept if obj.pk is not None]
+
+
+def _upsert(model, objs, update_fields):
+    """
+    Insert or update rows by sync_id, keeping the peer's timestamps.
+
+    This is a raw insert, as loaddata makes, so auto_now fields are written
+    as given instead of being stamped with the current time. bulk_update
+    would keep them too, but builds a CASE per row and field and is many
+    times slower.
+    """
+    if not objs:
+        return
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    manager = model._base_manager
+    batch_size = connections[manager.db].ops.bulk_batch_size(fields, objs)
+    for start in range(0, len(objs), batch_size):
+        manager._insert(
+            objs[start:start + batch_size],
+            fields=fields,
+            raw=True,
+            on_conflict=OnConflict.UPDATE,
+            update_fields=update_fields,
+            unique_fields=[model._meta.get_field('sync_id')],
+        )
+
+
+def _descendants(model, path=''):
+    """Synced models a delete of ``model`` cascades to, with the lookup from each back to it"""
+    for label in SYNC_FIELDS:
+        child = apps.get_model(label)
+        for field in child._meta.get_fields():
+            if field.many_to_one and field.related_model is model:
+                lookup = f'{field.name}__{path}' if path else field.name
+                yield child, lookup
+                yield from _descendants(child, lookup)
+
+
+def _apply_deletes(model, tombstones, stats):
+    """
+    Delete rows the peer deleted, unless they or a row the delete would
+    cascade to changed here since.
+
+    Aliases are not followed: a peer deleting its copy of a duplicate may
+    have merged it into the row this side keeps.
+    """
+    deleted_at = {uuid.UUID(sync_id): parse_datetime(at) for sync_id, at in tombstones}
+    newest = dict(model.objects.filter(sync_id__in=deleted_at).values_list('sync_id', 'last_updated'))
+    for child, lookup in _descendants(model):
+        children = (
+            child.objects.filter(**{f'{lookup}__sync_id__in': newest})
+            .values(f'{lookup}__sync_id').annotate(newest=Max('last_updated'))
+            .values_list(f'{lookup}__sync_id', 'newest')
+        )
+        for sync_id, last_updated in children:
+            newest[sync_id] = max(newest[sync_id], last_updated)
+    doomed = []
+    for sync_id, last_updated in newest.items():
+        if last_updated > deleted_at[sync_id]:
+            stats['conflicts'] += 1
+        else:
+            doomed.append(sync_id)
+    if doomed:
+        model.objects.filter(sync_id__in=doomed).delete()
+    return len(doomed)
+
+
+def apply_changes(payload, origin):
+    """
+    Apply a payload from ``export_changes`` on a peer, in one transaction.
+
+    Args:
+        payload (dict): The peer's export
+        origin (str): Name of the peer, recorded with the resulting changes
+
+    Returns:
+        dict: Counts of rows 'created', 'updated', 'deleted', 'conflicts'
+        (kept local because the local copy is newer), 'skipped'
+        (referring to a parent this side does not have) and 'duplicates'
+        (posts and engagements this side already has under another sync_id,
+        new or changed to match one)
+    """
+    stats = Counter(created=0, updated=0, deleted=0, conflicts=0, skipped=0, duplicates=0)
+    touched = set()
+    with transaction.atomic(), change_origin(origin):
+        for label in SYNC_FIELDS:
+            data = payload['models'].get(label)
+            if not data or not data['rows']:
+                continue
+            if not set(data['fields']) <= set(SYNC_FIELDS[label]) or 'last_updated' not in data['fields']:
+                raise ValueError(f'Unexpected fields for {label}: {data["fields"]}')
+            model = apps.get_model(label)
+            created, updated = _apply_rows(model, data['fields'], data['rows'], stats)
+            written = model.objects.filter(sync_id__in=[obj.sync_id for obj in created + updated])
+            record_changes(model, written.values_list('pk', 'sync_id'))
+            stats['created'] += len(created)
+            stats['updated'] += len(updated)
+            if created or updated:
+                touched.add(label)
+            if label == 'engagement.Engagement' and created:
+                # bulk_create sends no post_save; rescore the contacts in one pass
+                from engagement.scoring import recompute_scores
+                recompute_scores(contact_ids={engagement.contact_id for engagement in created})
+
+        # Children first, so a cascade never removes a row the peer kept
+        for label in reversed(SYNC_FIELDS):
+            data = payload['models'].get(label)
+            if data and data['deleted']:
+                deleted = _apply_deletes(apps.get_model(label), data['deleted'], stats)
+                stats['deleted'] += deleted
+                if deleted:
+                    touched.add(label)
+
+        namespaces = {namespace for label in touched for namespace in CACHE_DEPENDENCIES[label]}
+        transaction.on_commit(lambda: invalidate(*namespaces))
+    return dict(stats)
+
+
+def sync_with_peer(name, transport, batch_size=None, push=True, pull=True):
+    """
+    Exchange changes with a peer from the last watermarks on.
+
+    Args:
+        name (str): Peer name, as in SYNC_PEERS
+        transport: Object with ``pull(since, limit)`` returning the peer's
+            payload and ``push(payload)`` sending it ours
+        batch_size (int): Change log entries per payload
+        push (bool): Send local changes
+        pull (bool): Fetch and apply the peer's changes
+
+    Returns:
+        dict: Totals of 'pushed' and 'pulled' payloads and the counts from
+        ``apply_changes``
+    """
+    batch_size = batch_size or settings.SYNC_BATCH_SIZE
+    peer, _ = SyncPeer.objects.get_or_create(name=name)
+    totals = Counter(pushed=0, pulled=0)
+
+    while pull:
+        payload = transport.pull(peer.pulled_version, batch_size)
+        if payload['models']:
+            totals.update(apply_changes(payload, origin=name))
+            totals['pulled'] += 1
+        peer.pulled_version = payload['version']
+        peer.save(update_fields=['pulled_version'])
+        if not payload['more']:
+            break
+
+    while push:
+        payload = export_changes(peer.pushed_version, batch_size, exclude_origin=name)
+        if payload['models']:
+            transport.push(payload)
+            totals['pushed'] += 1
+        peer.pushed_version = payload['version']
+        peer.save(update_fields=['pushed_version'])
+        if not payload['more']:
+            break
+
+    peer.last_synced_at = timezone.now()
+    peer.save(update_fields=['last_synced_at'])
+    return dict(totals)
@@ -0,0 +1,47 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from .models import SyncPeer
+from .transfer import apply_changes, decode_payload, encode_payload, export_changes
+
+# Most change log entries a peer may ask for in one payload
+SYNC_MAX_BATCH_SIZE = 10000
+
+def _authorized(request):
+    """Whether the request carries the shared SYNC_TOKEN"""
+    expected = f'Bearer {settings.SYNC_TOKEN}'
+    return bool(settings.SYNC_TOKEN) and hmac.compare_digest(request.headers.get('Authorization', ''), expected)
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+def changes(request):
+    """Send a peer the local changes after its watermark, or apply the peer's changes"""
+    if not _authorized(request):
+        return HttpResponseForbidden('Invalid sync token')
+    peer = request.headers.get('X-Sync-Peer', '')
+    if not peer:
+        return HttpResponseBadRequest('Missing X-Sync-Peer header')
+
+    if request.method == 'GET':
+        try:
+            since = int(request.GET.get('since', 0))
+            limit = min(int(request.GET.get('limit', settings.SYNC_BATCH_SIZE)), SYNC_MAX_BATCH_SIZE)
+        except ValueError:
+            return HttpResponseBadRequest('Invalid since or limit')
+        # The peer asks from the last change it applied: keep that, so the
+        # change log is not pruned past it
+        sync_peer, _ = SyncPeer.objects.get_or_create(name=peer)
+        if since > sync_peer.pushed_version:
+            sync_peer.pushed_version = since
+            sync_peer.save(update_fields=['pushed_version'])
+        payload = export_changes(since, limit, exclude_origin=peer)
+        return HttpResponse(encode_payload(payload), content_type='application/gzip')
+
+    try:
+        payload = decode_payload(request.body)
+        return JsonResponse(apply_changes(payload, origin=peer))
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        return HttpResponseBadRequest(f'Invalid payload: {error}')